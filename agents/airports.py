@@ -0,0 +1,167 @@
+import os
+import csv
+import numpy as np
+
+# Bundled airport table: IATA code, coordinates, type and scheduled-service flag
+AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+FIELDNAMES = ["iata", "name", "city", "latitude", "longitude", "type", "scheduled", "serves"]
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _normalize_name(name):
+    return " ".join(str(name).lower().replace("-", " ").split())
+
+
+class AirportIndex:
+    """In-memory airport table with vectorized haversine nearest-airport search"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.codes = np.array([r["iata"] for r in self.rows])
+        self.lat = np.radians([float(r["latitude"]) for r in self.rows])
+        self.lon = np.radians([float(r["longitude"]) for r in self.rows])
+        self.cos_lat = np.cos(self.lat)
+        self.scheduled = np.array([str(r["scheduled"]) == "1" for r in self.rows], dtype=bool)
+        self.positions = {code: i for i, code in enumerate(self.codes)}
+
+        # City and served-place names -> row positions, scheduled airports first
+        self.places = {}
+        for i, r in enumerate(self.rows):
+            names = [r["city"]] + [s for s in (r.get("serves") or "").split(";") if s]
+            for name in filter(None, names):
+                self.places.setdefault(_normalize_name(name), []).append(i)
+        for positions in self.places.values():
+            positions.sort(key=lambda i: not self.scheduled[i])
+
+    @classmethod
+    def from_csv(cls, path=AIRPORTS_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(csv.DictReader(f))
+
+    def distances_km(self, lat, lon):
+        """Great-circle distance from a point to every airport"""
+        lat, lon = np.radians(lat), np.radians(lon)
+        a = (np.sin((self.lat - lat) / 2) ** 2
+             + np.cos(lat) * self.cos_lat * np.sin((self.lon - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    def nearest(self, lat, lon, n=5, radius_km=300, scheduled_only=True, exclude=None):
+        """
+        Find the nearest airports to a point
+
+        Args:
+            lat (float): Latitude in degrees
+            lon (float): Longitude in degrees
+            n (int): Maximum number of airports to return
+            radius_km (float): Search radius
+            scheduled_only (bool): Skip airports without scheduled passenger service
+            exclude (list): IATA codes to leave out
+
+        Returns:
+            list: dicts with iata, name, city and distance_km, nearest first
+        """
+        distances = self.distances_km(lat, lon)
+        mask = distances <= radius_km
+        if scheduled_only:
+            mask &= self.scheduled
+        if exclude:
+            mask &= ~np.isin(self.codes, list(exclude))
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size > n:
+            candidates = candidates[np.argpartition(distances[candidates], n)[:n]]
+        candidates = candidates[np.argsort(distances[candidates])]
+
+        return [{
+            "iata": self.rows[i]["iata"],
+            "name": self.rows[i]["name"],
+            "city": self.rows[i]["city"],
+            "distance_km": round(float(distances[i]), 1),
+        } for i in candidates]
+
+    def lookup_place(self, place_name, scheduled_only=True):
+        """Airports whose city or served places match a name exactly"""
+        positions = self.places.get(_normalize_name(place_name), [])
+        return [self.rows[i] for i in positions if self.scheduled[i] or not scheduled_only]
+
+    def coordinates(self, iata):
+        """Latitude/longitude in degrees for an IATA code, or None"""
+        i = self.positions.get(iata)
+        if i is None:
+            return None
+        return float(self.rows[i]["latitude"]), float(self.rows[i]["longitude"])
+
+    def add(self, rows):
+        """Return a new index with extra rows appended (known IATA codes are kept as-is)"""
+        merged = {r["iata"]: r for r in self.rows}
+        for r in rows:
+            merged.setdefault(r["iata"], r)
+        return AirportIndex(merged.values())
+
+    def save(self, path=AIRPORTS_PATH):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+_index = None
+
+
+def get_airport_index():
+    """Load the bundled airport table once per process"""
+    global _index
+    if _index is None:
+        _index = AirportIndex.from_csv()
+    return _index
+
+
+def nearest_airports(lat, lon, n=5, radius_km=300, scheduled_only=True, exclude=None):
+    """Nearest N airports within R km of a point, without any network calls"""
+    return get_airport_index().nearest(lat, lon, n, radius_km, scheduled_only, exclude)
+
+
+def airports_for_place(place_name):
+    """IATA codes of scheduled airports serving a city or destination name"""
+    return [r["iata"] for r in get_airport_index().lookup_place(place_name)]
+
+
+def refresh_from_amadeus(amadeus, lat, lon, radius_km=300, save=False):
+    """
+    Merge airports reported by the Amadeus API around a point into the table
+
+    This is the only network path and is meant for occasional refreshes of the
+    bundled data, not for per-request lookups.
+
+    Returns:
+        list: IATA codes that were added
+    """
+    global _index
+    response = amadeus.reference_data.locations.airports.get(
+        latitude=lat,
+        longitude=lon,
+        radius=radius_km
+    )
+    rows = []
+    for a in response.data or []:
+        if 'iataCode' not in a or 'geoCode' not in a:
+            continue
+        rows.append({
+            "iata": a['iataCode'],
+            "name": a.get('name', a['iataCode']).title(),
+            "city": a.get('address', {}).get('cityName', '').title(),
+            "latitude": a['geoCode']['latitude'],
+            "longitude": a['geoCode']['longitude'],
+            "type": "airport",
+            "scheduled": 1,
+            "serves": "",
+        })
+
+    index = get_airport_index()
+    added = [r for r in rows if r["iata"] not in index.positions]
+    if added:
+        _index = index.add(added)
+        if save:
+            _index.save()
+    return [r["iata"] for r in added]
@@ -1,16 +1,26 @@
-import os
 import re
-from dotenv import load_dotenv
-load_dotenv()
-import streamlit as st
-os.environ['GROQ_API_KEY'] = st.secrets["GROQ_API_KEY"]
+from agents.cache import cached_invoke
+from agents.clients import get_llm
+from agents.budget_model import estimate_budget, quote_budgets, trip_days
+from agents.llm_scheduler import RateLimitExceeded
+from agents.telemetry import current_span, traced
 
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+@traced("agent.budget")
+def calculate_budget(destination, dates, accommodation_type, flight_location, interests, flight_cost=None):
+    """
+    Calculate the total trip budget in INR
 
-llm = ChatGroq(model_name='Gemma2-9b-It')
+    Known destinations are priced locally from the cost tables in
+    agents/budget_model.py; the LLM is only asked about destinations that
+    aren't in the tables.
+    """
+    try:
+        budget_value = estimate_budget(destination, trip_days(dates), accommodation_type, interests, flight_cost)
+        if budget_value is not None:
+            return budget_value
+    except ValueError as e:
+        current_span().set(budget_model_skipped=str(e))
 
-def calculate_budget(destination, dates, accommodation_type, flight_location, interests, flight_cost=None):
     budget_prompt_template = """
     You are a smart travel budget calculator for Indian destinations. Calculate a realistic budget based on these inputs:
 
@@ -30,11 +40,12 @@ def calculate_budget(destination, dates, accommodation_type, flight_location, in
 
     flight_cost_text = f"- Flight Cost: ₹{flight_cost:,}" if flight_cost else ""
 
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_template(budget_prompt_template)
-    chain = prompt | llm
+    chain = prompt | get_llm()
 
     try:
-        result = chain.invoke({
+        content = cached_invoke("budget", chain, {
             "destination": destination,
             "dates": dates,
             "accommodation_type": accommodation_type,
@@ -44,9 +55,17 @@ def calculate_budget(destination, dates, accommodation_type, flight_location, in
         })
         
         # Extract pure numeric value
-        budget_value = int(re.search(r'\d+', result.content).group())
+        budget_value = int(re.search(r'\d+', content).group())
         return budget_value
-        
+
+    except RateLimitExceeded as e:
+        # Price at national-average rates rather than a flat guess
+        current_span().set(fallback="rate limited", error=str(e))
+        try:
+            quote = quote_budgets([destination], [accommodation_type], [dates], interests, [flight_cost])
+            return int(quote["totals"][0, 0, 0])
+        except ValueError:
+            return 50000
     except Exception as e:
-        print(f"Budget calculation error: {str(e)}")
+        current_span().set(fallback=str(e))
         return 50000  # Fallback value
\ No newline at end of file
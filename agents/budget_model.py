@@ -0,0 +1,240 @@
+import os
+import re
+import csv
+from datetime import datetime, date
+import numpy as np
+
+# Accommodation options offered in step 4, cheapest first
+ACCOMMODATION_TYPES = ["Budget hostel", "Budget hotel", "3-star hotel", "4-star hotel", "5-star hotel", "Luxury resort"]
+
+# National-average nightly room rate and daily food + local transport spend per tier (INR)
+NIGHTLY_RATES = np.array([800, 1800, 3500, 6500, 12000, 20000], dtype=float)
+DAILY_SPEND = np.array([900, 1400, 2200, 3200, 5000, 7000], dtype=float)
+
+# Typical per-day spend on activities for common interests (INR)
+INTEREST_COSTS = {
+    "adventure": 2500, "trek": 1200, "hiking": 800, "rafting": 1500, "paragliding": 3000,
+    "scuba": 4500, "diving": 4500, "snorkel": 2000, "water sport": 2500, "skiing": 3500,
+    "wildlife": 3000, "safari": 3500,
+    "sightseeing": 600, "heritage": 500, "history": 500, "culture": 500, "museum": 400,
+    "temple": 200, "spiritual": 200, "yoga": 1000,
+    "beach": 400, "nature": 400, "mountain": 500, "photography": 300, "relax": 800,
+    "food": 800, "cuisine": 800, "nightlife": 1500, "party": 1500, "shopping": 1500,
+    "spa": 2500, "wellness": 2500,
+}
+DEFAULT_ACTIVITY_COST = 800
+
+# Totals are rounded up to this many rupees
+ROUNDING = 500
+
+COSTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "destination_costs.csv")
+
+
+def _normalize_name(name):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(name).lower()).split())
+
+
+class DestinationCosts:
+    """Per-destination cost indices and the daily-cost table they imply for each accommodation tier"""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.names = [r["destination"] for r in rows]
+        self.accommodation_index = np.array([float(r["accommodation_index"]) for r in rows])
+        self.daily_index = np.array([float(r["daily_index"]) for r in rows])
+
+        # destination x tier tables (INR)
+        self.nightly = np.outer(self.accommodation_index, NIGHTLY_RATES)
+        self.daily = np.outer(self.daily_index, DAILY_SPEND)
+
+        self.lookup = {}
+        for i, r in enumerate(rows):
+            for name in [r["destination"]] + (r.get("aliases") or "").split(";"):
+                if name:
+                    self.lookup[_normalize_name(name)] = i
+        # Longest names first so "north goa" wins over "goa" in free text
+        self.patterns = sorted(self.lookup, key=len, reverse=True)
+
+    @classmethod
+    def from_csv(cls, path=COSTS_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(csv.DictReader(f))
+
+    def find(self, destination):
+        """Row index for a destination name, or None if it isn't in the table"""
+        name = _normalize_name(destination)
+        if name in self.lookup:
+            return self.lookup[name]
+        # LLM suggestions often look like "Manali, Himachal Pradesh"
+        for pattern in self.patterns:
+            if re.search(rf"\b{re.escape(pattern)}\b", name):
+                return self.lookup[pattern]
+        return None
+
+
+_costs = None
+
+
+def get_destination_costs():
+    """Load the destination cost table once per process"""
+    global _costs
+    if _costs is None:
+        _costs = DestinationCosts.from_csv()
+    return _costs
+
+
+def accommodation_tier(accommodation_type):
+    """Index of an accommodation option, defaulting to a budget hotel"""
+    try:
+        return ACCOMMODATION_TYPES.index(accommodation_type)
+    except ValueError:
+        name = str(accommodation_type).lower()
+        for i, option in enumerate(ACCOMMODATION_TYPES):
+            if option.lower() in name or name in option.lower():
+                return i
+        return 1
+
+
+def activity_cost(interests):
+    """Average daily activity spend for the interests mentioned in free text"""
+    text = str(interests or "").lower()
+    costs = [cost for keyword, cost in INTEREST_COSTS.items() if keyword in text]
+    return float(np.mean(costs)) if costs else float(DEFAULT_ACTIVITY_COST)
+
+
+def trip_days(dates):
+    """
+    Number of travel days (inclusive) from the dates passed to the budget agent
+
+    Accepts a dict with start_date/end_date (YYYY-MM-DD) or duration, a pair of
+    dates, or the "May 01 to May 05" style range used by the app.
+    """
+    if isinstance(dates, dict):
+        if dates.get('start_date') and dates.get('end_date'):
+            start = datetime.strptime(str(dates['start_date']), '%Y-%m-%d').date()
+            end = datetime.strptime(str(dates['end_date']), '%Y-%m-%d').date()
+            return max((end - start).days + 1, 1)
+        return max(int(dates.get('duration', 1)), 1)
+
+    if isinstance(dates, (tuple, list)) and len(dates) == 2:
+        start, end = [d if isinstance(d, date) else datetime.strptime(str(d), '%Y-%m-%d').date() for d in dates]
+        return max((end - start).days + 1, 1)
+
+    start_text, end_text = [part.strip() for part in str(dates).split(" to ")]
+    for fmt in ('%Y-%m-%d', '%B %d, %Y', '%B %d', '%b %d'):
+        try:
+            start = datetime.strptime(start_text, fmt)
+            end = datetime.strptime(end_text, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"Unrecognized date range: {dates}")
+
+    days = (end - start).days
+    if days < 0:  # Range crosses New Year without a year in it
+        days += 365
+    return days + 1
+
+
+def round_up(amounts):
+    return (np.ceil(np.asarray(amounts, dtype=float) / ROUNDING) * ROUNDING).astype(int)
+
+
+def estimate_budget(destination, days, accommodation_type, interests, flight_cost=None):
+    """
+    Estimate a trip total from the local cost tables
+
+    Args:
+        destination (str): Destination name
+        days (int): Travel days, inclusive (nights = days - 1)
+        accommodation_type (str): One of ACCOMMODATION_TYPES
+        interests (str): Traveler's interests
+        flight_cost (int): Round-trip flight price, if known
+
+    Returns:
+        int: Total budget in INR, or None if the destination isn't in the tables
+    """
+    costs = get_destination_costs()
+    row = costs.find(destination)
+    if row is None:
+        return None
+
+    tier = accommodation_tier(accommodation_type)
+    nights = max(days - 1, 0)
+    total = (
+        nights * costs.nightly[row, tier]
+        + days * (costs.daily[row, tier] + activity_cost(interests))
+        + (flight_cost or 0)
+    )
+    return int(round_up(total))
+
+
+def quote_budgets(destinations, accommodation_types=None, date_ranges=None, interests="", flight_costs=None):
+    """
+    Quote trip totals for every destination x accommodation tier x date range at once
+
+    Destinations missing from the cost tables are priced at national-average
+    rates and flagged in 'known'.
+
+    Args:
+        destinations (list): Destination names
+        accommodation_types (list): Accommodation options (default: all of ACCOMMODATION_TYPES)
+        date_ranges (list): Anything trip_days accepts, e.g. "May 01 to May 05"
+        interests (str): Traveler's interests
+        flight_costs (dict or list): Flight price per destination (by name or in order)
+
+    Returns:
+        dict: destinations, accommodation_types, date_ranges, known (bool per
+        destination) and totals (int array shaped destinations x tiers x date ranges)
+    """
+    destinations = list(destinations)
+    accommodation_types = list(accommodation_types or ACCOMMODATION_TYPES)
+    date_ranges = list(date_ranges or [])
+    costs = get_destination_costs()
+
+    rows = [costs.find(d) for d in destinations]
+    known = np.array([r is not None for r in rows], dtype=bool)
+    tiers = np.array([accommodation_tier(a) for a in accommodation_types])
+
+    # Unknown destinations fall back to index 1.0 (national average)
+    nightly = np.tile(NIGHTLY_RATES[tiers], (len(destinations), 1))
+    daily = np.tile(DAILY_SPEND[tiers], (len(destinations), 1))
+    known_rows = [r for r in rows if r is not None]
+    nightly[known] = costs.nightly[known_rows][:, tiers]
+    daily[known] = costs.daily[known_rows][:, tiers]
+
+    days = np.array([trip_days(d) for d in date_ranges], dtype=float)
+    nights = np.maximum(days - 1, 0)
+
+    if isinstance(flight_costs, dict):
+        flights = np.array([flight_costs.get(d) or 0 for d in destinations], dtype=float)
+    elif flight_costs is not None:
+        flights = np.array([c or 0 for c in flight_costs], dtype=float)
+    else:
+        flights = np.zeros(len(destinations))
+
+    totals = (
+        nightly[:, :, None] * nights[None, None, :]
+        + (daily[:, :, None] + activity_cost(interests)) * days[None, None, :]
+        + flights[:, None, None]
+    )
+
+    return {
+        "destinations": destinations,
+        "accommodation_types": accommodation_types,
+        "date_ranges": date_ranges,
+        "known": known,
+        "totals": round_up(totals),
+    }
+
+
+def quote_table(quote, date_index=0):
+    """Flatten one date range of a quote into columns for st.dataframe"""
+    table = {"Destination": [
+        name if known else f"{name} (estimate)"
+        for name, known in zip(quote["destinations"], quote["known"])
+    ]}
+    for t, accommodation_type in enumerate(quote["accommodation_types"]):
+        table[accommodation_type] = [f"₹{int(v):,}" for v in quote["totals"][:, t, date_index]]
+    return table
@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from agents.llm_scheduler import get_scheduler, model_name
+from agents.telemetry import span
+
+# On-disk cache shared by every Streamlit session and worker on this machine
+CACHE_PATH = os.getenv(
+    "TRAVEL_BUDDY_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "travel_buddy.sqlite3")
+)
+
+# Per-agent freshness (seconds) and size limits for cached LLM responses
+AGENT_TTLS = {
+    "destination": 7 * 24 * 3600,
+    "budget": 24 * 3600,
+    "itinerary": 24 * 3600,
+    "itinerary_day": 24 * 3600,
+    "weather": 30 * 60,
+}
+AGENT_MAX_ENTRIES = {
+    "destination": 5000,
+    "budget": 5000,
+    "itinerary": 1000,
+    "itinerary_day": 5000,
+    "weather": 2000,
+}
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _connection():
+    """Open the shared SQLite connection on first use"""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False, timeout=10)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_access)")
+        _conn.commit()
+    return _conn
+
+
+def normalize(value):
+    """Normalize prompt variables so trivially different inputs share a key"""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def make_key(*parts):
+    """Hash normalized key parts into a stable cache key"""
+    payload = json.dumps(normalize(list(parts)), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """TTL-bounded, LRU-evicted key/value namespace inside the shared SQLite file"""
+
+    def __init__(self, namespace, ttl, max_entries=1000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with _lock:
+            conn = _connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    conn.commit()
+                self.misses += 1
+                return default
+            conn.execute(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with _lock:
+            conn = _connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), expires_at, now)
+            )
+            # Evict least recently used entries beyond the size limit
+            conn.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.namespace, self.namespace, self.max_entries))
+            conn.commit()
+
+    def clear(self):
+        with _lock:
+            conn = _connection()
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+_agent_caches = {}
+
+
+def agent_cache(agent):
+    """Get the response cache for one of the LLM agents"""
+    if agent not in _agent_caches:
+        _agent_caches[agent] = DiskCache(
+            f"llm:{agent}",
+            ttl=AGENT_TTLS.get(agent, 3600),
+            max_entries=AGENT_MAX_ENTRIES.get(agent, 1000)
+        )
+    return _agent_caches[agent]
+
+
+def prompt_version(chain):
+    """Short hash of the prompt template a prompt | llm chain starts with, so editing a prompt misses old entries"""
+    prompt = getattr(chain, "first", None)
+    try:
+        template = prompt.pretty_repr()
+    except Exception:
+        return None
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def chain_key(chain, variables):
+    """Cache key of a call: the model, the prompt template and the prompt variables"""
+    return make_key(model_name(chain), prompt_version(chain), variables)
+
+
+def _content(result):
+    """What gets cached for a call: the message text, or the parsed model of a structured-output call"""
+    if isinstance(result, dict) and "parsed" in result:
+        # with_structured_output(..., include_raw=True)
+        if result["parsed"] is None:
+            raise ValueError(f"Structured output did not parse: {result.get('parsing_error')}")
+        return result["parsed"].model_dump()
+    return result.content if hasattr(result, "content") else str(result)
+
+
+def cached_invoke(agent, chain, variables):
+    """
+    Invoke a prompt | llm chain through the agent's response cache
+
+    Args:
+        agent (str): Agent name, selects TTL and size limit
+        chain: LangChain runnable returning a message, or a structured-output
+            runnable built with include_raw=True
+        variables (dict): Prompt variables
+
+    Returns:
+        str: Response content (a dict for structured output)
+    """
+    cache = agent_cache(agent)
+    key = chain_key(chain, variables)
+    with span("llm", agent=agent) as s:
+        content = cache.get(key)
+        if content is not None:
+            s.set(cache="hit")
+            return content
+
+        s.set(cache="miss")
+        result = get_scheduler().invoke(chain, variables)
+        content = _content(result)
+        cache.set(key, content)
+        return content
+
+
+def cached_stream(agent, chain, variables):
+    """
+    Stream a prompt | llm chain through the agent's response cache
+
+    A cached response is yielded in one piece; otherwise chunks are yielded as
+    they arrive and the full response is cached once the stream completes.
+
+    Yields:
+        str: Response content fragments
+    """
+    cache = agent_cache(agent)
+    key = chain_key(chain, variables)
+    with span("llm", agent=agent, stream=True) as s:
+        content = cache.get(key)
+        if content is not None:
+            s.set(cache="hit")
+            yield content
+            return
+
+        s.set(cache="miss")
+        parts = []
+        for chunk in get_scheduler().stream(chain, variables):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        cache.set(key, "".join(parts))
+
+
+def cached_stream_structured(agent, chain, variables, schema):
+    """
+    Stream a prompt | llm.bind_tools([schema]) chain through the agent's response cache
+
+    Shares cache entries with cached_invoke() on a with_structured_output(schema)
+    chain for the same model and variables. A cached response is yielded in one
+    piece; otherwise the tool call's arguments are yielded as they arrive.
+
+    Yields:
+        dict: The arguments so far (partial JSON, closed off); the last one is
+        the validated schema as a dict, which is what gets cached
+    """
+    from langchain_core.utils.json import parse_partial_json
+    cache = agent_cache(agent)
+    key = chain_key(chain, variables)
+    with span("llm", agent=agent, stream=True) as s:
+        content = cache.get(key)
+        if content is not None:
+            s.set(cache="hit")
+            yield content
+            return
+
+        s.set(cache="miss")
+        arguments = ""
+        for chunk in get_scheduler().stream(chain, variables):
+            calls = getattr(chunk, "tool_call_chunks", None) or []
+            parts = [c.get("args") or "" for c in calls if c.get("index") in (None, 0)]
+            if any(parts):
+                arguments += "".join(parts)
+                partial = parse_partial_json(arguments)
+                if partial:
+                    yield partial
+        content = schema.model_validate_json(arguments or "{}").model_dump()
+        cache.set(key, content)
+        yield content
+
+
+async def acached_invoke(agent, chain, variables):
+    """Async cached_invoke() for the API service (the SQLite lookup stays synchronous, it is sub-millisecond)"""
+    cache = agent_cache(agent)
+    key = chain_key(chain, variables)
+    with span("llm", agent=agent) as s:
+        content = cache.get(key)
+        if content is not None:
+            s.set(cache="hit")
+            return content
+
+        s.set(cache="miss")
+        result = await get_scheduler().ainvoke(chain, variables)
+        content = _content(result)
+        cache.set(key, content)
+        return content
+
+
+async def acached_stream(agent, chain, variables):
+    """Async cached_stream(); the response is only cached once the stream completes"""
+    cache = agent_cache(agent)
+    key = chain_key(chain, variables)
+    with span("llm", agent=agent, stream=True) as s:
+        content = cache.get(key)
+        if content is not None:
+            s.set(cache="hit")
+            yield content
+            return
+
+        s.set(cache="miss")
+        parts = []
+        async for chunk in get_scheduler().astream(chain, variables):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        cache.set(key, "".join(parts))
+
+
+def cached_batch_as_completed(agent, chain, variables_list, max_concurrency=4):
+    """
+    Run many prompt | llm calls concurrently through the agent's response cache
+
+    Cached responses are yielded first; the misses run through a bounded
+    batch executor and are yielded as each one finishes.
+
+    Yields:
+        tuple: (index into variables_list, response content)
+    """
+    cache = agent_cache(agent)
+    keys = [chain_key(chain, variables) for variables in variables_list]
+
+    missing = []
+    for index, key in enumerate(keys):
+        content = cache.get(key)
+        if content is None:
+            missing.append(index)
+        else:
+            yield index, content
+
+    if not missing:
+        return
+
+    # Each call still queues through the shared rate-limit scheduler
+    from langchain_core.runnables import RunnableLambda
+    scheduler = get_scheduler()
+
+    def scheduled_invoke(variables):
+        with span("llm", agent=agent, cache="miss", batch=True):
+            return scheduler.invoke(chain, variables)
+
+    scheduled = RunnableLambda(scheduled_invoke)
+    results = scheduled.batch_as_completed(
+        [variables_list[i] for i in missing],
+        config={"max_concurrency": max_concurrency}
+    )
+    for position, result in results:
+        index = missing[position]
+        content = _content(result)
+        cache.set(keys[index], content)
+        yield index, content
+
+
+def cache_stats():
+    """Hit/miss counters for every agent cache used in this process"""
+    return {agent: cache.stats() for agent, cache in _agent_caches.items()}
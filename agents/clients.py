@@ -0,0 +1,56 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Model used by every agent unless it asks for another one
+DEFAULT_MODEL = "Gemma2-9b-It"
+
+# The Amadeus SDK reads AMADEUS_HOST and AMADEUS_PORT itself but would take
+# any AMADEUS_SSL string as true; plain HTTP is only for local stand-ins
+AMADEUS_SSL = os.getenv("AMADEUS_SSL", "1").lower() not in ("0", "false", "no")
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_secret(name):
+    """Read an API key from the environment (.env) or Streamlit secrets"""
+    value = os.getenv(name)
+    if value:
+        return value
+    import streamlit as st
+    try:
+        return st.secrets[name]
+    except Exception:
+        # Outside Streamlit (CLI, service) there may be no secrets file at all
+        raise KeyError(f"{name} is not set in the environment, .env or Streamlit secrets") from None
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_llm(model_name=DEFAULT_MODEL):
+    """Process-wide chat model, created (and langchain_groq imported) on first use"""
+    def create():
+        from langchain_groq import ChatGroq
+        # Retries and backoff are handled by the shared LLM scheduler
+        return ChatGroq(model_name=model_name, api_key=get_secret("GROQ_API_KEY"), max_retries=0)
+    return _get_or_create(("llm", model_name), create)
+
+
+def get_amadeus():
+    """Process-wide Amadeus client, created on first use"""
+    def create():
+        from amadeus import Client
+        return Client(
+            client_id=get_secret("AMADEUS_API_KEY"),
+            client_secret=get_secret("AMADEUS_SECRET_KEY"),
+            ssl=AMADEUS_SSL
+        )
+    return _get_or_create("amadeus", create)
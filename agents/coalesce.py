@@ -0,0 +1,97 @@
+import asyncio
+
+
+class RequestCoalescer:
+    """
+    Share one in-flight call among identical concurrent requests
+
+    The first request for a key starts the call; requests for the same key
+    that arrive before it finishes await the same task. A client that
+    disconnects doesn't cancel the call for the others (or for the cache).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key, fn):
+        """Await fn() (a coroutine function), or the call already running for key"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+class _SharedStream:
+    """Chunks produced so far by one upstream stream, and a way to wait for more"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.task = None
+
+    def notify(self):
+        # Wake everyone waiting on the current event and give later waiters a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class StreamCoalescer:
+    """
+    Share one upstream stream among identical concurrent requests
+
+    Late joiners get the chunks produced so far, then follow the live stream.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def stream(self, key, fn):
+        """Yield the chunks of fn() (an async generator function), or of the stream already running for key"""
+        shared = self._streams.get(key)
+        if shared is None:
+            self.calls += 1
+            shared = _SharedStream()
+            self._streams[key] = shared
+            shared.task = asyncio.ensure_future(self._pump(key, shared, fn))
+        else:
+            self.coalesced += 1
+
+        index = 0
+        while True:
+            while index < len(shared.chunks):
+                yield shared.chunks[index]
+                index += 1
+            if shared.done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+            await shared.changed.wait()
+
+    async def _pump(self, key, shared, fn):
+        try:
+            async for chunk in fn():
+                shared.chunks.append(chunk)
+                shared.notify()
+        except Exception as e:
+            shared.error = e
+        finally:
+            shared.done = True
+            self._streams.pop(key, None)
+            shared.notify()
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._streams)}
@@ -1,15 +1,10 @@
-import os
-from dotenv import load_dotenv
-load_dotenv()
-import streamlit as st
-os.environ['GROQ_API_KEY'] = st.secrets["GROQ_API_KEY"]
+from agents.cache import cached_invoke, acached_invoke
+from agents.clients import get_llm
+from agents.telemetry import traced
+from agents.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache, semantic_cached
 
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-
-llm = ChatGroq(model_name='Gemma2-9b-It')
-
-def destination(preferences, budget, interests):
+def destination_chain():
+    """prompt | llm chain shared by destination and adestination"""
     generic_template = (
        """You are a travel assistant. Based on the following user inputs:
         - Preferred region(s): {preferences}
@@ -22,15 +17,36 @@ def destination(preferences, budget, interests):
         Only return the names of the destinations in **bullet points**. Do not include any descriptions, explanations, or additional information. Stick to this point. Dont even give any text like here you go. Just the destinations are expected."""
     )
 
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_template(generic_template)
-    chain = prompt | llm
+    return prompt | get_llm()
+
+@traced("agent.destination")
+def destination(preferences, budget, interests):
+    try:
+        variables = {"preferences": preferences, "budget": budget, "interests": interests}
+        # Reworded preferences and interests ("food and beaches" / "beaches, food") share a response
+        return semantic_cached("destination", budget, [preferences, interests],
+                               lambda: cached_invoke("destination", destination_chain(), variables))
+    except Exception as e:
+        return f"❌ Destination recommendation failed: {str(e)}"
 
+async def adestination(preferences, budget, interests):
+    """Async destination() for the API service"""
     try:
-        result = chain.invoke({
-            "preferences": preferences,
-            "budget": budget,
-            "interests": interests
-        })
-        return result.content
+        variables = {"preferences": preferences, "budget": budget, "interests": interests}
+        cache = semantic_cache("destination") if SEMANTIC_CACHE_ENABLED else None
+        response = cache.get(budget, [preferences, interests]) if cache else None
+        if response is None:
+            response = await acached_invoke("destination", destination_chain(), variables)
+            if cache:
+                cache.set(budget, [preferences, interests], response)
+        return response
     except Exception as e:
-        return f"❌ Destination recommendation failed: {str(e)}"
\ No newline at end of file
+        return f"❌ Destination recommendation failed: {str(e)}"
+
+def parse_destinations(destination_response):
+    """Destination names from the agent's bullet-point response"""
+    if not isinstance(destination_response, str):
+        return []
+    return [line.strip('- *•').strip() for line in destination_response.split('\n') if line.strip()]
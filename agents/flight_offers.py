@@ -0,0 +1,157 @@
+from datetime import datetime
+import numpy as np
+
+AMADEUS_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def format_duration(iso_duration):
+    """Turn an ISO-8601 duration like PT2H10M into 2h 10m"""
+    return iso_duration.replace('PT', '').replace('H', 'h ').replace('M', 'm').strip()
+
+
+class FlightLeg:
+    """One direction of a flight offer, parsed from the Amadeus itinerary"""
+
+    __slots__ = ('airline', 'flight_number', 'departure_airport', 'arrival_airport',
+                 'departure_time', 'arrival_time', 'duration', 'stops')
+
+    def __init__(self, itinerary):
+        first = itinerary['segments'][0]
+        last = itinerary['segments'][-1]
+        self.airline = first['carrierCode']
+        self.flight_number = f"{first['carrierCode']}{first['number']}"
+        self.departure_airport = first['departure']['iataCode']
+        self.arrival_airport = last['arrival']['iataCode']
+        self.departure_time = datetime.strptime(first['departure']['at'], AMADEUS_TIME_FORMAT)
+        self.arrival_time = datetime.strptime(last['arrival']['at'], AMADEUS_TIME_FORMAT)
+        self.duration = format_duration(itinerary['duration'])
+        self.stops = len(itinerary['segments']) - 1
+
+    def endpoint(self, airport, city, when):
+        return {
+            'airport': airport,
+            'city': city,
+            'time': when.strftime('%H:%M'),
+            'date': when.strftime('%Y-%m-%d'),
+            'datetime': when.strftime('%a, %b %d %H:%M')
+        }
+
+
+class FlightOffer:
+    """Compact flight offer; the raw Amadeus payload is not kept"""
+
+    __slots__ = ('price', 'origin_airport', 'dest_airport', 'outbound', 'return_leg')
+
+    def __init__(self, price, origin_airport, dest_airport, outbound, return_leg=None):
+        self.price = price
+        self.origin_airport = origin_airport
+        self.dest_airport = dest_airport
+        self.outbound = outbound
+        self.return_leg = return_leg
+
+    @classmethod
+    def from_amadeus(cls, offer, origin_airport, dest_airport):
+        itineraries = offer['itineraries']
+        return cls(
+            price=int(float(offer['price']['total'])),
+            origin_airport=origin_airport,
+            dest_airport=dest_airport,
+            outbound=FlightLeg(itineraries[0]),
+            return_leg=FlightLeg(itineraries[1]) if len(itineraries) > 1 else None
+        )
+
+    def to_selection(self, number, origin_city, destination_city):
+        """Flight details in the format stored as st.session_state.selected_flight"""
+        out = self.outbound
+        flight_data = {
+            'number': number,
+            'price': self.price,
+            'airline': out.airline,
+            'flight_number': out.flight_number,
+            'departure': out.endpoint(self.origin_airport, origin_city, out.departure_time),
+            'arrival': out.endpoint(self.dest_airport, destination_city, out.arrival_time),
+            'duration': out.duration,
+            'stops': out.stops
+        }
+        ret = self.return_leg
+        if ret:
+            flight_data['return_flight'] = {
+                'airline': ret.airline,
+                'flight_number': ret.flight_number,
+                'departure': ret.endpoint(self.dest_airport, destination_city, ret.departure_time),
+                'arrival': ret.endpoint(self.origin_airport, origin_city, ret.arrival_time),
+                'duration': ret.duration,
+                'stops': ret.stops
+            }
+        return flight_data
+
+
+class FlightOfferSet:
+    """
+    Flight offers from one search with column arrays for vectorized sorting and filtering
+
+    The FlightOffer objects may be shared with the offer cache; per-search flags
+    (primary airport, cache age) live only in this set's arrays.
+    """
+
+    def __init__(self, offers=(), is_primary=(), cache_age=()):
+        self.offers = list(offers)
+        self.is_primary = np.asarray(is_primary, dtype=bool)
+        self.cache_age = np.asarray(cache_age, dtype=float)
+        self.price = np.array([o.price for o in self.offers], dtype=float)
+        self.stops = np.array([o.outbound.stops for o in self.offers], dtype=int)
+        self.departure_minute = np.array(
+            [o.outbound.departure_time.hour * 60 + o.outbound.departure_time.minute for o in self.offers],
+            dtype=int
+        )
+        self.dest_airport = np.array([o.dest_airport for o in self.offers], dtype=object)
+
+    @classmethod
+    def combine(cls, groups):
+        """Build one set from (offers, is_primary, cache_age) groups"""
+        offers, primary, ages = [], [], []
+        for group_offers, is_primary, cache_age in groups:
+            offers.extend(group_offers)
+            primary.extend([is_primary] * len(group_offers))
+            ages.extend([cache_age] * len(group_offers))
+        return cls(offers, primary, ages)
+
+    def __len__(self):
+        return len(self.offers)
+
+    def __iter__(self):
+        return iter(zip(self.offers, self.is_primary, self.cache_age))
+
+    def _take(self, positions):
+        return FlightOfferSet(
+            [self.offers[i] for i in positions],
+            self.is_primary[positions],
+            self.cache_age[positions]
+        )
+
+    def sorted(self, primary_first=True):
+        """Sort by price, primary airport offers first"""
+        keys = (self.price, ~self.is_primary) if primary_first else (self.price,)
+        return self._take(np.lexsort(keys))
+
+    def filter(self, max_price=None, max_stops=None, departure_window=None, airports=None):
+        """
+        Keep offers matching every given condition
+
+        Args:
+            max_price (float): Highest total price
+            max_stops (int): Most outbound stops
+            departure_window (tuple): (earliest, latest) outbound departure as minutes after midnight
+            airports (list): Allowed destination airport codes
+        """
+        mask = np.ones(len(self.offers), dtype=bool)
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if max_stops is not None:
+            mask &= self.stops <= max_stops
+        if departure_window is not None:
+            earliest, latest = departure_window
+            mask &= (self.departure_minute >= earliest) & (self.departure_minute <= latest)
+        if airports:
+            mask &= np.isin(self.dest_airport, list(airports))
+        return self._take(np.flatnonzero(mask))
@@ -0,0 +1,111 @@
+import os
+import re
+import time
+import threading
+import requests
+
+from agents.cache import DiskCache
+from agents.http_client import http_get
+from agents.telemetry import span
+
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+USER_AGENT = "TravelBuddy/1.0"
+
+# Nominatim usage policy: at most 1 request per second, identify the app, cache results
+# (a self-hosted instance or the benchmark fakes can lower the interval)
+MIN_REQUEST_INTERVAL = float(os.getenv("NOMINATIM_MIN_INTERVAL", "1.0"))
+FOUND_TTL = 30 * 24 * 3600
+NOT_FOUND_TTL = 24 * 3600
+
+# Old or alternative names that should share one cache entry
+ALIASES = {
+    "bombay": "mumbai",
+    "bengaluru": "bangalore",
+    "madras": "chennai",
+    "calcutta": "kolkata",
+    "trivandrum": "thiruvananthapuram",
+    "cochin": "kochi",
+    "calicut": "kozhikode",
+    "pondicherry": "puducherry",
+    "vizag": "visakhapatnam",
+    "gurgaon": "gurugram",
+    "banaras": "varanasi",
+    "benares": "varanasi",
+    "allahabad": "prayagraj",
+    "mysuru": "mysore",
+    "ooty": "udhagamandalam",
+    "new delhi": "delhi",
+}
+
+_cache = DiskCache("geocode", ttl=FOUND_TTL, max_entries=20000)
+_throttle_lock = threading.Lock()
+_last_request = 0.0
+
+
+def normalize_place(place_name):
+    """Lowercase, strip punctuation and a trailing country, then resolve aliases"""
+    name = re.sub(r"[^\w\s]", " ", str(place_name).lower())
+    name = " ".join(name.split())
+    name = re.sub(r"\s+india$", "", name)
+    return ALIASES.get(name, name)
+
+
+def _throttle():
+    """Block until the next Nominatim request is allowed"""
+    global _last_request
+    with _throttle_lock:
+        wait = _last_request + MIN_REQUEST_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+
+
+def _query_nominatim(name):
+    _throttle()
+    params = {
+        "q": name,
+        "format": "json",
+        "limit": 1
+    }
+    with span("nominatim.search") as s:
+        response = http_get(NOMINATIM_URL, params=params, headers={"User-Agent": USER_AGENT})
+        s.set(status=response.status_code)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Nominatim returned {response.status_code}", response=response)
+    data = response.json()
+    if not data:
+        return None
+    return float(data[0]["lat"]), float(data[0]["lon"])
+
+
+def geocode(place_name):
+    """
+    Get coordinates for a place, using the shared geocoding cache
+
+    Misses are cached too (for a shorter time) so unknown names don't keep
+    hitting Nominatim. Network errors are raised and never cached.
+
+    Returns:
+        tuple: (lat, lon), or None if the place could not be found
+    """
+    name = normalize_place(place_name)
+    if not name:
+        return None
+
+    with span("geocode", place=name) as s:
+        cached = _cache.get(name)
+        if cached is not None:
+            s.set(cache="hit")
+            return (cached["lat"], cached["lon"]) if cached.get("found") else None
+
+        s.set(cache="miss")
+        coords = _query_nominatim(name)
+        if coords:
+            _cache.set(name, {"found": True, "lat": coords[0], "lon": coords[1]})
+        else:
+            _cache.set(name, {"found": False}, ttl=NOT_FOUND_TTL)
+        return coords
+
+
+def geocode_stats():
+    return _cache.stats()
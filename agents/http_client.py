@@ -0,0 +1,84 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds so a slow upstream can't hang a Streamlit worker
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Keep-alive connections kept open per host
+POOL_MAXSIZE = 10
+
+# Retry idempotent requests on rate limits and server errors with jittered backoff
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_JITTER = 0.3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        backoff_jitter=RETRY_JITTER,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url):
+    """Shared keep-alive session for the host of a URL"""
+    host = urlsplit(url).netloc
+    with _lock:
+        if host not in _sessions:
+            _sessions[host] = _build_session()
+        return _sessions[host]
+
+
+def http_get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT):
+    """
+    GET through the pooled session for the URL's host
+
+    Rate-limit and server-error responses are retried with backoff; once the
+    retries are used up, the last response is returned for the caller to handle.
+
+    Returns:
+        requests.Response
+    """
+    return get_session(url).get(url, params=params, headers=headers, timeout=timeout)
+
+
+def connection_stats():
+    """Requests sent and connections opened per host, to show how often keep-alive reuse kicks in"""
+    stats = {}
+    with _lock:
+        sessions = list(_sessions.items())
+    for host, session in sessions:
+        requests_sent = 0
+        connections_opened = 0
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+        stats[host] = {
+            "requests": requests_sent,
+            "new_connections": connections_opened,
+            "reused_connections": max(requests_sent - connections_opened, 0),
+        }
+    return stats
@@ -1,15 +1,46 @@
 import os
-from dotenv import load_dotenv
-load_dotenv()
-import streamlit as st
-os.environ['GROQ_API_KEY'] = st.secrets["GROQ_API_KEY"]
-
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-
-llm = ChatGroq(model_name='Gemma2-9b-It')
+import asyncio
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from agents.cache import (
+    make_key, cached_invoke, cached_stream, cached_stream_structured, cached_batch_as_completed, acached_invoke, acached_stream
+)
+from agents.clients import get_llm
+from agents.telemetry import span, current_span, traced
+from agents.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache, semantic_cached
+
+# Trips at least this long are generated day-by-day in parallel
+PARALLEL_MIN_DAYS = int(os.getenv("ITINERARY_PARALLEL_MIN_DAYS", 4))
+# Maximum number of day prompts in flight at once
+PARALLEL_MAX_CONCURRENCY = int(os.getenv("ITINERARY_MAX_CONCURRENCY", 4))
+
+# Send the day framework as one short line per day instead of the full markdown
+# template (ITINERARY_COMPACT_PROMPTS=0 goes back to the template)
+COMPACT_PROMPTS = os.getenv("ITINERARY_COMPACT_PROMPTS", "1") != "0"
+
+# Time slots every full day follows, stated once per prompt in compact mode
+ACTIVITY_SLOTS = ("8:00 AM breakfast, 9:30 AM interest-focused activity, 12:00 PM lunch, "
+                  "2:00 PM local experience, 4:30 PM landmark, 6:00 PM sunset, 8:00 PM dinner")
+
+SYSTEM_PROMPT = """You're a professional travel designer. Create detailed itineraries with:
+         - Creative day titles with emojis
+         - Well-timed morning/afternoon/evening activities
+         - Local restaurant and attraction recommendations
+         - Transportation notes
+         - Budget estimates
+         - Insider tips"""
+
+OUTPUT_REQUIREMENTS = """**Output Requirements:**
+1. Each day gets a creative title (emoji + catchy phrase)
+2. Group activities into Morning/Afternoon/Evening
+3. Include specific timings, venue names, and costs
+4. Add local tips and transportation notes
+5. Use consistent markdown formatting"""
 
-def generate_itinerary(destination, dates, budget, interests, flight_details=None):
+@traced("agent.itinerary")
+def generate_itinerary(destination, dates, budget, interests, flight_details=None,
+                       parallel=False, max_concurrency=PARALLEL_MAX_CONCURRENCY, days_per_chunk=1, structured=False):
     """
     Generate a detailed travel itinerary with flight information, daily activities, and budget breakdown
     
@@ -19,43 +50,689 @@ def generate_itinerary(destination, dates, budget, interests, flight_details=Non
         budget (int): Total trip budget in INR
         interests (str): Traveler's interests
         flight_details (dict): Flight arrival/departure details
+        parallel (bool): Generate each day (or chunk of days) as its own concurrent prompt
+        max_concurrency (int): Maximum day prompts running at once in parallel mode
+        days_per_chunk (int): Days covered by each prompt in parallel mode
+        structured (bool): Build it from per-day DayPlans (see plan_itinerary)
     
     Returns:
         str: Formatted markdown itinerary
     """
     try:
-        # Validate inputs
-        if not destination or not isinstance(destination, str):
-            return "❌ Invalid destination provided"
-            
-        if not dates or 'duration' not in dates:
-            return "❌ Invalid dates provided"
-            
+        request = prepare_itinerary_request(destination, dates, budget, interests, flight_details)
+        if isinstance(request, str):
+            return request
+
+        def generate():
+            if structured:
+                plan = plan_itinerary(destination, dates, budget, interests, flight_details, max_concurrency)
+                return "".join(render_day(day) for day in plan.days)
+            if parallel:
+                return "\n".join(generate_days(request, max_concurrency, days_per_chunk))
+            # Generate and format the output
+            chain = request['prompt'] | get_llm()
+            return cached_invoke("itinerary", chain, request['variables'])
+
+        # Reworded interests ("beaches, food" / "food and beaches") share the generated days
+        mode = "structured" if structured else parallel
+        content = semantic_cached("itinerary", semantic_inputs(request, dates, flight_details, mode, days_per_chunk),
+                                  [interests], generate)
+        
+        return format_final_itinerary(destination, request['duration'], request['budget'], interests, content)
+
+    except Exception as e:
+        return f"❌ Itinerary generation failed: {str(e)}"
+
+@traced("agent.itinerary_stream")
+def stream_itinerary(destination, dates, budget, interests, flight_details=None,
+                     parallel=None, max_concurrency=PARALLEL_MAX_CONCURRENCY, days_per_chunk=1):
+    """
+    Stream the itinerary as markdown chunks while the LLM generates it
+
+    Takes the same arguments as generate_itinerary. Joining all yielded chunks
+    gives the same document generate_itinerary returns. With parallel=None,
+    trips of PARALLEL_MIN_DAYS or more are generated day-by-day in parallel and
+    each day is yielded in order as soon as it is ready.
+
+    Yields:
+        str: Markdown fragments (header, generated content, travel tips)
+    """
+    try:
+        request = prepare_itinerary_request(destination, dates, budget, interests, flight_details)
+        if isinstance(request, str):
+            yield request
+            return
+
+        if parallel is None:
+            parallel = request['duration'] >= PARALLEL_MIN_DAYS
+
+        yield itinerary_header(destination, request['duration'], request['budget'], interests)
+        exact = semantic_inputs(request, dates, flight_details, parallel, days_per_chunk)
+        cache = semantic_cache("itinerary") if SEMANTIC_CACHE_ENABLED else None
+        content = cache.get(exact, [interests]) if cache else None
+        if content is not None:
+            yield content
+        else:
+            parts = []
+            if parallel:
+                for i, day in enumerate(generate_days(request, max_concurrency, days_per_chunk)):
+                    parts.append(day if i == 0 else "\n" + day)
+                    yield parts[-1]
+            else:
+                chain = request['prompt'] | get_llm()
+                for chunk in cached_stream("itinerary", chain, request['variables']):
+                    parts.append(chunk)
+                    yield chunk
+            if cache:
+                cache.set(exact, [interests], "".join(parts))
+        yield itinerary_footer()
+
+    except Exception as e:
+        yield f"❌ Itinerary generation failed: {str(e)}"
+
+def generate_days(request, max_concurrency=PARALLEL_MAX_CONCURRENCY, days_per_chunk=1):
+    """
+    Generate the itinerary one day (or chunk of days) per prompt, concurrently
+
+    Every prompt carries the same compact trip context so days stay consistent
+    without seeing each other's output.
+
+    Yields:
+        str: Generated markdown for each chunk, in day order
+    """
+    chain, variables_list = day_prompts(request, days_per_chunk)
+
+    # Yield chunks in day order, holding back any that finish early
+    ready = {}
+    next_index = 0
+    for index, content in cached_batch_as_completed("itinerary", chain, variables_list, max_concurrency):
+        ready[index] = content
+        while next_index in ready:
+            yield ready.pop(next_index)
+            next_index += 1
+
+def semantic_inputs(request, dates, flight_details, mode, days_per_chunk):
+    """Inputs that must match exactly for the semantic cache to reuse an itinerary's days"""
+    return [request['variables']['destination'], dates.get('start_date'), request['duration'], request['budget'],
+            flight_details, mode, days_per_chunk, COMPACT_PROMPTS]
+
+def day_prompts(request, days_per_chunk=1):
+    """
+    Build the per-day prompt chain and one set of variables per chunk of days
+
+    Returns:
+        tuple: (prompt | llm chain, list of variables dicts in day order)
+    """
+    # One section per day: the last day's departure joins its activities
+    sections = []
+    for day, text in request['sections']:
+        if sections and sections[-1][0] == day:
+            sections[-1] = (day, sections[-1][1] + text)
+        else:
+            sections.append((day, text))
+    size = max(int(days_per_chunk), 1)
+    chunks = [sections[i:i + size] for i in range(0, len(sections), size)]
+
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", """Write only {day_label} of a {duration}-day itinerary for {destination}.
+
+**Trip Context:** {trip_context}
+**Flight Information:** {flight_info}
+
+""" + OUTPUT_REQUIREMENTS + """
+6. Cover only {day_label}, with no introduction or closing notes
+
+**Day Framework:**
+{itinerary_framework}""")
+    ])
+    chain = prompt | get_llm()
+
+    variables_list = []
+    for chunk in chunks:
+        days = [day for day, _ in chunk]
+        day_label = f"Day {days[0]}" if len(days) == 1 else f"Days {days[0]}-{days[-1]}"
+        variables_list.append({
+            "day_label": day_label,
+            "duration": request['duration'],
+            "destination": request['variables']['destination'],
+            "trip_context": request['trip_context'],
+            "flight_info": request['variables']['flight_info'],
+            "itinerary_framework": framework_text(chunk)
+        })
+    return chain, variables_list
+
+async def astream_itinerary(destination, dates, budget, interests, flight_details=None,
+                            parallel=None, max_concurrency=PARALLEL_MAX_CONCURRENCY, days_per_chunk=1):
+    """
+    Async stream_itinerary() for the API service
+
+    Takes the same arguments and yields the same fragments. In parallel mode
+    the day prompts run as concurrent tasks and each day is yielded in order.
+    """
+    try:
+        request = prepare_itinerary_request(destination, dates, budget, interests, flight_details)
+        if isinstance(request, str):
+            yield request
+            return
+
+        if parallel is None:
+            parallel = request['duration'] >= PARALLEL_MIN_DAYS
+
+        yield itinerary_header(destination, request['duration'], request['budget'], interests)
+        exact = semantic_inputs(request, dates, flight_details, parallel, days_per_chunk)
+        cache = semantic_cache("itinerary") if SEMANTIC_CACHE_ENABLED else None
+        content = cache.get(exact, [interests]) if cache else None
+        if content is not None:
+            yield content
+        else:
+            parts = []
+            if parallel:
+                chain, variables_list = day_prompts(request, days_per_chunk)
+                limit = asyncio.Semaphore(max_concurrency)
+
+                async def generate(variables):
+                    async with limit:
+                        return await acached_invoke("itinerary", chain, variables)
+
+                tasks = [asyncio.ensure_future(generate(variables)) for variables in variables_list]
+                try:
+                    for i, task in enumerate(tasks):
+                        day = await task
+                        parts.append(day if i == 0 else "\n" + day)
+                        yield parts[-1]
+                finally:
+                    for task in tasks:
+                        task.cancel()
+            else:
+                chain = request['prompt'] | get_llm()
+                async for chunk in acached_stream("itinerary", chain, request['variables']):
+                    parts.append(chunk)
+                    yield chunk
+            if cache:
+                cache.set(exact, [interests], "".join(parts))
+        yield itinerary_footer()
+
+    except Exception as e:
+        yield f"❌ Itinerary generation failed: {str(e)}"
+
+DAY_PROMPT = """Plan Day {day} of a {duration}-day trip to {destination}.
+
+**Trip Context:** {day_context}
+**Flight Information:** {flight_info}
+{changes}
+Give the day a creative title (emoji + catchy phrase), Morning/Afternoon/Evening activities with
+specific timings, named venues and per-person costs in INR, transportation notes and one insider tip.
+
+**Day Framework:**
+{itinerary_framework}"""
+
+def structured_day_chain():
+    """Prompt | llm chain returning one DayOutput (plus the raw message, for token counts)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from agents.itinerary_model import DayOutput
+    prompt = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("human", DAY_PROMPT)])
+    return prompt | get_llm().with_structured_output(DayOutput, include_raw=True)
+
+def streaming_day_chain():
+    """structured_day_chain() without the output parser, so the tool call can be streamed"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from agents.itinerary_model import DayOutput
+    prompt = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("human", DAY_PROMPT)])
+    return prompt | get_llm().bind_tools([DayOutput], tool_choice="DayOutput")
+
+def text_day_chain():
+    """Markdown version of structured_day_chain(), used when structured output fails"""
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", DAY_PROMPT + "\n\n" + OUTPUT_REQUIREMENTS + "\n6. Cover only this day, with no introduction or closing notes")
+    ])
+    return prompt | get_llm()
+
+def new_itinerary_plan(destination, dates, budget, interests, flight_details=None):
+    """
+    Validate the trip inputs into an empty ItineraryPlan
+
+    Raises:
+        ValueError: If the destination or dates are invalid
+    """
+    from agents.itinerary_model import ItineraryPlan
+    request = prepare_itinerary_request(destination, dates, budget, interests, flight_details)
+    if isinstance(request, str):
+        raise ValueError(request)
+    flight_details = flight_details if isinstance(flight_details, dict) else None
+    # Leave out the flight price, rounded so small budget changes keep the same days
+    ground_budget = max(request['budget'] - int((flight_details or {}).get('price') or 0), 0)
+    return ItineraryPlan(
+        destination=destination, dates=dict(dates), duration=request['duration'], budget=request['budget'],
+        daily_budget=int(round(ground_budget / request['duration'], -2)),
+        interests=str(interests), flight_details=flight_details
+    )
+
+def day_kind(plan, day):
+    """arrival, departure (last day with a return flight) or activity"""
+    if day == 1:
+        return "arrival"
+    if day == plan.duration and (plan.flight_details or {}).get('return_flight'):
+        return "departure"
+    return "activity"
+
+def day_variables(plan, day, revision=0, feedback=None):
+    """
+    Prompt variables for one day of a plan
+
+    Each day only sees the trip details that shape it: flights appear only in
+    the arrival and departure days, and the daily budget is fixed when the plan
+    is created. Changing the flight therefore changes (and regenerates) only
+    those two days; every other day keeps its cache key.
+    """
+    flights = plan.flight_details or {}
+    return_flight = flights.get('return_flight') or {}
+    daily_budget = plan.daily_budget
+
+    framework = framework_text(framework_sections(plan.destination, plan.duration, plan.interests, daily_budget,
+                                                  flights or None, [day]))
+    flight_lines = []
+    if day == 1 and flights:
+        arrival = flights.get('arrival') or {}
+        flight_lines.append(f"Arriving {arrival.get('time', 'afternoon')} at {arrival.get('airport', 'the airport')} "
+                            f"on {flights.get('airline', '')} {flights.get('flight_number', '')}".strip())
+    if day == plan.duration and return_flight:
+        departure = return_flight.get('departure') or {}
+        flight_lines.append(f"Departing {departure.get('time', '')} from {departure.get('airport', 'the airport')} "
+                            f"on {return_flight.get('airline', '')} {return_flight.get('flight_number', '')}".strip())
+
+    context = f"{plan.duration} days in {plan.destination}, about ₹{daily_budget:,}/day. Interests: {plan.interests}."
+    focus = daily_focus(plan.interests, list(range(2, plan.duration + 1)))
+    if focus:
+        context += " " + focus
+
+    changes = ""
+    if feedback:
+        changes = f"**Requested Changes:** {feedback}\n"
+    elif revision:
+        changes = "**Requested Changes:** Suggest different activities and venues from the previous version.\n"
+
+    return {
+        "day": day,
+        "duration": plan.duration,
+        "destination": plan.destination,
+        "day_context": context,
+        "flight_info": ". ".join(flight_lines) or "No flights this day",
+        "changes": changes,
+        "itinerary_framework": framework,
+        "revision": revision,  # Not in the prompt; gives each regenerated version its own cache key
+    }
+
+def structured_output_failed(error):
+    """
+    Whether an error means the model's structured output was unusable, so the
+    markdown fallback is worth a second call: a parse or validation error
+    (ValueError, which pydantic's ValidationError and LangChain's
+    OutputParserException are), or Groq rejecting a malformed tool call.
+    Rate limits, token budgets and network errors are not.
+    """
+    if isinstance(error, ValueError):
+        return True
+    return getattr(error, "status_code", None) == 400 and "tool_use_failed" in str(error)
+
+def generate_day(plan, day, revision=0, feedback=None):
+    """
+    Generate one DayPlan through the per-day cache
+
+    Falls back to a markdown day (DayPlan.text) if the model's structured
+    output can't be parsed; any other error is raised.
+    """
+    from agents.itinerary_model import DayPlan
+    variables = day_variables(plan, day, revision, feedback)
+    kind = day_kind(plan, day)
+    try:
+        data = cached_invoke("itinerary_day", structured_day_chain(), variables)
+        return DayPlan(**data, day=day, kind=kind, revision=revision)
+    except Exception as e:
+        if not structured_output_failed(e):
+            raise
+        with span("itinerary.markdown_fallback", day=day, reason=f"{type(e).__name__}: {e}"):
+            text = cached_invoke("itinerary", text_day_chain(), variables)
+        return DayPlan(title=f"Day {day}", activities=[], day=day, kind=kind, revision=revision, text=text)
+
+def stream_day(plan, day, revision=0, feedback=None):
+    """
+    generate_day(), yielding the day's markdown as the model writes it
+
+    Each activity appears once its JSON is complete. A cached day arrives in
+    one piece. If the structured output fails before anything was shown, the
+    markdown fallback streams token by token; after that, the error is raised.
+
+    Yields:
+        str: Markdown fragments
+
+    Returns:
+        DayPlan: The finished day, as the value of `yield from stream_day(...)`
+    """
+    from agents.itinerary_model import DayOutput, DayPlan
+    variables = day_variables(plan, day, revision, feedback)
+    kind = day_kind(plan, day)
+    shown = 0
+    try:
+        data = {}
+        for data in cached_stream_structured("itinerary_day", streaming_day_chain(), variables, DayOutput):
+            lines = streamed_day_lines(day, data)
+            for line in lines[shown:]:
+                yield line + "\n"
+            shown = max(shown, len(lines))
+        for line in streamed_day_lines(day, data, complete=True)[shown:]:
+            yield line + "\n"
+        return DayPlan(**data, day=day, kind=kind, revision=revision)
+    except Exception as e:
+        # Once lines are on the page a markdown day would repeat them, so only fall back before that
+        if shown or not structured_output_failed(e):
+            raise
+        reason = f"{type(e).__name__}: {e}"
+    parts = []
+    yield "\n"
+    with span("itinerary.markdown_fallback", day=day, reason=reason):
+        for chunk in cached_stream("itinerary", text_day_chain(), variables):
+            parts.append(chunk)
+            yield chunk
+    yield "\n"
+    return DayPlan(title=f"Day {day}", activities=[], day=day, kind=kind, revision=revision, text="".join(parts))
+
+def plan_days(plan, days=None, revisions=None, feedback=None, max_concurrency=PARALLEL_MAX_CONCURRENCY):
+    """
+    Generate days of a plan concurrently
+
+    Args:
+        plan (ItineraryPlan): Trip to generate for (not modified)
+        days (list): Day numbers to generate, all days by default
+        revisions (dict): Day number -> revision to generate
+        feedback (dict): Day number -> requested changes
+
+    Yields:
+        DayPlan: Each requested day, in day order
+    """
+    days = list(days or range(1, plan.duration + 1))
+    revisions = revisions or {}
+    feedback = feedback or {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(days)))) as executor:
+        futures = [
+            # Copy the context so the days keep the caller's LLM priority and trace
+            executor.submit(contextvars.copy_context().run, generate_day, plan, day, revisions.get(day, 0), feedback.get(day))
+            for day in days
+        ]
+        for future in futures:
+            yield future.result()
+
+@traced("agent.itinerary_plan")
+def plan_itinerary(destination, dates, budget, interests, flight_details=None, max_concurrency=PARALLEL_MAX_CONCURRENCY):
+    """
+    Generate a structured itinerary: one DayPlan per day, each cached on its own
+
+    Takes the same trip arguments as generate_itinerary.
+
+    Returns:
+        ItineraryPlan: The plan; render it with render_itinerary()
+    """
+    plan = new_itinerary_plan(destination, dates, budget, interests, flight_details)
+    plan.days = list(plan_days(plan, max_concurrency=max_concurrency))
+    return plan
+
+@traced("agent.itinerary_plan_stream")
+def stream_plan(plan, max_concurrency=PARALLEL_MAX_CONCURRENCY):
+    """
+    Generate every day of an empty plan, yielding markdown as it is written
+
+    Day 1 streams from this thread, activity by activity, while the other
+    days generate in the background and follow as each one is ready. plan.days
+    is filled in as the days are yielded.
+
+    Yields:
+        str: Markdown fragments (header, the days, travel tips)
+    """
+    try:
+        yield itinerary_header(plan.destination, plan.duration, plan.budget, plan.interests)
+        rest = list(range(2, plan.duration + 1))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency - 1, len(rest)))) as executor:
+            # Copy the context so the days keep the caller's LLM priority, trace and token budget
+            futures = [executor.submit(contextvars.copy_context().run, generate_day, plan, day) for day in rest]
+            plan.days.append((yield from stream_day(plan, 1)))
+            for future in futures:
+                day = future.result()
+                plan.days.append(day)
+                yield render_day(day)
+        yield itinerary_footer()
+    except Exception as e:
+        yield f"❌ Itinerary generation failed: {str(e)}"
+
+@traced("agent.itinerary_regenerate")
+def regenerate_day(plan, day, feedback=None):
+    """
+    Generate a new version of one day, keeping every other day as it is
+
+    Args:
+        plan (ItineraryPlan): Current plan
+        day (int): Day number to replace
+        feedback (str): Optional changes the traveler asked for
+
+    Returns:
+        ItineraryPlan: A copy of the plan with the new day
+    """
+    if not 1 <= day <= plan.duration:
+        raise ValueError(f"Day must be between 1 and {plan.duration}")
+    current = plan.day(day)
+    revision = current.revision + 1 if current else 0
+    new_day = next(plan_days(plan, [day], {day: revision}, {day: feedback}))
+    days = [d for d in plan.days if d.day != day] + [new_day]
+    return plan.model_copy(update={"days": sorted(days, key=lambda d: d.day)})
+
+@traced("agent.itinerary_update_flights")
+def update_flight_details(plan, flight_details, budget=None, max_concurrency=PARALLEL_MAX_CONCURRENCY):
+    """
+    Switch a plan to different flights, regenerating only the days they affect
+
+    Usually just the arrival and departure days; the rest are reused as they
+    are, including days regenerated with regenerate_day. When only the fare
+    changed, the plan keeps its daily budget so the other days aren't touched;
+    a different budget on the ground (e.g. another accommodation type)
+    changes the daily budget and regenerates every day.
+
+    Args:
+        plan (ItineraryPlan): Current plan
+        flight_details (dict): New flight details (flight_details_from_selection format)
+        budget (int): New total budget, if the flight price or anything else changed it
+
+    Returns:
+        ItineraryPlan: A copy of the plan with the new flights
+    """
+    from agents.budget_model import ROUNDING
+    updated = new_itinerary_plan(plan.destination, plan.dates, plan.budget if budget is None else budget,
+                                 plan.interests, flight_details)
+    # Totals are rounded up to ROUNDING with the fare included, so a fare-only change
+    # moves the budget left on the ground by less than that
+    ground = plan.budget - int((plan.flight_details or {}).get('price') or 0)
+    updated_ground = updated.budget - int((updated.flight_details or {}).get('price') or 0)
+    if abs(updated_ground - ground) < ROUNDING:
+        updated.daily_budget = plan.daily_budget
+    revisions = {d.day: d.revision for d in plan.days}
+    changed = [
+        day for day in range(1, updated.duration + 1)
+        if day not in revisions
+        or make_key(day_variables(plan, day, revisions[day])) != make_key(day_variables(updated, day, revisions[day]))
+    ]
+    current_span().set(regenerated_days=changed)
+    kept = [d for d in plan.days if d.day not in changed]
+    updated.days = sorted(kept + list(plan_days(updated, changed, revisions, max_concurrency=max_concurrency)),
+                          key=lambda d: d.day) if changed else kept
+    return updated
+
+def activity_line(a):
+    cost = f"₹{a.cost:,}" if a.cost else "free"
+    notes = f" — *{a.notes}*" if a.notes else ""
+    return f"{a.time} - {a.title} at **{a.venue}** ({cost}){notes}  "
+
+def render_day(day):
+    """Markdown for one DayPlan, laid out like the itinerary framework"""
+    if day.text:
+        return "\n" + day.text.strip() + "\n"
+    from agents.itinerary_model import PERIOD_ICONS
+    lines = ["", f"### **Day {day.day}: {day.title}**  "]
+    for period, icon in PERIOD_ICONS.items():
+        activities = [a for a in day.activities if a.period == period]
+        if not activities:
+            continue
+        lines.append(f"**{icon} {period}**  ")
+        for a in activities:
+            lines.append(activity_line(a))
+        lines.append("")
+    if day.transport:
+        lines.append(f"**🚕 Getting Around:** {day.transport}  ")
+    if day.tip:
+        lines.append(f"**💡 Insider Tip:** {day.tip}  ")
+    lines.append(f"**💰 Budget:** ₹{day.cost:,}  ")
+    return "\n".join(lines) + "\n"
+
+def streamed_day_lines(day, data, complete=False):
+    """
+    Markdown lines of a day whose JSON is still arriving, in the order written
+
+    A field is only included once the model has moved past it. Activities get
+    a period heading whenever the period changes, which reads like render_day()
+    for a day in time order.
+
+    Args:
+        day (int): Day number
+        data (dict): DayOutput fields parsed so far
+        complete (bool): Whether data is the whole, validated day
+    """
+    from agents.itinerary_model import Activity, PERIOD_ICONS
+    if not (complete or "activities" in data):
+        return []
+    lines = ["", f"### **Day {day}: {data.get('title', '')}**  "]
+    activities = data.get("activities") or []
+    finished = complete or "transport" in data or "tip" in data
+    period = None
+    for index, item in enumerate(activities):
+        if index == len(activities) - 1 and not finished:
+            break
         try:
-            budget = max(int(budget), 20000)  # Ensure minimum budget
-        except (ValueError, TypeError):
-            budget = 50000  # Default budget if invalid
-            
-        duration = int(dates.get('duration', 2))
-        if duration < 1:
-            duration = 2  # Minimum duration
-            
-        daily_budget = int(budget / duration)
+            activity = Activity.model_validate(item)
+        except ValueError:
+            break
+        if activity.period != period:
+            if period:
+                lines.append("")
+            lines.append(f"**{PERIOD_ICONS[activity.period]} {activity.period}**  ")
+            period = activity.period
+        lines.append(activity_line(activity))
+    if not complete:
+        return lines
+    if period:
+        lines.append("")
+    if data.get("transport"):
+        lines.append(f"**🚕 Getting Around:** {data['transport']}  ")
+    if data.get("tip"):
+        lines.append(f"**💡 Insider Tip:** {data['tip']}  ")
+    lines.append(f"**💰 Budget:** ₹{sum(a.get('cost') or 0 for a in activities):,}  ")
+    return lines
+
+def render_itinerary(plan):
+    """The whole plan as the same markdown document generate_itinerary returns"""
+    content = "".join(render_day(day) for day in plan.days)
+    return format_final_itinerary(plan.destination, plan.duration, plan.budget, plan.interests, content)
+
+def build_trip_context(destination, duration, budget, interests, flight_details, activity_days):
+    """Summarize the whole trip in a few lines shared by every day prompt"""
+    daily_budget = int(budget / duration)
+    lines = [f"{duration} days in {destination}, ₹{budget:,} total (about ₹{daily_budget:,}/day). Interests: {interests}."]
+
+    if flight_details and isinstance(flight_details, dict):
+        arrival = flight_details.get('arrival', {}) or {}
+        lines.append(f"Day 1: arrive {arrival.get('time', 'afternoon')} at {arrival.get('airport', 'the airport')}.")
+        departure = (flight_details.get('return_flight') or {}).get('departure', {})
+        if departure:
+            lines.append(f"Day {duration}: depart {departure.get('time', '')} from {departure.get('airport', 'the airport')}.")
+
+    focus = daily_focus(interests, activity_days)
+    if focus:
+        lines.append(focus)
+
+    return " ".join(lines)
+
+def daily_focus(interests, activity_days):
+    """Give each activity day its own focus so days generated separately don't repeat venues"""
+    themes = [t.strip() for t in str(interests).replace(' and ', ',').split(',') if t.strip()]
+    if not themes or not activity_days:
+        return ""
+    focus = "; ".join(f"Day {day}: {themes[i % len(themes)]}" for i, day in enumerate(activity_days))
+    return f"Daily focus (don't repeat venues across days): {focus}."
 
-        # Build arrival section safely
-        arrival_section = build_arrival_section(destination, flight_details, daily_budget)
+def prepare_itinerary_request(destination, dates, budget, interests, flight_details=None):
+    """Validate inputs and build the itinerary prompt and its variables
+
+    Returns:
+        dict: prompt, variables, per-day sections, trip context, duration and
+        budget, or an error message string
+    """
+    # Validate inputs
+    if not destination or not isinstance(destination, str):
+        return "❌ Invalid destination provided"
+        
+    if not dates or 'duration' not in dates:
+        return "❌ Invalid dates provided"
+        
+    try:
+        budget = max(int(budget), 20000)  # Ensure minimum budget
+    except (ValueError, TypeError):
+        budget = 50000  # Default budget if invalid
         
-        # Generate activity days safely
-        activity_days = build_activity_days(destination, duration, interests, daily_budget)
+    duration = int(dates.get('duration', 2))
+    if duration < 1:
+        duration = 2  # Minimum duration
         
-        # Add departure day if return flight exists
-        if flight_details and isinstance(flight_details, dict) and flight_details.get('return_flight'):
-            activity_days += build_departure_section(destination, duration, flight_details, daily_budget)
+    daily_budget = int(budget / duration)
 
-        # Prepare flight info string safely
-        flight_info = ""
-        if flight_details and isinstance(flight_details, dict):
-            flight_info = f"""
+    sections = framework_sections(destination, duration, interests, daily_budget, flight_details)
+    activity_days = list(range(2, duration + 1))
+    flight_info = compact_flight_info(flight_details) if COMPACT_PROMPTS else markdown_flight_info(flight_details)
+
+    # Generate the full itinerary
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", """Create a {duration}-day itinerary for {destination} with ₹{budget:,} budget.
+        
+**Traveler Interests:** {interests}
+**Flight Information:** {flight_info}
+
+""" + OUTPUT_REQUIREMENTS + """
+
+**Itinerary Framework:**
+{itinerary_framework}""")
+    ])
+
+    return {
+        'prompt': prompt,
+        'duration': duration,
+        'budget': budget,
+        'sections': sections,
+        'trip_context': build_trip_context(destination, duration, budget, interests, flight_details, activity_days),
+        'variables': {
+            "destination": destination,
+            "duration": duration,
+            "budget": budget,
+            "interests": interests,
+            "flight_info": flight_info,
+            "itinerary_framework": framework_text(sections)
+        }
+    }
+
+def markdown_flight_info(flight_details):
+    """Flight details block for the prompt, in the original verbose layout"""
+    flight_info = ""
+    if flight_details and isinstance(flight_details, dict):
+        flight_info = f"""
 Flight Details:
 - Airline: {flight_details.get('airline', 'Unknown')}
 - Flight Number: {flight_details.get('flight_number', '')}
@@ -63,8 +740,8 @@ Flight Details:
 - Arrival: {flight_details.get('arrival', {}).get('datetime', 'Not specified')}
 - Duration: {flight_details.get('duration', 'Not specified')}
 """
-            if flight_details.get('return_flight'):
-                flight_info += f"""
+        if flight_details.get('return_flight'):
+            flight_info += f"""
 Return Flight:
 - Airline: {flight_details['return_flight'].get('airline', 'Unknown')}
 - Flight Number: {flight_details['return_flight'].get('flight_number', '')}
@@ -72,50 +749,77 @@ Return Flight:
 - Arrival: {flight_details['return_flight'].get('arrival', {}).get('datetime', 'Not specified')}
 - Duration: {flight_details['return_flight'].get('duration', 'Not specified')}
 """
+    return flight_info
+
+def _flight_line(flight):
+    """One flight leg as 'AI 101, dep ..., arr ..., 2h 30m', leaving out unknown parts"""
+    parts = [f"{flight.get('airline', '')} {flight.get('flight_number', '')}".strip()]
+    for label, key in (("dep", "departure"), ("arr", "arrival")):
+        when = (flight.get(key) or {}).get('datetime')
+        if when:
+            parts.append(f"{label} {when}")
+    if flight.get('duration'):
+        parts.append(str(flight['duration']))
+    return ", ".join(p for p in parts if p)
+
+def compact_flight_info(flight_details):
+    """Flight details for the prompt on one line"""
+    if not flight_details or not isinstance(flight_details, dict):
+        return "None"
+    info = _flight_line(flight_details)
+    if flight_details.get('return_flight'):
+        info += "; return " + _flight_line(flight_details['return_flight'])
+    return info
+
+def compact_arrival(flight_details, daily_budget):
+    if flight_details and isinstance(flight_details, dict):
+        arrival = flight_details.get('arrival', {}) or {}
+        flight = f"{flight_details.get('airline', '')} {flight_details.get('flight_number', '')}".strip()
+        return (f"\nDay 1 (arrival): land {arrival.get('time', 'afternoon')} at {arrival.get('airport', 'the airport')}"
+                f"{' on ' + flight if flight else ''}; transfer, check-in, explore nearby, local dinner; ₹{daily_budget:,}")
+    return f"\nDay 1 (arrival): check-in, neighbourhood walk, local dinner; ₹{daily_budget:,}"
+
+def compact_activity_day(day, interests, daily_budget):
+    return f"\nDay {day}: full day, {interests}; ₹{daily_budget:,}"
+
+def compact_departure(duration, flight_details, daily_budget):
+    return_flight = (flight_details or {}).get('return_flight') or {}
+    departure = return_flight.get('departure', {}) or {}
+    flight = f"{return_flight.get('airline', '')} {return_flight.get('flight_number', '')}".strip()
+    return (f"\nDay {duration} (departure): check-out by 11 AM, airport transfer, fly {departure.get('time', '')} "
+            f"from {departure.get('airport', 'the airport')}{' on ' + flight if flight else ''}; ₹{int(daily_budget * 0.5):,}")
+
+def framework_sections(destination, duration, interests, daily_budget, flight_details=None, days=None):
+    """
+    Framework sections of the given days (all by default)
 
-        # Generate the full itinerary
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You're a professional travel designer. Create detailed itineraries with:
-             - Creative day titles with emojis
-             - Well-timed morning/afternoon/evening activities
-             - Local restaurant and attraction recommendations
-             - Transportation notes
-             - Budget estimates
-             - Insider tips"""),
-            ("human", """Create a {duration}-day itinerary for {destination} with ₹{budget:,} budget.
-            
-**Traveler Interests:** {interests}
-**Flight Information:** {flight_info}
-
-**Output Requirements:**
-1. Each day gets a creative title (emoji + catchy phrase)
-2. Group activities into Morning/Afternoon/Evening
-3. Include specific timings, venue names, and costs
-4. Add local tips and transportation notes
-5. Use consistent markdown formatting
-
-**Itinerary Framework:**
-{itinerary_framework}""")
-        ])
-
-        # Generate and format the output
-        chain = prompt | llm
-        result = chain.invoke({
-            "destination": destination,
-            "duration": duration,
-            "budget": budget,
-            "interests": interests,
-            "flight_info": flight_info,
-            "itinerary_framework": arrival_section + activity_days
-        })
-        
-        # Safely get content from result
-        content = result.content if hasattr(result, 'content') else str(result)
-        
-        return format_final_itinerary(destination, duration, budget, interests, content)
-
-    except Exception as e:
-        return f"❌ Itinerary generation failed: {str(e)}"
+    Returns:
+        list: (day, text) tuples in day order; one line per day with
+        COMPACT_PROMPTS, otherwise the markdown templates
+    """
+    days = set(days or range(1, duration + 1))
+    has_return = bool(flight_details and isinstance(flight_details, dict) and flight_details.get('return_flight'))
+    sections = []
+    if 1 in days:
+        sections.append((1, compact_arrival(flight_details, daily_budget) if COMPACT_PROMPTS
+                         else build_arrival_section(destination, flight_details, daily_budget)))
+    for day in range(2, duration + 1):
+        if day in days:
+            sections.append((day, compact_activity_day(day, interests, daily_budget) if COMPACT_PROMPTS
+                             else build_activity_day(destination, day, interests, daily_budget)))
+    # The last day gets its departure on top of its activities
+    if has_return and duration in days:
+        sections.append((duration, compact_departure(duration, flight_details, daily_budget) if COMPACT_PROMPTS
+                         else build_departure_section(destination, duration, flight_details, daily_budget)))
+    return sections
+
+def framework_text(sections):
+    """Join framework sections into the prompt's framework"""
+    text = "".join(text for _, text in sections)
+    if COMPACT_PROMPTS:
+        # Expand rather than echo: the lines are a plan, not output to copy
+        text = f"Full days run: {ACTIVITY_SLOTS}. Expand each line below into that day (don't repeat the lines):" + text
+    return text
 
 def build_arrival_section(destination, flight_details, daily_budget):
     """Build the arrival day section of the itinerary safely"""
@@ -171,7 +875,14 @@ def build_activity_days(destination, duration, interests, daily_budget):
     try:
         activity_days = ""
         for day in range(2, duration + 1):
-            activity_days += f"""
+            activity_days += build_activity_day(destination, day, interests, daily_budget)
+        return activity_days
+    except Exception:
+        return ""
+
+def build_activity_day(destination, day, interests, daily_budget):
+    """Build the framework for a single activity day"""
+    return f"""
 ### 🌟 **Day {day}: Exploring {destination}**  
 **🌅 Morning**  
 ☕ 8:00 AM - Breakfast  
@@ -188,9 +899,6 @@ def build_activity_days(destination, duration, interests, daily_budget):
 
 **💰 Budget:** ₹{daily_budget:,}  
 """
-        return activity_days
-    except Exception:
-        return ""
 
 def build_departure_section(destination, duration, flight_details, daily_budget):
     """Build the departure day section safely"""
@@ -221,16 +929,19 @@ def build_departure_section(destination, duration, flight_details, daily_budget)
     except Exception:
         return ""
 
-def format_final_itinerary(destination, duration, budget, interests, content):
-    """Format the final itinerary output safely"""
-    try:
-        return f"""
+def itinerary_header(destination, duration, budget, interests):
+    """Title block shown above the generated itinerary"""
+    return f"""
 # ✈️ {destination} Itinerary ({duration} Days)
 **💰 Budget:** ₹{budget:,} | **🌍 Interests:** {interests}  
 
 ---
 
-{content}
+"""
+
+def itinerary_footer():
+    """Travel tips shown below the generated itinerary"""
+    return """
 
 ---
 ## 📌 Travel Tips:
@@ -240,5 +951,42 @@ def format_final_itinerary(destination, duration, budget, interests, content):
 
 Enjoy your trip! 🎉
 """
+
+def format_final_itinerary(destination, duration, budget, interests, content):
+    """Format the final itinerary output safely"""
+    try:
+        return itinerary_header(destination, duration, budget, interests) + content + itinerary_footer()
     except Exception:
-        return content  # Return raw content if formatting fails
\ No newline at end of file
+        return content  # Return raw content if formatting fails
+
+
+def trip_dates(start_date, end_date):
+    """Build the dates dict generate_itinerary expects from two YYYY-MM-DD dates"""
+    start = datetime.strptime(str(start_date), '%Y-%m-%d').date()
+    end = datetime.strptime(str(end_date), '%Y-%m-%d').date()
+    return {
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'duration': (end - start).days + 1,
+        'date_range': f"{start.strftime('%b %d')} - {end.strftime('%b %d')}"
+    }
+
+def flight_details_from_selection(selected_flight, destination):
+    """Turn a selected flight (FlightOffer.to_selection format) into itinerary flight details"""
+    if not selected_flight:
+        return None
+    return {
+        "airline": selected_flight.get("airline", ""),
+        "flight_number": selected_flight.get("flight_number", ""),
+        "arrival": {
+            "airport": selected_flight.get("arrival", {}).get("airport", ""),
+            "city": selected_flight.get("arrival", {}).get("city", destination),
+            "time": selected_flight.get("arrival", {}).get("time", "")
+        },
+        "departure": {
+            "airport": selected_flight.get("departure", {}).get("airport", ""),
+            "time": selected_flight.get("departure", {}).get("time", "")
+        },
+        "return_flight": selected_flight.get("return_flight"),
+        "price": selected_flight.get("price")
+    }
@@ -0,0 +1,58 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+# Icons for the time-of-day groups in the rendered markdown
+PERIOD_ICONS = {"Morning": "🌅", "Afternoon": "🌞", "Evening": "🌃"}
+
+
+class Activity(BaseModel):
+    """One timed stop in a day"""
+
+    time: str = Field(description="Start time, e.g. 9:30 AM")
+    period: Literal["Morning", "Afternoon", "Evening"]
+    title: str = Field(description="What the traveler does, starting with an emoji")
+    venue: str = Field(description="Specific named place: restaurant, attraction, market or neighbourhood")
+    cost: int = Field(0, ge=0, description="Estimated cost per person in INR")
+    notes: str = Field("", description="Short local tip or how to get there")
+
+
+class DayOutput(BaseModel):
+    """One itinerary day as returned by the LLM"""
+
+    title: str = Field(description="Creative day title: emoji + catchy phrase")
+    activities: List[Activity] = Field(description="Morning, afternoon and evening activities in time order")
+    transport: str = Field("", description="How to get around this day")
+    tip: str = Field("", description="One insider tip for the day")
+
+
+class DayPlan(DayOutput):
+    """A generated day and what it was generated for"""
+
+    day: int
+    kind: Literal["arrival", "activity", "departure"] = "activity"
+    revision: int = 0  # Bumped by regenerate_day so the new version gets its own cache entry
+    text: str = ""  # Markdown fallback when structured output failed
+
+    @property
+    def cost(self):
+        return sum(activity.cost for activity in self.activities)
+
+
+class ItineraryPlan(BaseModel):
+    """A whole trip's days plus the inputs needed to regenerate any one of them"""
+
+    destination: str
+    dates: dict
+    duration: int
+    budget: int
+    daily_budget: int = 0  # Spending money per day on the ground, fixed when the plan is created
+    interests: str
+    flight_details: Optional[dict] = None
+    days: List[DayPlan] = []
+
+    def day(self, number):
+        return next((d for d in self.days if d.day == number), None)
+
+    @property
+    def cost(self):
+        return sum(day.cost for day in self.days)
@@ -0,0 +1,419 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+import random
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from agents.telemetry import span, record_tokens
+from agents.token_budget import check_budget, charge
+
+# Groq quota for the account (defaults are the free-tier limits for Gemma2-9b-It)
+REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "15000"))
+
+# Completion size assumed before a response reports its real usage
+EXPECTED_OUTPUT_TOKENS = 500
+
+# Backoff after a 429 when Groq doesn't send retry-after (seconds)
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# Priority classes, lowest value is admitted first
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("llm_priority", default=NORMAL)
+
+
+@contextmanager
+def llm_priority(level):
+    """Run the LLM calls made inside the block (and threads LangChain starts from it) at this priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitExceeded(Exception):
+    """Groq kept rate-limiting a request after every retry"""
+
+
+class TokenBucket:
+    """Refills continuously up to a per-minute quota; not thread-safe on its own"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (requests larger than the bucket wait for a full one)"""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """Charge (or refund, if negative) the difference between estimated and actual use"""
+        self.level = min(self.capacity, self.level - delta)
+
+
+def estimate_tokens(chain, variables):
+    """Rough prompt + completion size of a prompt | llm call (about 4 characters per token)"""
+    try:
+        text = chain.first.invoke(variables).to_string()
+    except Exception:
+        text = json.dumps(variables, default=str)
+    output = getattr(getattr(chain, "last", None), "max_tokens", None) or EXPECTED_OUTPUT_TOKENS
+    return len(text) // 4 + output
+
+
+def is_rate_limit(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error):
+    """Seconds from the retry-after header of a 429, if Groq sent one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _usage(message):
+    # with_structured_output(include_raw=True) results carry the message under "raw"
+    if isinstance(message, dict):
+        message = message.get("raw")
+    return getattr(message, "usage_metadata", None) or {}
+
+
+def _total_tokens(message):
+    return _usage(message).get("total_tokens")
+
+
+def _token_split(message):
+    """(prompt, completion) tokens reported on a message or chunk"""
+    usage = _usage(message)
+    return usage.get("input_tokens") or 0, usage.get("output_tokens") or 0
+
+
+def model_name(chain):
+    """
+    Name of the chat model a chain calls, looking inside prompt | llm sequences,
+    bindings (bind_tools), fallbacks and the maps with_structured_output builds
+    """
+    pending = [chain]
+    while pending:
+        runnable = pending.pop()
+        name = getattr(runnable, "model_name", None) or getattr(runnable, "model", None)
+        if isinstance(name, str):
+            return name
+        pending += [getattr(runnable, attr) for attr in ("bound", "runnable", "mapper")
+                    if getattr(runnable, attr, None) is not None]
+        pending += list(getattr(runnable, "steps__", {}).values())
+        # Popped last step first: the model sits at the end of a sequence
+        pending += list(getattr(runnable, "steps", None) or [])
+    return type(getattr(chain, "last", chain)).__name__
+
+
+def _account(chain, prompt_tokens, completion_tokens):
+    """Count a response's tokens in the metrics and against the request's token budget"""
+    record_tokens(prompt_tokens, completion_tokens)
+    charge(model_name(chain), prompt_tokens, completion_tokens)
+
+
+class LLMScheduler:
+    """
+    Process-wide gate in front of every LLM call
+
+    Callers queue by priority (then arrival) and are admitted when both the
+    request and token buckets have room. A 429 pauses admission for everyone
+    until the retry-after (or exponential backoff) has passed, then the call is
+    retried up to max_retries times.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._async_waiters = {}  # ticket -> (event loop, asyncio.Event) of async callers in the queue
+
+        self.max_queue_depth = 0
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_seconds = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.rate_limited = 0
+        self.retries = 0
+        self.failures = 0
+        self.tokens_used = 0
+
+    def _notify(self):
+        """Wake every queued caller, threads and coroutines, to re-check the queue (hold self._cond)"""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters.values():
+            loop.call_soon_threadsafe(event.set)
+
+    def _enqueue(self):
+        ticket = (_priority.get(), next(self._sequence))
+        heapq.heappush(self._queue, ticket)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        return ticket
+
+    def _admission_wait(self, ticket, tokens):
+        """
+        Seconds the ticket must still wait, None if it isn't at the head of the
+        queue, or 0 once it has been admitted (hold self._cond)
+        """
+        if self._queue[0] != ticket:
+            return None
+        now = time.monotonic()
+        wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        return 0
+
+    def _dequeue(self, ticket, started, admitted):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self._async_waiters.pop(ticket, None)
+        self._notify()
+        if admitted:
+            name = PRIORITY_NAMES.get(ticket[0], str(ticket[0]))
+            self.admitted[name] = self.admitted.get(name, 0) + 1
+            self.wait_seconds[name] = self.wait_seconds.get(name, 0.0) + time.monotonic() - started
+
+    def _acquire(self, tokens):
+        with span("llm.queue", estimated_tokens=tokens):
+            self._wait_for_admission(tokens)
+
+    def _wait_for_admission(self, tokens):
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue()
+            self._notify()  # A new head may need to recompute its wait
+            admitted = False
+            try:
+                while True:
+                    wait = self._admission_wait(ticket, tokens)
+                    if wait == 0:
+                        admitted = True
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._dequeue(ticket, started, admitted)
+
+    async def _aacquire(self, tokens):
+        with span("llm.queue", estimated_tokens=tokens):
+            await self._await_admission(tokens)
+
+    async def _await_admission(self, tokens):
+        """_wait_for_admission() for coroutines: waits on the event loop, holding no thread"""
+        started = time.monotonic()
+        event = asyncio.Event()
+        with self._cond:
+            ticket = self._enqueue()
+            self._async_waiters[ticket] = (asyncio.get_running_loop(), event)
+            self._notify()
+        admitted = False
+        try:
+            while True:
+                with self._cond:
+                    wait = self._admission_wait(ticket, tokens)
+                    if wait == 0:
+                        admitted = True
+                        break
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._dequeue(ticket, started, admitted)
+
+    def _settle(self, estimated, actual):
+        with self._cond:
+            if actual:
+                self.tokens.adjust(actual - estimated)
+            self.tokens_used += actual or estimated
+
+    def _backoff(self, error, attempt):
+        """Pause admission after a 429, or re-raise anything else"""
+        if not is_rate_limit(error):
+            raise error
+        with self._cond:
+            self.rate_limited += 1
+            if attempt >= self.max_retries:
+                self.failures += 1
+                raise RateLimitExceeded(f"Groq rate limit still hit after {attempt + 1} attempts") from error
+            self.retries += 1
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._notify()
+
+    def invoke(self, chain, variables):
+        """chain.invoke(variables) once the rate limits allow it, retrying on 429"""
+        estimated = estimate_tokens(chain, variables)
+        check_budget(estimated)
+        with span("groq.chat", model=model_name(chain)) as s:
+            for attempt in itertools.count():
+                s.set(attempts=attempt + 1)
+                self._acquire(estimated)
+                try:
+                    result = chain.invoke(variables)
+                except Exception as e:
+                    self._backoff(e, attempt)
+                    continue
+                self._settle(estimated, _total_tokens(result))
+                _account(chain, *_token_split(result))
+                return result
+
+    def stream(self, chain, variables):
+        """
+        chain.stream(variables) once the rate limits allow it
+
+        A 429 is only retried if it arrives before the first chunk.
+        """
+        estimated = estimate_tokens(chain, variables)
+        check_budget(estimated)
+        with span("groq.chat", model=model_name(chain), stream=True) as s:
+            for attempt in itertools.count():
+                s.set(attempts=attempt + 1)
+                self._acquire(estimated)
+                started = False
+                actual = 0
+                prompt_tokens = completion_tokens = 0
+                try:
+                    for chunk in chain.stream(variables):
+                        started = True
+                        actual += _total_tokens(chunk) or 0
+                        prompt, completion = _token_split(chunk)
+                        prompt_tokens += prompt
+                        completion_tokens += completion
+                        yield chunk
+                except Exception as e:
+                    if started:
+                        raise
+                    self._backoff(e, attempt)
+                    continue
+                self._settle(estimated, actual)
+                _account(chain, prompt_tokens, completion_tokens)
+                return
+
+    async def ainvoke(self, chain, variables):
+        """
+        Async invoke() for the API service
+
+        Queues with the sync callers but waits for admission on the event loop,
+        so a throttled queue doesn't tie up worker threads.
+        """
+        estimated = estimate_tokens(chain, variables)
+        check_budget(estimated)
+        with span("groq.chat", model=model_name(chain)) as s:
+            for attempt in itertools.count():
+                s.set(attempts=attempt + 1)
+                await self._aacquire(estimated)
+                try:
+                    result = await chain.ainvoke(variables)
+                except Exception as e:
+                    self._backoff(e, attempt)
+                    continue
+                self._settle(estimated, _total_tokens(result))
+                _account(chain, *_token_split(result))
+                return result
+
+    async def astream(self, chain, variables):
+        """Async stream(); a 429 is only retried if it arrives before the first chunk"""
+        estimated = estimate_tokens(chain, variables)
+        check_budget(estimated)
+        with span("groq.chat", model=model_name(chain), stream=True) as s:
+            for attempt in itertools.count():
+                s.set(attempts=attempt + 1)
+                await self._aacquire(estimated)
+                started = False
+                actual = 0
+                prompt_tokens = completion_tokens = 0
+                try:
+                    async for chunk in chain.astream(variables):
+                        started = True
+                        actual += _total_tokens(chunk) or 0
+                        prompt, completion = _token_split(chunk)
+                        prompt_tokens += prompt
+                        completion_tokens += completion
+                        yield chunk
+                except Exception as e:
+                    if started:
+                        raise
+                    self._backoff(e, attempt)
+                    continue
+                self._settle(estimated, actual)
+                _account(chain, prompt_tokens, completion_tokens)
+                return
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                waiting[name] = waiting.get(name, 0) + 1
+            return {
+                "queue_depth": len(self._queue),
+                "waiting": waiting,
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": dict(self.admitted),
+                "avg_wait_s": {
+                    name: round(self.wait_seconds[name] / count, 3) if count else 0.0
+                    for name, count in self.admitted.items()
+                },
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+                "failures": self.failures,
+                "tokens_used": self.tokens_used,
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level, 1),
+                "paused_for_s": round(max(self._paused_until - now, 0.0), 1),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The scheduler shared by every session in this process"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def scheduler_stats():
+    return get_scheduler().stats()
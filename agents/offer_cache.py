@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StaleWhileRevalidateCache:
+    """
+    Bounded in-memory cache that serves stale entries while refreshing them in the background
+
+    Entries younger than fresh_ttl are served as-is. Entries between fresh_ttl and
+    stale_ttl are served immediately and a background refresh is started (at most
+    one per key). Older entries, and misses, are loaded in the caller's thread.
+    """
+
+    def __init__(self, fresh_ttl, stale_ttl, max_entries=500, refresh_workers=2):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="offer-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """
+        Get a value, loading or refreshing it with loader() as needed
+
+        Returns:
+            tuple: (value, age in seconds of the cached copy, 0 if just loaded)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                age = now - stored_at
+                if age < self.fresh_ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, age
+                if age < self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader)
+                    return value, age
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value, 0.0
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        except Exception:
+            pass  # Keep serving the stale copy until it expires
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshing": len(self._refreshing),
+            }
@@ -0,0 +1,178 @@
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from agents.llm_scheduler import NORMAL, llm_priority
+from agents.telemetry import span
+from agents.token_budget import MAX_TOKENS_PER_REQUEST, token_budget
+
+# Fields every trip request must have
+REQUIRED_FIELDS = ["departure_city", "start_date", "end_date", "interests"]
+
+# Trips planned at once by plan_trips
+DEFAULT_WORKERS = 4
+
+STAGES = ["destination", "flights", "budget", "itinerary", "weather"]
+
+
+class StageTimer:
+    """Record how long each pipeline stage takes and any error it raised"""
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            self.errors[stage] = str(e)
+            return None
+        finally:
+            self.timings[stage] = round(time.perf_counter() - started, 3)
+
+
+def choose_destination(request):
+    """Use the requested destination, or the first one the destination agent suggests"""
+    from agents.destination_agent import destination, parse_destinations
+
+    if request.get('destination'):
+        return request['destination'], [request['destination']]
+    if not request.get('preferences'):
+        raise ValueError("Trip request needs a destination or preferences")
+
+    destinations = parse_destinations(destination(
+        preferences=request['preferences'],
+        budget=request.get('budget', 50000),
+        interests=request['interests']
+    ))
+    if not destinations or destinations[0].startswith("❌"):
+        raise ValueError(destinations[0] if destinations else "No destinations suggested")
+    return destinations[0], destinations
+
+
+def cheapest_flight(request, destination):
+    """Cheapest offer to the destination's primary airport (or an alternative), as a flight selection"""
+    from agents.flight_planner import find_flights
+
+    result = find_flights(
+        request['departure_city'], destination, request['start_date'], request['end_date'],
+        adults=int(request.get('adults', 1))
+    )
+    if len(result['offers']):
+        return result['offers'].offers[0].to_selection(1, request['departure_city'], destination)
+    errors = "; ".join(f"{orig}→{dest}: {error}" for (orig, dest), error in result['errors'])
+    raise ValueError(f"No flights found from {result['origin_code']} to {result['dest_code']}" + (f" ({errors})" if errors else ""))
+
+
+def plan_trip(request, stages=STAGES, priority=NORMAL, max_tokens=MAX_TOKENS_PER_REQUEST):
+    """
+    Run destination → flights → budget → itinerary → weather for one trip request
+
+    A failing stage is recorded and the later stages carry on with what they
+    have (e.g. the budget without a flight price).
+
+    Args:
+        request (dict): departure_city, start_date, end_date (YYYY-MM-DD) and
+            interests, plus destination or preferences; optional id,
+            accommodation_type, adults and budget
+        stages (list): Stages to run, in pipeline order
+        priority (int): LLM scheduler priority for the trip's calls
+        max_tokens (int): LLM token budget for the trip (0 for no limit);
+            calls past it fail their stage
+
+    Returns:
+        dict: id, status ("ok", "partial" or "error"), destination,
+        destinations, flight, budget, itinerary, weather, errors, timings
+        (seconds per stage and total) and tokens (TokenBudget.report())
+    """
+    from agents.budget_agent import calculate_budget
+    from agents.budget_model import ACCOMMODATION_TYPES
+    from agents.itenary_agent import PARALLEL_MIN_DAYS, generate_itinerary, trip_dates, flight_details_from_selection
+    from agents.weather_agent import weather_forecast
+
+    started = time.perf_counter()
+    timer = StageTimer()
+    result = {"id": request.get('id')}
+
+    missing = [field for field in REQUIRED_FIELDS if not request.get(field)]
+    if missing:
+        result.update(status="error", errors={"request": f"Missing fields: {', '.join(missing)}"}, timings={})
+        return result
+
+    with span("pipeline.trip", id=request.get('id')), llm_priority(priority), \
+            token_budget(f"trip {request.get('id')}", max_tokens) as tokens:
+        destination, destinations = timer.run("destination", choose_destination, request) or (None, [])
+        result.update(destination=destination, destinations=destinations)
+
+        # Bad dates fail their own step rather than the whole trip
+        dates = timer.run("dates", trip_dates, request['start_date'], request['end_date']) if destination else None
+        if dates:
+            flight = timer.run("flights", cheapest_flight, request, destination) if "flights" in stages else None
+
+            budget = None
+            if "budget" in stages:
+                start = datetime.strptime(request['start_date'], '%Y-%m-%d')
+                end = datetime.strptime(request['end_date'], '%Y-%m-%d')
+                budget = timer.run(
+                    "budget", calculate_budget,
+                    destination=destination,
+                    dates=f"{start.strftime('%B %d')} to {end.strftime('%B %d')}",
+                    accommodation_type=request.get('accommodation_type', ACCOMMODATION_TYPES[1]),
+                    flight_location=request['departure_city'],
+                    interests=request['interests'],
+                    flight_cost=(flight or {}).get('price', 0)
+                )
+
+            itinerary = None
+            if "itinerary" in stages:
+                itinerary = timer.run(
+                    "itinerary", generate_itinerary,
+                    destination=destination,
+                    dates=dates,
+                    budget=budget or request.get('budget', 50000),
+                    interests=request['interests'],
+                    flight_details=flight_details_from_selection(flight, destination),
+                    parallel=dates['duration'] >= PARALLEL_MIN_DAYS
+                )
+
+            weather = None
+            if "weather" in stages:
+                weather = timer.run("weather", weather_forecast, destination, request['start_date'], request['end_date'])
+
+            result.update(flight=flight, budget=budget, itinerary=itinerary, weather=weather)
+
+    # Agents report some failures as "❌ ..." strings rather than exceptions
+    for stage in ("itinerary", "weather"):
+        if isinstance(result.get(stage), str) and result[stage].startswith(("❌", "⚠️")):
+            timer.errors.setdefault(stage, result[stage])
+
+    timer.timings["total"] = round(time.perf_counter() - started, 3)
+    if not destination or not dates:
+        status = "error"
+    else:
+        status = "partial" if timer.errors else "ok"
+    result.update(status=status, errors=timer.errors, timings=timer.timings, tokens=tokens.report())
+    return result
+
+
+def plan_trips(requests, workers=DEFAULT_WORKERS, stages=STAGES, priority=NORMAL, max_tokens=MAX_TOKENS_PER_REQUEST):
+    """
+    Plan many trips concurrently on a thread pool
+
+    Threads rather than processes: the LLM scheduler, response caches and
+    HTTP connection pools are per process, so every trip shares one Groq
+    quota and one set of caches.
+
+    Yields:
+        tuple: (index into requests, result dict) as each trip finishes
+    """
+    requests = list(requests)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan") as executor:
+        futures = {executor.submit(plan_trip, request, stages, priority, max_tokens): i for i, request in enumerate(requests)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result()
+            except Exception as e:
+                yield index, {"id": requests[index].get('id'), "status": "error", "errors": {"pipeline": str(e)}, "timings": {}}
@@ -0,0 +1,135 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from agents.llm_scheduler import BACKGROUND, llm_priority
+
+# Background threads per session
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "3"))
+# Prefetch tasks a session may run in total (one flight search or weather lookup each)
+PREFETCH_CALL_BUDGET = int(os.getenv("PREFETCH_CALL_BUDGET", "10"))
+# How long step 3 waits for a flight search that is already running in the background
+PREFETCH_WAIT_SECONDS = 15
+
+
+class Prefetcher:
+    """
+    Per-session background work for destinations the user hasn't picked yet
+
+    Tasks are keyed by (kind, destination, ...) so reruns don't repeat them,
+    run on a small thread pool at BACKGROUND LLM priority, and stop being
+    started once the session's call budget is spent.
+    """
+
+    def __init__(self, max_workers=PREFETCH_WORKERS, call_budget=PREFETCH_CALL_BUDGET):
+        self.max_workers = max_workers
+        self.calls_left = call_budget
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.used = 0
+        self.skipped = 0
+        self.cancelled = 0
+
+    def submit(self, key, fn, *args):
+        """Start fn(*args) in the background unless it already ran or the budget is spent"""
+        with self._lock:
+            if key in self._futures:
+                return self._futures[key]
+            if self.calls_left <= 0:
+                self.skipped += 1
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+            self.calls_left -= 1
+            future = self._executor.submit(self._run, fn, *args)
+            self._futures[key] = future
+            return future
+
+    @staticmethod
+    def _run(fn, *args):
+        with llm_priority(BACKGROUND):
+            return fn(*args)
+
+    def result(self, key, timeout=0):
+        """
+        Result of a prefetch task, or None if it wasn't started, failed or is still running
+
+        Args:
+            key (tuple): Task key passed to submit
+            timeout (float): Seconds to wait for a running task
+        """
+        with self._lock:
+            future = self._futures.get(key)
+        if future is None or future.cancelled():
+            return None
+        if not future.done():
+            wait([future], timeout=timeout)
+            if not future.done():
+                return None
+        if future.exception() is not None:
+            return None
+        with self._lock:
+            self.used += 1
+        return future.result()
+
+    def cancel(self, keep=()):
+        """Cancel queued tasks for every destination not in keep (running ones finish)"""
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if key[1] not in keep and future.cancel():
+                    self.cancelled += 1
+                    self.calls_left += 1  # Never ran, so it doesn't count against the budget
+                    del self._futures[key]
+
+    def shutdown(self):
+        self.cancel()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            futures = list(self._futures.values())
+            return {
+                "started": len(futures),
+                "running": sum(1 for f in futures if f.running()),
+                "done": sum(1 for f in futures if f.done()),
+                "failed": sum(1 for f in futures if f.done() and f.exception() is not None),
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "calls_left": self.calls_left,
+            }
+
+
+def flight_key(trip, destination):
+    return ("flights", destination, trip.get('departure_city'), trip.get('start_date'), trip.get('end_date'))
+
+
+def weather_key(trip, destination):
+    return ("weather", destination, trip.get('start_date'), trip.get('end_date'))
+
+
+def prefetch_candidates(prefetcher, destinations, trip, selected=None):
+    """
+    Warm flight search and weather for every candidate destination
+
+    The selected destination goes first so a small budget is spent where the
+    user is most likely to go. Flight offers land in the shared offer cache,
+    weather summaries are read back with prefetcher.result(weather_key(...)).
+    """
+    from agents.flight_planner import prefetch_flights
+    from agents.weather_agent import weather_forecast
+
+    prefetcher.cancel(keep=destinations)
+    ordered = sorted(destinations, key=lambda d: d != selected)
+    for destination in ordered:
+        prefetcher.submit(
+            flight_key(trip, destination), prefetch_flights,
+            trip['departure_city'], destination, trip['start_date'], trip['end_date']
+        )
+        prefetcher.submit(
+            weather_key(trip, destination), weather_forecast,
+            destination, trip['start_date'], trip['end_date']
+        )
@@ -0,0 +1,335 @@
+import os
+import re
+import time
+import zlib
+import threading
+from collections import OrderedDict, deque
+from agents.cache import AGENT_TTLS, make_key
+from agents.telemetry import span, current_span
+
+# Set SEMANTIC_CACHE=0 to only reuse responses for exactly matching inputs
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") != "0"
+
+# Lowest cosine similarity (of every free-text field) that counts as the same request
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+# The same for the hashing fallback, whose lists differing in one item still score around 0.9
+HASHING_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_HASHING_THRESHOLD", "0.95"))
+
+# sentence-transformers model used when that package is installed; otherwise
+# (or with SEMANTIC_CACHE_MODEL=hashing) text is embedded as hashed character n-grams
+EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2")
+HASHING_DIMENSIONS = 1024
+
+# Responses kept in memory per agent, and best-match similarities kept for stats
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+RECENT_SIMILARITIES = 1000
+
+# Histogram buckets for the best-match similarity of each lookup
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+
+
+# Words that don't change what a traveler is asking for
+STOPWORDS = {"a", "an", "the", "of", "with", "some", "lots", "lot", "also", "etc", "i", "we", "like", "love", "enjoy"}
+
+
+def _stem(word):
+    """Crude plural stripping, enough to match "beaches" with "beach" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def _item_count(text):
+    """Number of items in a normalized list"""
+    return len(text.split(", ")) if text else 0
+
+
+def normalize_text(text):
+    """Lowercase, singularize and sort a comma/"and"-separated list, so "Food and beaches" reads as "beach, food" """
+    text = str(text or "").lower().replace("&", ",")
+    text = re.sub(r"\band\b|[;/+|]", ",", text)
+    parts = set()
+    for part in text.split(","):
+        words = [_stem(w) for w in re.sub(r"[^\w\s-]", " ", part).split() if w not in STOPWORDS]
+        if words:
+            parts.add(" ".join(words))
+    return ", ".join(sorted(parts))
+
+
+class HashingEmbedder:
+    """Bag of hashed word and character 3-gram features; no model download, good for near-duplicates"""
+
+    name = "hashing"
+    threshold = HASHING_THRESHOLD
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dimensions] += 2.0
+                padded = f" {word} "
+                for i in range(len(padded) - 2):
+                    vectors[row, zlib.crc32(padded[i:i + 3].encode("utf-8")) % self.dimensions] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class SentenceTransformerEmbedder:
+    """Small local sentence-transformers model (loaded on first use)"""
+
+    threshold = SIMILARITY_THRESHOLD
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def embed(self, texts):
+        import numpy as np
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """sentence-transformers if installed, the hashing embedder otherwise"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_MODEL != "hashing":
+                try:
+                    _embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+                except Exception as e:
+                    current_span().set(embedder_fallback=f"{type(e).__name__}: {e}")
+            if _embedder is None:
+                _embedder = HashingEmbedder()
+        return _embedder
+
+
+class _Partition:
+    """Entries sharing the same exact-match inputs: one row of field vectors per entry"""
+
+    def __init__(self):
+        self.vectors = None  # (entries, fields, dimensions)
+        self.counts = []  # Items in each field's list, per entry
+        self.values = []
+        self.expires = []
+
+
+class SemanticCache:
+    """
+    Reuse a response for inputs that mean the same thing
+
+    Inputs are split into exact parts (destination, dates, budget...) that
+    must match, and free-text fields (interests, preferences) that only have
+    to be similar: each field is embedded and a cached response is reused if
+    every field's cosine similarity reaches the threshold (the embedder's,
+    unless one is given) and every field lists as many items, so adding or
+    dropping an interest is a different request. The index lives in memory,
+    in front of the exact-key disk cache.
+    """
+
+    def __init__(self, agent, threshold=None, ttl=None, max_entries=MAX_ENTRIES):
+        self.agent = agent
+        self._threshold = threshold
+        self.ttl = AGENT_TTLS.get(agent, 3600) if ttl is None else ttl
+        self.max_entries = max_entries
+        self._partitions = OrderedDict()  # exact key -> _Partition, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.similarities = deque(maxlen=RECENT_SIMILARITIES)
+        self.histogram = [0] * (len(SIMILARITY_BUCKETS) + 1)
+        self.similarity_sum = 0.0
+
+    @property
+    def threshold(self):
+        return get_embedder().threshold if self._threshold is None else self._threshold
+
+    def _embed(self, texts):
+        """Field vectors and item counts for the inputs"""
+        normalized = [normalize_text(t) for t in texts]
+        return get_embedder().embed(normalized), tuple(_item_count(t) for t in normalized)
+
+    def get(self, exact, texts):
+        """
+        Cached response for similar inputs
+
+        Args:
+            exact: JSON-serializable inputs that must match exactly
+            texts (list): Free-text inputs compared by similarity
+
+        Returns:
+            The cached value, or None
+        """
+        import numpy as np
+        key = make_key(self.agent, exact)
+        with span("semantic_cache", agent=self.agent) as s:
+            query, counts = self._embed(texts)
+            threshold = self.threshold
+            with self._lock:
+                partition = self._partitions.get(key)
+                best, value = None, None
+                if partition is not None and partition.values:
+                    # Similarity per field, and an entry only matches as well as its worst field
+                    scores = np.einsum("efd,fd->ef", partition.vectors, query).min(axis=1)
+                    live = np.array(partition.expires) > time.time()
+                    same_items = np.array([entry == counts for entry in partition.counts])
+                    scores = np.where(live & same_items, scores, -1.0)
+                    index = int(scores.argmax())
+                    if scores[index] >= 0:
+                        best = float(scores[index])
+                        if best >= threshold:
+                            value = partition.values[index]
+                            self._partitions.move_to_end(key)
+                self._record(best, value is not None)
+            s.set(hit=value is not None, similarity=round(best, 4) if best is not None else None)
+            return value
+
+    def set(self, exact, texts, value):
+        """Add a response to the index"""
+        import numpy as np
+        key = make_key(self.agent, exact)
+        vectors, counts = self._embed(texts)
+        vectors = vectors[np.newaxis]
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition()
+            elif partition.values:
+                # Drop expired entries while we're here
+                live = [i for i, expires in enumerate(partition.expires) if expires > time.time()]
+                if len(live) < len(partition.values):
+                    self._size -= len(partition.values) - len(live)
+                    partition.vectors = partition.vectors[live] if live else None
+                    partition.counts = [partition.counts[i] for i in live]
+                    partition.values = [partition.values[i] for i in live]
+                    partition.expires = [partition.expires[i] for i in live]
+            partition.vectors = vectors if partition.vectors is None else np.concatenate([partition.vectors, vectors])
+            partition.counts.append(counts)
+            partition.values.append(value)
+            partition.expires.append(time.time() + self.ttl)
+            self._partitions.move_to_end(key)
+            self._size += 1
+            # Evict the least recently used partitions beyond the size limit
+            while self._size > self.max_entries and len(self._partitions) > 1:
+                _, evicted = self._partitions.popitem(last=False)
+                self._size -= len(evicted.values)
+
+    def _record(self, similarity, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if similarity is not None:
+            self.similarities.append(similarity)
+            self.similarity_sum += similarity
+            for i, bound in enumerate(SIMILARITY_BUCKETS):
+                if similarity <= bound:
+                    self.histogram[i] += 1
+                    break
+            else:
+                self.histogram[-1] += 1
+
+    def stats(self):
+        import numpy as np
+        threshold, embedder = self.threshold, get_embedder().name
+        with self._lock:
+            similarities = list(self.similarities)
+            total = self.hits + self.misses
+            report = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": self._size,
+                "embedder": embedder,
+                "threshold": threshold,
+            }
+        if similarities:
+            p10, p50, p90 = np.percentile(similarities, [10, 50, 90])
+            report["similarity"] = {"p10": round(float(p10), 3), "p50": round(float(p50), 3), "p90": round(float(p90), 3)}
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._size = 0
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def semantic_cache(agent):
+    """The semantic cache in front of one of the LLM agents"""
+    with _caches_lock:
+        if agent not in _caches:
+            _caches[agent] = SemanticCache(agent)
+        return _caches[agent]
+
+
+def semantic_cached(agent, exact, texts, compute):
+    """
+    compute(), or a response cached for similar inputs
+
+    Args:
+        agent (str): Agent name
+        exact: Inputs that must match exactly
+        texts (list): Free-text inputs compared by similarity
+        compute: Called on a miss; its result is added to the index
+
+    Returns:
+        The cached or computed response
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return compute()
+    cache = semantic_cache(agent)
+    value = cache.get(exact, texts)
+    if value is None:
+        value = compute()
+        cache.set(exact, texts, value)
+    return value
+
+
+def semantic_cache_stats():
+    """Hit rates and best-match similarity percentiles per agent"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {agent: cache.stats() for agent, cache in caches.items()}
+
+
+def prometheus_text():
+    """Semantic cache lookups and their similarity histogram in the Prometheus text format"""
+    with _caches_lock:
+        caches = dict(_caches)
+    lines = ["# HELP travel_buddy_semantic_cache_lookups_total Semantic cache lookups by result",
+             "# TYPE travel_buddy_semantic_cache_lookups_total counter"]
+    for agent, cache in sorted(caches.items()):
+        lines.append(f'travel_buddy_semantic_cache_lookups_total{{agent="{agent}",result="hit"}} {cache.hits}')
+        lines.append(f'travel_buddy_semantic_cache_lookups_total{{agent="{agent}",result="miss"}} {cache.misses}')
+    lines += ["# HELP travel_buddy_semantic_cache_similarity Best-match similarity of semantic cache lookups",
+              "# TYPE travel_buddy_semantic_cache_similarity histogram"]
+    for agent, cache in sorted(caches.items()):
+        with cache._lock:
+            histogram = list(cache.histogram)
+            total = sum(histogram)
+            similarity_sum = cache.similarity_sum
+        cumulative = 0
+        for bound, count in zip(SIMILARITY_BUCKETS, histogram):
+            cumulative += count
+            lines.append(f'travel_buddy_semantic_cache_similarity_bucket{{agent="{agent}",le="{bound}"}} {cumulative}')
+        lines.append(f'travel_buddy_semantic_cache_similarity_bucket{{agent="{agent}",le="+Inf"}} {total}')
+        lines.append(f'travel_buddy_semantic_cache_similarity_sum{{agent="{agent}"}} {similarity_sum:.4f}')
+        lines.append(f'travel_buddy_semantic_cache_similarity_count{{agent="{agent}"}} {total}')
+    return "\n".join(lines) + "\n"
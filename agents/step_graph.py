@@ -0,0 +1,88 @@
+import time
+from agents.cache import make_key
+from agents.telemetry import current_span
+
+# Trip fields each wizard step reads, and the steps whose output it uses
+STEPS = {
+    "destinations": {"fields": ["preferences", "interests"], "after": []},
+    "flights": {"fields": ["departure_city", "destination", "start_date", "end_date"], "after": []},
+    "budget": {
+        "fields": ["destination", "start_date", "end_date", "accommodation_type", "departure_city", "interests"],
+        "after": ["flights"],
+    },
+    "itinerary": {"fields": ["destination", "start_date", "end_date", "interests"], "after": ["flights", "budget"]},
+    "weather": {"fields": ["destination", "start_date", "end_date"], "after": []},
+    "weather_comparison": {"fields": ["start_date", "end_date"], "after": ["destinations"]},
+}
+
+# Recomputations kept for display
+HISTORY_SIZE = 50
+
+
+class StepGraph:
+    """
+    Wizard step outputs keyed by their exact inputs
+
+    A step's key covers the trip fields it reads and the current outputs of the
+    steps it depends on, so editing one field only invalidates the steps that
+    read it and the steps downstream of them. Kept in st.session_state, one per
+    session.
+    """
+
+    def __init__(self, steps=STEPS):
+        self.steps = steps
+        self.results = {}  # step -> {"key", "inputs", "value"}
+        self.history = []
+
+    def inputs(self, step, data):
+        """Trip fields and upstream outputs a step's result depends on"""
+        spec = self.steps[step]
+        inputs = {field: data.get(field) for field in spec["fields"]}
+        for upstream in spec["after"]:
+            inputs[upstream] = self.get(upstream, data)
+        return inputs
+
+    def get(self, step, data, default=None):
+        """Stored output of a step if it was computed from the current inputs"""
+        entry = self.results.get(step)
+        if entry is None or entry["key"] != make_key(step, self.inputs(step, data)):
+            return default
+        return entry["value"]
+
+    def is_current(self, step, data):
+        entry = self.results.get(step)
+        return entry is not None and entry["key"] == make_key(step, self.inputs(step, data))
+
+    def is_stale(self, step, data):
+        """True if a step has an output, but from different inputs"""
+        return step in self.results and not self.is_current(step, data)
+
+    def set(self, step, data, value, seconds=None):
+        """Store a step's output for the current inputs and record why it was recomputed on the current span"""
+        inputs = self.inputs(step, data)
+        previous = self.results.get(step)
+        if previous is None:
+            changed = []
+        else:
+            changed = [name for name in inputs if make_key(inputs[name]) != make_key(previous["inputs"].get(name))]
+        self.results[step] = {"key": make_key(step, inputs), "inputs": inputs, "value": value}
+
+        record = {"step": step, "changed": changed, "seconds": seconds, "at": time.time()}
+        self.history = (self.history + [record])[-HISTORY_SIZE:]
+        reason = f"{', '.join(changed)} changed" if changed else "first run"
+        current_span().set(**{f"recomputed.{step}": reason})
+        return value
+
+    def compute(self, step, data, fn):
+        """Return the step's output, calling fn() only if its inputs changed"""
+        entry_value = self.get(step, data)
+        if entry_value is not None:
+            return entry_value
+        started = time.perf_counter()
+        value = fn()
+        return self.set(step, data, value, time.perf_counter() - started)
+
+    def invalidate(self, step):
+        """Drop a step's output; downstream steps go stale through their keys"""
+        if self.results.pop(step, None) is not None:
+            current_span().set(**{f"invalidated.{step}": True})
@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import secrets
+import functools
+import threading
+import contextvars
+from collections import deque
+
+# Set TELEMETRY=0 to turn spans into no-ops
+TELEMETRY_ENABLED = os.getenv("TELEMETRY", "1") != "0"
+
+# Finished spans kept for trace export, and durations kept per span name for percentiles
+TRACE_BUFFER = int(os.getenv("TELEMETRY_TRACE_BUFFER", "2000"))
+RECENT_DURATIONS = 500
+
+# Append every finished span as OTLP JSON to this file (one resourceSpans document per line)
+TRACE_FILE = os.getenv("TELEMETRY_TRACE_FILE")
+
+# Prometheus histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+SERVICE_NAME = "travel-buddy"
+
+# Show the live latency panel in the app sidebar
+ADMIN_PANEL = os.getenv("TELEMETRY_ADMIN", "0") == "1"
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class Span:
+    """One timed operation; use through span() or traced()"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "attributes", "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def inherited(self, key, default=None):
+        """Attribute from this span or the nearest ancestor that has it"""
+        span = self
+        while span is not None:
+            if key in span.attributes:
+                return span.attributes[key]
+            span = span.parent
+        return default
+
+    @property
+    def duration(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def end(self, error=None):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.error = error
+            _registry.record(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass  # A generator finalized from another context
+        self.end(f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class _NoSpan:
+    """Stands in for Span when telemetry is off"""
+
+    def set(self, **attributes):
+        pass
+
+    def inherited(self, key, default=None):
+        return default
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **attributes):
+    """
+    Time a block as a child of the current span
+
+        with span("geocode", place=name) as s:
+            ...
+            s.set(cache="hit")
+
+    An exception leaving the block marks the span as failed and is re-raised.
+    """
+    if not TELEMETRY_ENABLED:
+        return _NO_SPAN
+    return Span(name, _current.get(), **attributes)
+
+
+def current_span():
+    return _current.get() or _NO_SPAN
+
+
+def traced(name):
+    """Decorator form of span(); generator functions are timed until exhausted"""
+    def decorate(fn):
+        import inspect
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                with span(name):
+                    yield from fn(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_tokens(prompt_tokens, completion_tokens):
+    """Count LLM tokens against the agent of the current span"""
+    current = current_span()
+    current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    _registry.add_tokens(current.inherited("agent", "unknown"), prompt_tokens, completion_tokens)
+
+
+class _Registry:
+    """Histograms, recent durations, token counters and the trace buffer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # name -> [bucket counts..., +Inf count]
+        self.sums = {}
+        self.errors = {}
+        self.recent = {}
+        self.tokens = {}  # agent -> [prompt, completion]
+        self.spans = deque(maxlen=TRACE_BUFFER)
+
+    def record(self, finished):
+        seconds = finished.duration
+        with self._lock:
+            counts = self.histograms.setdefault(finished.name, [0] * (len(BUCKETS) + 1))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.sums[finished.name] = self.sums.get(finished.name, 0.0) + seconds
+            if finished.error:
+                self.errors[finished.name] = self.errors.get(finished.name, 0) + 1
+            self.recent.setdefault(finished.name, deque(maxlen=RECENT_DURATIONS)).append(seconds)
+            self.spans.append(finished)
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(otlp_document([finished])) + "\n")
+
+    def add_tokens(self, agent, prompt_tokens, completion_tokens):
+        with self._lock:
+            counts = self.tokens.setdefault(agent, [0, 0])
+            counts[0] += prompt_tokens or 0
+            counts[1] += completion_tokens or 0
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.sums.clear()
+            self.errors.clear()
+            self.recent.clear()
+            self.tokens.clear()
+            self.spans.clear()
+
+
+_registry = _Registry()
+
+
+def percentiles():
+    """
+    Latency of recent spans by name
+
+    Returns:
+        dict: name -> count, errors, p50, p95, p99 (seconds, over the last
+        RECENT_DURATIONS spans) and total seconds
+    """
+    with _registry._lock:
+        recent = {name: list(values) for name, values in _registry.recent.items()}
+        counts = {name: counts[-1] for name, counts in _registry.histograms.items()}
+        errors = dict(_registry.errors)
+        sums = dict(_registry.sums)
+    import numpy as np
+    report = {}
+    for name in sorted(recent):
+        p50, p95, p99 = np.percentile(recent[name], [50, 95, 99])
+        report[name] = {
+            "count": counts[name],
+            "errors": errors.get(name, 0),
+            "p50": round(float(p50), 4),
+            "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4),
+            "total": round(sums[name], 3),
+        }
+    return report
+
+
+def token_counts():
+    with _registry._lock:
+        return {agent: {"prompt": p, "completion": c} for agent, (p, c) in _registry.tokens.items()}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Span histograms, error counts and LLM tokens in the Prometheus text exposition format"""
+    with _registry._lock:
+        histograms = {name: list(counts) for name, counts in _registry.histograms.items()}
+        sums = dict(_registry.sums)
+        errors = dict(_registry.errors)
+        tokens = {agent: list(counts) for agent, counts in _registry.tokens.items()}
+
+    lines = [
+        "# HELP travel_buddy_span_duration_seconds Duration of agent calls and upstream requests",
+        "# TYPE travel_buddy_span_duration_seconds histogram",
+    ]
+    for name in sorted(histograms):
+        counts = histograms[name]
+        for bound, count in zip(BUCKETS, counts):
+            lines.append(f'travel_buddy_span_duration_seconds_bucket{{span="{_label(name)}",le="{bound}"}} {count}')
+        lines.append(f'travel_buddy_span_duration_seconds_bucket{{span="{_label(name)}",le="+Inf"}} {counts[-1]}')
+        lines.append(f'travel_buddy_span_duration_seconds_sum{{span="{_label(name)}"}} {sums[name]:.6f}')
+        lines.append(f'travel_buddy_span_duration_seconds_count{{span="{_label(name)}"}} {counts[-1]}')
+
+    lines += ["# HELP travel_buddy_span_errors_total Spans that ended with an exception",
+              "# TYPE travel_buddy_span_errors_total counter"]
+    for name in sorted(histograms):
+        lines.append(f'travel_buddy_span_errors_total{{span="{_label(name)}"}} {errors.get(name, 0)}')
+
+    lines += ["# HELP travel_buddy_llm_tokens_total LLM tokens by agent",
+              "# TYPE travel_buddy_llm_tokens_total counter"]
+    for agent in sorted(tokens):
+        prompt, completion = tokens[agent]
+        lines.append(f'travel_buddy_llm_tokens_total{{agent="{_label(agent)}",kind="prompt"}} {prompt}')
+        lines.append(f'travel_buddy_llm_tokens_total{{agent="{_label(agent)}",kind="completion"}} {completion}')
+    return "\n".join(lines) + "\n"
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def otlp_document(spans):
+    """Spans as an OTLP/JSON ExportTraceServiceRequest, ready for an OpenTelemetry collector"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{
+            "scope": {"name": "agents.telemetry"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent.span_id if s.parent else "",
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+def otlp_traces(limit=None):
+    """The buffered finished spans (most recent `limit`) as an OTLP/JSON document"""
+    with _registry._lock:
+        spans = list(_registry.spans)
+    return otlp_document(spans[-limit:] if limit else spans)
+
+
+def reset():
+    _registry.reset()
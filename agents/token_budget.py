@@ -0,0 +1,125 @@
+import os
+import threading
+import contextvars
+from contextlib import contextmanager
+from agents.telemetry import current_span
+
+# Most LLM tokens (prompt + completion) one request may spend: an API call, a
+# batch-planned trip or a Streamlit run. 0 means no limit.
+MAX_TOKENS_PER_REQUEST = int(os.getenv("MAX_TOKENS_PER_REQUEST", "0"))
+
+_current = contextvars.ContextVar("token_budget", default=None)
+
+
+class TokenBudgetExceeded(Exception):
+    """A call would take a request past its token budget"""
+
+
+class TokenBudget:
+    """Tokens spent by one request, call by call, with an optional cap"""
+
+    def __init__(self, name, limit=0, parent=None):
+        self.name = name
+        self.limit = limit
+        self.parent = parent
+        self.calls = []  # {agent, model, prompt, completion}
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def used(self):
+        with self._lock:
+            return sum(call["prompt"] + call["completion"] for call in self.calls)
+
+    def check(self, estimated):
+        """Raise TokenBudgetExceeded if this budget or an enclosing one can't afford the estimate"""
+        budget = self
+        while budget is not None:
+            if budget.limit and budget.used + estimated > budget.limit:
+                budget.rejected += 1
+                raise TokenBudgetExceeded(
+                    f"{budget.name} has used {budget.used:,} of its {budget.limit:,} tokens; "
+                    f"the next call needs about {estimated:,}"
+                )
+            budget = budget.parent
+
+    def add(self, call):
+        budget = self
+        while budget is not None:
+            with budget._lock:
+                budget.calls.append(call)
+            budget = budget.parent
+
+    def report(self):
+        """
+        Token use of the request
+
+        Returns:
+            dict: name, limit, prompt, completion and total tokens, calls,
+            per-agent totals and the per-call breakdown
+        """
+        with self._lock:
+            calls = list(self.calls)
+        agents = {}
+        for call in calls:
+            totals = agents.setdefault(call["agent"], {"calls": 0, "prompt": 0, "completion": 0})
+            totals["calls"] += 1
+            totals["prompt"] += call["prompt"]
+            totals["completion"] += call["completion"]
+        prompt = sum(call["prompt"] for call in calls)
+        completion = sum(call["completion"] for call in calls)
+        return {
+            "name": self.name,
+            "limit": self.limit or None,
+            "prompt": prompt,
+            "completion": completion,
+            "total": prompt + completion,
+            "llm_calls": len(calls),
+            "agents": agents,
+            "calls": calls,
+        }
+
+
+@contextmanager
+def token_budget(name, limit=MAX_TOKENS_PER_REQUEST):
+    """
+    Account the LLM calls made inside the block (and threads and tasks started
+    from it) to one request, refusing calls once `limit` tokens are spent
+
+        with token_budget("trip 7", limit=20000) as budget:
+            ...
+        budget.report()
+
+    Budgets nest: calls count against the enclosing budgets too. Each call is
+    checked against what has been spent when it starts, so calls already
+    running in parallel can take a request a little past its limit.
+    """
+    budget = TokenBudget(name, limit, _current.get())
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def current_budget():
+    return _current.get()
+
+
+def check_budget(estimated):
+    """Called by the LLM scheduler before a call is queued"""
+    budget = _current.get()
+    if budget is not None:
+        budget.check(estimated)
+
+
+def charge(model, prompt_tokens, completion_tokens):
+    """Called by the LLM scheduler with the usage a response reported"""
+    budget = _current.get()
+    if budget is not None:
+        budget.add({
+            "agent": current_span().inherited("agent", "unknown"),
+            "model": model,
+            "prompt": prompt_tokens or 0,
+            "completion": completion_tokens or 0,
+        })
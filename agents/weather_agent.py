@@ -1,81 +1,338 @@
 import os
-import requests
-from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-import streamlit as st
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta, timezone
+from agents.cache import DiskCache, cached_invoke
+from agents.clients import get_llm, get_secret
+from agents.geocoding import geocode
+from agents.http_client import http_get
+from agents.telemetry import span, current_span, traced
+from agents.weather_summary import WET_GROUPS, condition_group, summarize_current, summarize_daily, travel_advice
 
-# Load environment variables
-load_dotenv()
-os.environ['GROQ_API_KEY'] = st.secrets["GROQ_API_KEY"]
-OPENWEATHER_API_KEY = st.secrets["OPENWEATHER_API_KEY"]
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5")
+
+# Weather is fetched once per ~11 km tile so nearby places share upstream calls
+TILE_DEGREES = 0.1
+
+# OpenWeather refreshes current conditions about every 10 minutes and the
+# 5 day / 3 hour forecast every 3 hours
+CURRENT_TTL = 10 * 60
+FORECAST_TTL = 3 * 3600
+FORECAST_DAYS = 5
+
+# Concurrent fetches in weather_forecast_many
+WEATHER_MAX_WORKERS = 4
+
+# Reword the rule-based summary with the LLM (costs a Groq call per new summary)
+WEATHER_LLM_POLISH = os.getenv("WEATHER_LLM_POLISH", "0") == "1"
+
+_current_cache = DiskCache("weather:current", ttl=CURRENT_TTL, max_entries=5000)
+_forecast_cache = DiskCache("weather:forecast", ttl=FORECAST_TTL, max_entries=5000)
+
+# One upstream fetch per tile at a time; concurrent sessions wait and read the cache
+_tile_locks = {}
+_tile_locks_guard = threading.Lock()
 
-# Initialize LLM
-llm = ChatGroq(model_name="Gemma2-9b-It")
 
 def get_city_coordinates(city):
-    url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={OPENWEATHER_API_KEY}"
     try:
-        response = requests.get(url)
-        data = response.json()
-        if not data:
+        coords = geocode(city)
+        if not coords:
             return None, None
-        return data[0]['lat'], data[0]['lon']
+        return coords
     except Exception as e:
         return None, None
 
+
+def coordinate_tile(lat, lon):
+    """Snap coordinates to the TILE_DEGREES grid"""
+    return (round(round(lat / TILE_DEGREES) * TILE_DEGREES, 4), round(round(lon / TILE_DEGREES) * TILE_DEGREES, 4))
+
+
+def _tile_lock(kind, tile):
+    with _tile_locks_guard:
+        return _tile_locks.setdefault((kind, tile), threading.Lock())
+
+
+def _fetch_tile(kind, cache, lat, lon, parse):
+    """Fetch an OpenWeather endpoint for the tile around lat/lon through the shared cache"""
+    tile = coordinate_tile(lat, lon)
+    key = f"{tile[0]},{tile[1]}"
+    with span(f"weather.{kind}", tile=key) as s:
+        data = cache.get(key)
+        if data is not None:
+            s.set(cache="hit")
+            return data
+
+        with _tile_lock(kind, tile):
+            # Another session may have fetched this tile while we waited
+            data = cache.get(key)
+            if data is not None:
+                s.set(cache="hit")
+                return data
+
+            s.set(cache="miss")
+            params = {"lat": tile[0], "lon": tile[1], "units": "metric", "appid": get_secret("OPENWEATHER_API_KEY")}
+            try:
+                with span(f"openweather.{kind}") as request:
+                    response = http_get(f"{OPENWEATHER_URL}/{kind}", params=params)
+                    request.set(status=response.status_code)
+                if response.status_code == 429:
+                    return "⚠️ Weather API limit reached. Please try again later."
+                if response.status_code != 200:
+                    return None
+                data = parse(response.json())
+            except Exception as e:
+                return None
+
+            cache.set(key, data)
+            return data
+
+
+def _parse_conditions(item):
+    """Keep only the fields the summaries use"""
+    return {
+        "temp": item["main"]["temp"],
+        "feels_like": item["main"]["feels_like"],
+        "humidity": item["main"]["humidity"],
+        "wind_speed": item["wind"]["speed"],
+        "condition_id": item["weather"][0]["id"],
+        "description": item["weather"][0]["description"],
+    }
+
+
+def _parse_forecast(payload):
+    return {
+        "timezone": payload.get("city", {}).get("timezone", 0),
+        "entries": [dict(_parse_conditions(item), dt=item["dt"]) for item in payload.get("list", [])],
+    }
+
+
 def fetch_current_weather(lat, lon):
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={OPENWEATHER_API_KEY}"
+    """Current conditions for the tile around lat/lon (dict), an error message (str) or None"""
+    return _fetch_tile("weather", _current_cache, lat, lon, _parse_conditions)
+
+
+def fetch_forecast(lat, lon):
+    """5 day / 3 hour forecast for the tile around lat/lon (dict), an error message (str) or None"""
+    return _fetch_tile("forecast", _forecast_cache, lat, lon, _parse_forecast)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def daily_forecast(forecast, start_date, end_date):
+    """
+    Collapse 3-hourly forecast entries into one row per local day of the trip
+
+    Returns:
+        list: Dicts with date, temp_min, temp_max, feels_like, humidity,
+        wind_speed, condition_id (most frequent), condition_ids (all) and
+        description, for the days the forecast covers
+    """
+    offset = timezone(timedelta(seconds=forecast.get("timezone", 0)))
+    days = {}
+    for entry in forecast["entries"]:
+        day = datetime.fromtimestamp(entry["dt"], offset).date()
+        if start_date <= day <= end_date:
+            days.setdefault(day, []).append(entry)
+
+    rows = []
+    for day in sorted(days):
+        entries = days[day]
+        # Most frequent condition of the day, worst (lowest id) on ties
+        condition_id, _ = min(Counter(e["condition_id"] for e in entries).items(), key=lambda kv: (-kv[1], kv[0]))
+        rows.append({
+            "date": day.isoformat(),
+            "temp_min": min(e["temp"] for e in entries),
+            "temp_max": max(e["temp"] for e in entries),
+            "feels_like": round(sum(e["feels_like"] for e in entries) / len(entries), 1),
+            "humidity": round(sum(e["humidity"] for e in entries) / len(entries)),
+            "wind_speed": max(e["wind_speed"] for e in entries),
+            "condition_id": condition_id,
+            "condition_ids": sorted({e["condition_id"] for e in entries}),
+            "description": next(e["description"] for e in entries if e["condition_id"] == condition_id),
+        })
+    return rows
+
+
+def polish_summary(city, summary):
+    """Have the LLM rewrite a rule-based summary; falls back to the summary on any error"""
+    summary_template = """
+You are a travel assistant. Rewrite this weather summary for {city} in bullet points like a perfect weather application.
+Keep every number and date unchanged and keep the travel advice brief.
+
+{summary}
+"""
     try:
-        response = requests.get(url)
-        if response.status_code == 429:
-            return "⚠️ Weather API limit reached. Please try again later."
-        if response.status_code != 200:
-            return None
-        return response.json()
+        from langchain_core.prompts import ChatPromptTemplate
+        prompt = ChatPromptTemplate.from_template(summary_template)
+        chain = prompt | get_llm()
+        return cached_invoke("weather", chain, {"city": city, "summary": summary})
     except Exception as e:
-        return None
+        current_span().set(polish_skipped=str(e))
+        return summary
+
 
-def weather_forecast(city):
+def trip_conditions(lat, lon, start_date=None, end_date=None):
+    """
+    Weather data for a trip at lat/lon
+
+    Uses the forecast when the trip starts within its range, current
+    conditions otherwise.
+
+    Returns:
+        tuple: ("forecast", daily rows), ("current", conditions dict) or ("error", message)
+    """
+    today = datetime.now(timezone.utc).date()
+    if start_date and start_date <= today + timedelta(days=FORECAST_DAYS):
+        forecast = fetch_forecast(lat, lon)
+        if isinstance(forecast, str):
+            return "error", forecast
+        if forecast:
+            rows = daily_forecast(forecast, start_date, end_date)
+            if rows:
+                return "forecast", rows
+
+    weather_data = fetch_current_weather(lat, lon)
+    if weather_data is None or isinstance(weather_data, str):
+        return "error", weather_data or "❌ Could not retrieve weather data."
+    return "current", weather_data
+
+
+@traced("agent.weather")
+def weather_forecast(city, start_date=None, end_date=None, llm_polish=WEATHER_LLM_POLISH):
+    """
+    Weather summary for a destination
+
+    Args:
+        city (str): Destination name
+        start_date (str or date): First trip day (YYYY-MM-DD); without it, current conditions are used
+        end_date (str or date): Last trip day, defaults to start_date
+        llm_polish (bool): Have the LLM reword the rule-based summary
+
+    Returns:
+        str: Markdown summary, or an error message
+    """
     lat, lon = get_city_coordinates(city)
     if lat is None or lon is None:
         return f"❌ Could not find coordinates for city: {city}"
 
-    weather_data = fetch_current_weather(lat, lon)
-    if weather_data is None or isinstance(weather_data, str):
-        return weather_data or "❌ Could not retrieve weather data."
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date) or start_date
+    source, data = trip_conditions(lat, lon, start_date, end_date)
+    if source == "error":
+        return data
 
     try:
-        temp = weather_data["main"]["temp"]
-        feels_like = weather_data["main"]["feels_like"]
-        description = weather_data["weather"][0]["description"].capitalize()
-        humidity = weather_data["main"]["humidity"]
-        wind_speed = weather_data["wind"]["speed"]
-
-        summary_text = (
-            f"- Temperature: {temp}°C\n"
-            f"- Feels Like: {feels_like}°C\n"
-            f"- Condition: {description}\n"
-            f"- Humidity: {humidity}%\n"
-            f"- Wind Speed: {wind_speed} m/s"
-        )
-
-        # Chain LLM prompt
-        summary_template = """
-You are a travel assistant. Summarize the current weather conditions in {city} and give brief travel advice if necessary.
-Give the answer in bullet points like a perfect weather application.
-
-Current weather data:
-{weather_data}
-"""
-        prompt = ChatPromptTemplate.from_template(summary_template)
-        chain = prompt | llm
+        if source == "forecast":
+            summary = summarize_daily(city, data)
+        else:
+            summary = summarize_current(city, data)
+            if start_date:
+                summary = f"_The trip is beyond the {FORECAST_DAYS}-day forecast range, so these are current conditions._\n\n{summary}"
+    except (KeyError, TypeError, ValueError) as e:
+        return f"❌ Weather processing failed: {str(e)}"
 
-        return chain.invoke({
-            "city": city,
-            "weather_data": summary_text
-        }).content
+    return polish_summary(city, summary) if llm_polish else summary
+
+
+def _comparison_row(source, data):
+    """One weather_forecast_many row from trip_conditions output"""
+    rows = data if source == "forecast" else [dict(data, temp_min=data["temp"], temp_max=data["temp"])]
+    day_conditions = [r.get("condition_ids", [r["condition_id"]]) for r in rows]
+    # Most common daily condition across the trip
+    dominant = [r["condition_id"] for r in rows]
+    icon, group = condition_group(max(set(dominant), key=dominant.count))
+
+    temp_min = min(r["temp_min"] for r in rows)
+    temp_max = max(r["temp_max"] for r in rows)
+    feels_like = max(r["feels_like"] for r in rows)
+    humidity = max(r["humidity"] for r in rows)
+    wind_speed = max(r["wind_speed"] for r in rows)
+    return {
+        "source": source,
+        "days": len(rows) if source == "forecast" else 0,
+        "temp_min": temp_min,
+        "temp_max": temp_max,
+        "feels_like": feels_like,
+        "humidity": humidity,
+        "wind_speed": wind_speed,
+        "condition": f"{icon} {group.capitalize()}",
+        "wet_days": sum(1 for ids in day_conditions if any(condition_group(c)[1] in WET_GROUPS for c in ids)),
+        "advice": travel_advice(
+            temp_max, temp_min, feels_like, humidity, wind_speed, [c for ids in day_conditions for c in ids]
+        ),
+    }
+
+
+def weather_forecast_many(cities, start_date=None, end_date=None, max_workers=WEATHER_MAX_WORKERS):
+    """
+    Weather for several destinations side by side
+
+    Coordinates come from the geocoding cache; cities on the same coordinate
+    tile share one fetch, and the tiles are fetched concurrently.
+
+    Args:
+        cities (list): Destination names
+        start_date (str or date): First trip day (YYYY-MM-DD)
+        end_date (str or date): Last trip day
+        max_workers (int): Most weather fetches running at once
+
+    Returns:
+        list: One dict per city, in input order, with city, tile, source
+        ("forecast", "current" or "error"), days, temp_min, temp_max,
+        feels_like, humidity, wind_speed, condition, wet_days and advice;
+        error rows carry an error message instead
+    """
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date) or start_date
+    cities = list(cities)
+
+    tiles = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        coordinates = list(executor.map(get_city_coordinates, cities))
+        for lat, lon in coordinates:
+            if lat is not None:
+                tile = coordinate_tile(lat, lon)
+                if tile not in tiles:
+                    tiles[tile] = executor.submit(trip_conditions, tile[0], tile[1], start_date, end_date)
+
+    results = []
+    for city, (lat, lon) in zip(cities, coordinates):
+        if lat is None:
+            results.append({"city": city, "tile": None, "source": "error",
+                            "error": f"❌ Could not find coordinates for city: {city}"})
+            continue
+        tile = coordinate_tile(lat, lon)
+        try:
+            source, data = tiles[tile].result()
+            row = {"source": source, "error": data} if source == "error" else _comparison_row(source, data)
+        except Exception as e:
+            row = {"source": "error", "error": f"❌ Weather processing failed: {str(e)}"}
+        results.append({"city": city, "tile": tile, **row})
+    return results
 
-    except Exception as e:
-        return f"❌ Weather processing failed: {str(e)}"
 
+def weather_table(results):
+    """Flatten weather_forecast_many output into columns for st.dataframe"""
+    table = {"Destination": [], "Conditions": [], "Temperature": [], "Feels like": [],
+             "Humidity": [], "Wind": [], "Rainy days": []}
+    for row in results:
+        table["Destination"].append(row["city"])
+        if row["source"] == "error":
+            table["Conditions"].append(row["error"])
+            for column in ("Temperature", "Feels like", "Humidity", "Wind", "Rainy days"):
+                table[column].append("")
+            continue
+        table["Conditions"].append(row["condition"] + ("" if row["source"] == "forecast" else " (now)"))
+        table["Temperature"].append(f"{row['temp_min']:.0f}–{row['temp_max']:.0f}°C")
+        table["Feels like"].append(f"{row['feels_like']:.0f}°C")
+        table["Humidity"].append(f"{row['humidity']}%")
+        table["Wind"].append(f"{row['wind_speed']} m/s")
+        table["Rainy days"].append(f"{row['wet_days']} of {row['days']}" if row["source"] == "forecast" else "")
+    return table
@@ -0,0 +1,148 @@
+from datetime import datetime
+
+# Thresholds for advice (°C, %, m/s)
+VERY_HOT = 35
+HOT = 30
+PLEASANT_LOW = 18
+COOL = 15
+COLD = 10
+FREEZING = 0
+MUGGY_HUMIDITY = 75
+MUGGY_GAP = 3  # feels-like above actual
+BREEZY = 6
+WINDY = 10
+
+# OpenWeather condition codes: (first id, last id, icon, group)
+CONDITION_GROUPS = [
+    (200, 299, "⛈️", "thunderstorm"),
+    (300, 399, "🌦️", "drizzle"),
+    (500, 501, "🌧️", "rain"),
+    (502, 531, "🌧️", "heavy rain"),
+    (600, 699, "❄️", "snow"),
+    (701, 721, "🌫️", "haze"),
+    (731, 731, "🌪️", "dust"),
+    (741, 741, "🌫️", "fog"),
+    (751, 762, "🌪️", "dust"),
+    (771, 781, "🌪️", "squalls"),
+    (800, 800, "☀️", "clear"),
+    (801, 802, "⛅", "partly cloudy"),
+    (803, 804, "☁️", "cloudy"),
+]
+
+# Condition groups that mean getting wet
+WET_GROUPS = {"drizzle", "rain", "heavy rain", "thunderstorm", "snow"}
+
+# Upper bound of each wind description (m/s, Beaufort scale)
+WIND_SCALE = [(0.5, "calm"), (3.3, "light breeze"), (5.5, "gentle breeze"), (7.9, "moderate breeze"),
+              (10.7, "fresh breeze"), (13.8, "strong breeze"), (float("inf"), "gale-force wind")]
+
+
+def condition_group(condition_id):
+    """(icon, group) for an OpenWeather condition id"""
+    for first, last, icon, group in CONDITION_GROUPS:
+        if first <= condition_id <= last:
+            return icon, group
+    return "🌡️", "unknown"
+
+
+def wind_description(speed):
+    for limit, name in WIND_SCALE:
+        if speed < limit:
+            return name
+    return WIND_SCALE[-1][1]
+
+
+def travel_advice(temp_max, temp_min, feels_like, humidity, wind_speed, condition_ids):
+    """
+    Advice bullets for the weather over a period
+
+    Args:
+        temp_max (float): Highest temperature
+        temp_min (float): Lowest temperature
+        feels_like (float): Highest feels-like temperature
+        humidity (float): Highest humidity
+        wind_speed (float): Highest wind speed
+        condition_ids (list): OpenWeather condition ids seen in the period
+    """
+    groups = {condition_group(c)[1] for c in condition_ids}
+    advice = []
+
+    if "thunderstorm" in groups:
+        advice.append("Thunderstorms expected - avoid beaches, peaks and open areas when they roll in")
+    if groups & WET_GROUPS - {"snow"}:
+        advice.append("Carry an umbrella or rain jacket and waterproof footwear")
+    if "heavy rain" in groups:
+        advice.append("Heavy rain can cause landslides and road closures in hilly areas - check routes before setting out")
+    if "snow" in groups:
+        advice.append("Snow is likely - check road and pass status and pack waterproof winter gear")
+    if groups & {"fog", "haze"}:
+        advice.append("Low visibility in the mornings - allow extra time for road travel and flights")
+    if groups & {"dust", "squalls"}:
+        advice.append("Dusty, gusty conditions - sunglasses and a scarf or mask help")
+
+    if feels_like >= VERY_HOT or temp_max >= VERY_HOT:
+        advice.append("Very hot - plan outdoor sightseeing for early morning or evening and stay hydrated")
+    elif temp_max >= HOT:
+        advice.append("Warm afternoons - light cotton clothes, sunscreen and a hat are a good idea")
+    if humidity >= MUGGY_HUMIDITY and feels_like - temp_max >= MUGGY_GAP:
+        advice.append("Humid and muggy - it will feel hotter than the thermometer says")
+
+    if temp_min <= FREEZING:
+        advice.append("Below freezing at night - bring thermals, gloves and a heavy jacket")
+    elif temp_min <= COLD:
+        advice.append("Cold mornings and nights - pack warm layers")
+    elif temp_min <= COOL:
+        advice.append("Cool evenings - a light jacket or sweater will do")
+
+    if wind_speed >= WINDY:
+        advice.append("Strong winds - boat rides, paragliding and cable cars may be suspended")
+    elif wind_speed >= BREEZY:
+        advice.append("Breezy at times - secure hats and loose items outdoors")
+
+    if not advice and PLEASANT_LOW <= temp_min and temp_max < HOT:
+        advice.append("Pleasant weather - great for sightseeing and outdoor activities")
+    return advice
+
+
+def summarize_current(city, weather_data):
+    """Bullet-point summary of current conditions, in the same format the LLM used to return"""
+    icon, _ = condition_group(weather_data["condition_id"])
+    lines = [
+        f"**Current weather in {city}**",
+        f"- {icon} Condition: {weather_data['description'].capitalize()}",
+        f"- 🌡️ Temperature: {weather_data['temp']:.0f}°C (feels like {weather_data['feels_like']:.0f}°C)",
+        f"- 💧 Humidity: {weather_data['humidity']}%",
+        f"- 💨 Wind: {weather_data['wind_speed']} m/s ({wind_description(weather_data['wind_speed'])})",
+    ]
+    advice = travel_advice(
+        weather_data["temp"], weather_data["temp"], weather_data["feels_like"],
+        weather_data["humidity"], weather_data["wind_speed"], [weather_data["condition_id"]]
+    )
+    return _with_advice(lines, advice)
+
+
+def summarize_daily(city, rows):
+    """Bullet-point summary of daily forecast rows from weather_agent.daily_forecast"""
+    lines = [f"**Forecast for {city}**"]
+    for row in rows:
+        icon, _ = condition_group(row["condition_id"])
+        day = datetime.strptime(row["date"], "%Y-%m-%d").strftime("%a, %b %d")
+        lines.append(
+            f"- {icon} **{day}**: {row['description'].capitalize()}, "
+            f"{row['temp_min']:.0f}–{row['temp_max']:.0f}°C (feels like {row['feels_like']:.0f}°C), "
+            f"humidity {row['humidity']}%, wind up to {row['wind_speed']} m/s"
+        )
+    advice = travel_advice(
+        max(r["temp_max"] for r in rows), min(r["temp_min"] for r in rows),
+        max(r["feels_like"] for r in rows), max(r["humidity"] for r in rows),
+        max(r["wind_speed"] for r in rows), [c for r in rows for c in r.get("condition_ids", [r["condition_id"]])]
+    )
+    return _with_advice(lines, advice)
+
+
+def _with_advice(lines, advice):
+    if advice:
+        lines.append("")
+        lines.append("**Travel advice**")
+        lines.extend(f"- {tip}" for tip in advice)
+    return "\n".join(lines)
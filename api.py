@@ -0,0 +1,314 @@
+"""
+HTTP API for the planning agents
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Identical requests that arrive while one is in flight share its upstream
+call, each endpoint has its own concurrency limit, and itineraries can be
+streamed as they are generated.
+"""
+import os
+import asyncio
+from datetime import datetime
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from agents.cache import make_key, cache_stats
+from agents.coalesce import RequestCoalescer, StreamCoalescer
+from agents.llm_scheduler import INTERACTIVE, llm_priority, scheduler_stats
+from agents.telemetry import otlp_traces, prometheus_text, span
+from agents.token_budget import token_budget
+from agents import semantic_cache
+
+# Requests each endpoint works on at once; the rest queue (API_MAX_CONCURRENT_<ENDPOINT> overrides)
+ENDPOINT_LIMITS = {
+    "destinations": 32,
+    "flights": 8,
+    "budget": 32,
+    "itinerary": 32,
+    "weather": 16,
+}
+ENDPOINT_LIMITS = {
+    name: int(os.getenv(f"API_MAX_CONCURRENT_{name.upper()}", limit)) for name, limit in ENDPOINT_LIMITS.items()
+}
+
+# Seconds a request may queue for its endpoint before getting a 503
+QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "30"))
+
+# Worker threads for the blocking parts (Amadeus SDK, weather and geocoding
+# lookups, waiting for LLM admission)
+API_THREADS = int(os.getenv("API_THREADS", "64"))
+
+_limits = {name: asyncio.Semaphore(limit) for name, limit in ENDPOINT_LIMITS.items()}
+_waiting = {name: 0 for name in ENDPOINT_LIMITS}
+calls = RequestCoalescer()
+streams = StreamCoalescer()
+
+
+class ServiceBusy(Exception):
+    """An endpoint's queue didn't drain within QUEUE_TIMEOUT"""
+
+
+@asynccontextmanager
+async def endpoint_slot(name):
+    """Hold one of the endpoint's concurrency slots"""
+    _waiting[name] += 1
+    try:
+        await asyncio.wait_for(_limits[name].acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ServiceBusy(f"{name} is busy, try again shortly") from None
+    finally:
+        _waiting[name] -= 1
+    try:
+        yield
+    finally:
+        _limits[name].release()
+
+
+async def run_limited(name, fn, *args):
+    """Run a blocking agent function on a worker thread inside the endpoint's limit"""
+    async with endpoint_slot(name):
+        return await asyncio.to_thread(fn, *args)
+
+
+async def read_payload(request, required):
+    """Query parameters for GET, the JSON body otherwise; 400 if a required field is missing"""
+    if request.method == "GET":
+        payload = dict(request.query_params)
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(400, "Request body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPException(400, "Request body must be a JSON object")
+    missing = [field for field in required if not payload.get(field)]
+    if missing:
+        raise HTTPException(400, f"Missing fields: {', '.join(missing)}")
+    return payload
+
+
+def parse_date(payload, field):
+    try:
+        return datetime.strptime(str(payload[field]), '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(400, f"{field} must be YYYY-MM-DD")
+
+
+def parse_number(payload, field, default=None, minimum=0, maximum=None):
+    """A whole-number field, or default when it's absent; 400 if it isn't one within the limits"""
+    value = payload.get(field)
+    if value is None or value == "":
+        return default
+    limits = f"from {minimum} to {maximum}" if maximum is not None else f"of at least {minimum}"
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if (isinstance(value, bool) or number is None or not number.is_integer()
+            or number < minimum or (maximum is not None and number > maximum)):
+        raise HTTPException(400, f"{field} must be a whole number {limits}")
+    return int(number)
+
+
+async def destinations(request):
+    from agents.destination_agent import adestination, parse_destinations
+
+    payload = await read_payload(request, ["preferences", "interests"])
+    args = (payload['preferences'], payload.get('budget', 50000), payload['interests'])
+
+    async def call():
+        async with endpoint_slot("destinations"):
+            return await adestination(*args)
+
+    response = await calls.run(make_key("destinations", args), call)
+    if response.startswith("❌"):
+        return JSONResponse({"error": response}, status_code=502)
+    return JSONResponse({"destinations": parse_destinations(response)})
+
+
+async def flights(request):
+    from agents.flight_planner import find_flights
+
+    payload = await read_payload(request, ["origin_city", "destination_city", "departure_date", "return_date"])
+    args = (payload['origin_city'], payload['destination_city'], payload['departure_date'],
+            payload['return_date'], parse_number(payload, 'adults', 1, minimum=1, maximum=9))
+    try:
+        result = await calls.run(make_key("flights", args), lambda: run_limited("flights", find_flights, *args))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    offers = []
+    for number, (offer, is_primary, cache_age) in enumerate(result['offers'], 1):
+        selection = offer.to_selection(number, payload['origin_city'], payload['destination_city'])
+        selection.update(primary_airport=bool(is_primary), cache_age=round(float(cache_age), 1))
+        offers.append(selection)
+    return JSONResponse({
+        "origin_code": result['origin_code'],
+        "dest_code": result['dest_code'],
+        "offers": offers,
+        "errors": [{"route": f"{orig}-{dest}", "error": error} for (orig, dest), error in result['errors']],
+    })
+
+
+async def budget(request):
+    from agents.budget_agent import calculate_budget
+    from agents.budget_model import ACCOMMODATION_TYPES
+
+    payload = await read_payload(request, ["destination", "start_date", "end_date", "flight_location", "interests"])
+    start, end = parse_date(payload, 'start_date'), parse_date(payload, 'end_date')
+    args = (
+        payload['destination'],
+        f"{start.strftime('%B %d')} to {end.strftime('%B %d')}",
+        payload.get('accommodation_type', ACCOMMODATION_TYPES[1]),
+        payload['flight_location'],
+        payload['interests'],
+        parse_number(payload, 'flight_cost') or None,
+    )
+    value = await calls.run(make_key("budget", args), lambda: run_limited("budget", calculate_budget, *args))
+    return JSONResponse({"budget": value})
+
+
+def itinerary_stream(payload):
+    """Shared (coalesced) stream of itinerary fragments for a request payload"""
+    from agents.itenary_agent import astream_itinerary, trip_dates, flight_details_from_selection
+
+    parse_date(payload, 'start_date')
+    parse_date(payload, 'end_date')
+    dates = trip_dates(payload['start_date'], payload['end_date'])
+    flight_details = flight_details_from_selection(payload.get('flight'), payload['destination'])
+    args = (payload['destination'], dates, payload.get('budget', 50000), payload['interests'], flight_details)
+
+    async def generate():
+        async with endpoint_slot("itinerary"):
+            with llm_priority(INTERACTIVE):
+                async for chunk in astream_itinerary(*args):
+                    yield chunk
+
+    return streams.stream(make_key("itinerary", args), generate)
+
+
+async def itinerary(request):
+    payload = await read_payload(request, ["destination", "start_date", "end_date", "interests"])
+    content = "".join([chunk async for chunk in itinerary_stream(payload)])
+    if content.startswith("❌"):
+        return JSONResponse({"error": content}, status_code=502)
+    return JSONResponse({"itinerary": content})
+
+
+async def itinerary_streaming(request):
+    payload = await read_payload(request, ["destination", "start_date", "end_date", "interests"])
+    chunks = itinerary_stream(payload)
+    # Wait for the first fragment so a full queue is still reported as a 503
+    first = await anext(chunks, "")
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="text/markdown; charset=utf-8")
+
+
+async def weather(request):
+    from agents.weather_agent import weather_forecast
+
+    payload = await read_payload(request, ["city"])
+    if payload.get('start_date'):
+        parse_date(payload, 'start_date')
+    if payload.get('end_date'):
+        parse_date(payload, 'end_date')
+    args = (payload['city'], payload.get('start_date'), payload.get('end_date'))
+    summary = await calls.run(make_key("weather", args), lambda: run_limited("weather", weather_forecast, *args))
+    if summary.startswith(("❌", "⚠️")):
+        return JSONResponse({"error": summary}, status_code=502)
+    return JSONResponse({"summary": summary})
+
+
+async def health(request):
+    return JSONResponse({
+        "endpoints": {
+            name: {"limit": limit, "waiting": _waiting[name]} for name, limit in ENDPOINT_LIMITS.items()
+        },
+        "coalescing": {"calls": calls.stats(), "streams": streams.stats()},
+        "llm": scheduler_stats(),
+        "cache": cache_stats(),
+        "semantic_cache": semantic_cache.semantic_cache_stats(),
+    })
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(prometheus_text() + semantic_cache.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def traces(request):
+    """Recent spans as OTLP/JSON (?limit=N for the last N)"""
+    limit = request.query_params.get('limit')
+    return JSONResponse(otlp_traces(int(limit) if limit and limit.isdigit() else None))
+
+
+async def service_busy(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+class TraceRequests:
+    """Root span and token budget per request, so the agent and upstream spans it causes share one trace"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"] if scope["path"] in ROUTE_PATHS else "other"
+        # Each request gets its own token budget (MAX_TOKENS_PER_REQUEST); coalesced
+        # calls are charged to the request that started them
+        with span(f"api {path}", method=scope["method"]) as s, token_budget(f"api {path}") as tokens:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    s.set(status=message["status"])
+                    # Everything but streamed responses has made its LLM calls by now
+                    headers = list(message.get("headers", [])) + [(b"x-llm-tokens", str(tokens.used).encode())]
+                    message = dict(message, headers=headers)
+                await send(message)
+            await self.app(scope, receive, send_with_status)
+            s.set(tokens=tokens.used)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api"))
+    yield
+
+
+routes = [
+    Route("/destinations", destinations, methods=["POST"]),
+    Route("/flights", flights, methods=["POST"]),
+    Route("/budget", budget, methods=["POST"]),
+    Route("/itinerary", itinerary, methods=["POST"]),
+    Route("/itinerary/stream", itinerary_streaming, methods=["POST"]),
+    Route("/weather", weather, methods=["GET"]),
+    Route("/health", health, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/traces", traces, methods=["GET"]),
+]
+ROUTE_PATHS = {route.path for route in routes}
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(TraceRequests)],
+    exception_handlers={ServiceBusy: service_busy, HTTPException: http_error},
+    lifespan=lifespan,
+)
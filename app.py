@@ -1,13 +1,10 @@
 import streamlit as st
-st.cache_data.clear()
 from datetime import datetime, timedelta, timezone
-from agents.budget_agent import calculate_budget
-from agents.destination_agent import destination
-from agents.flight_planner import flight_planner_agent
-from agents.itenary_agent import generate_itinerary
-from agents.weather_agent import weather_forecast
 import time
 import re
+from agents.step_graph import StepGraph
+from agents.prefetch import Prefetcher
+from agents.telemetry import ADMIN_PANEL, span
 
 # Set page config
 st.set_page_config(
@@ -130,10 +127,20 @@ if 'current_step' not in st.session_state:
     st.session_state.current_step = 1
 if 'travel_data' not in st.session_state:
     st.session_state.travel_data = {}
-if 'destinations' not in st.session_state:
-    st.session_state.destinations = []
 if 'destination_details' not in st.session_state:
     st.session_state.destination_details = {}
+if 'step_graph' not in st.session_state:
+    # Step outputs keyed by their inputs, so going back and editing only redoes what changed
+    st.session_state.step_graph = StepGraph()
+if 'prefetcher' not in st.session_state:
+    # Background warm-up of flights and weather for the candidate destinations
+    st.session_state.prefetcher = Prefetcher()
+
+# Time each script run as the current span; a run cut short by st.rerun is closed when the next one starts
+if st.session_state.get('render_span') is not None:
+    st.session_state.render_span.set(interrupted=True)
+    st.session_state.render_span.__exit__(None, None, None)
+st.session_state.render_span = span("streamlit.run", step=st.session_state.current_step).__enter__()
 
 # Sidebar - Progress tracker
 with st.sidebar:
@@ -183,6 +190,231 @@ def calculate_trip_days(start_date, end_date):
 def format_date_range(start_date, end_date):
     return f"{start_date.strftime('%B %d')} to {end_date.strftime('%B %d')}"
 
+def render_admin_panel():
+    """Live latency percentiles per span, LLM token counts and metric exports"""
+    from agents.telemetry import percentiles, token_counts, prometheus_text, otlp_traces
+    from agents.llm_scheduler import scheduler_stats
+    from agents.semantic_cache import semantic_cache_stats
+    import json
+
+    with st.expander("⏱️ Performance", expanded=False):
+        report = percentiles()
+        if not report:
+            st.caption("No spans recorded yet")
+            return
+        st.dataframe({
+            "Span": list(report),
+            "Count": [r["count"] for r in report.values()],
+            "Errors": [r["errors"] for r in report.values()],
+            "p50 (ms)": [round(r["p50"] * 1000) for r in report.values()],
+            "p95 (ms)": [round(r["p95"] * 1000) for r in report.values()],
+            "p99 (ms)": [round(r["p99"] * 1000) for r in report.values()],
+        }, hide_index=True)
+        tokens = token_counts()
+        if tokens:
+            st.caption("LLM tokens: " + ", ".join(
+                f"{agent} {t['prompt']:,} in / {t['completion']:,} out" for agent, t in tokens.items()
+            ))
+        last = st.session_state.get("itinerary_tokens")
+        if last and last["calls"]:
+            st.caption(f"Last itinerary: {last['total']:,} tokens over {last['llm_calls']} calls")
+            st.dataframe(last["calls"], hide_index=True)
+        for agent, cached in semantic_cache_stats().items():
+            similarity = cached.get("similarity", {})
+            st.caption(f"Semantic cache ({agent}): {cached['hit_rate']:.0%} of {cached['hits'] + cached['misses']} lookups hit, "
+                       f"median best similarity {similarity.get('p50', 0):.2f} (threshold {cached['threshold']}, {cached['embedder']} embeddings)")
+        stats = scheduler_stats()
+        st.caption(f"LLM queue: {stats['queue_depth']} waiting, {stats['rate_limited']} rate-limited")
+        st.download_button("Prometheus metrics", prometheus_text(), file_name="metrics.prom")
+        st.download_button("Traces (OTLP JSON)", json.dumps(otlp_traces()), file_name="traces.json")
+
+def trip_budget(trip, selected_flight):
+    """Total budget for the trip as currently entered"""
+    from agents.budget_agent import calculate_budget
+    from agents.budget_model import ACCOMMODATION_TYPES
+    start_date = datetime.strptime(trip['start_date'], '%Y-%m-%d').date()
+    end_date = datetime.strptime(trip['end_date'], '%Y-%m-%d').date()
+    return calculate_budget(
+        destination=trip['destination'],
+        dates=format_date_range(start_date, end_date),
+        accommodation_type=trip.get('accommodation_type', ACCOMMODATION_TYPES[1]),
+        flight_location=trip['departure_city'],
+        interests=trip['interests'],
+        flight_cost=(selected_flight or {}).get('price', 0)
+    )
+
+def render_flight_options(origin_city, destination_city, departure_date, return_date, adults=1):
+    """
+    Flight search with automatic fallback to nearby airports (destination only)
+
+    Returns:
+        The selected flight dict, None while nothing is selected, True when no
+        flights were found, or False on invalid input or an error
+    """
+    from agents.flight_planner import find_flights
+    try:
+        # ===== 1. VALIDATION =====
+        if not all([origin_city, destination_city, departure_date, return_date]):
+            st.error("❌ Please fill all search fields")
+            return False
+
+        try:
+            dep_dt = datetime.strptime(departure_date, '%Y-%m-%d').date()
+            ret_dt = datetime.strptime(return_date, '%Y-%m-%d').date()
+            if dep_dt >= ret_dt:
+                st.error("❌ Return date must be after departure date")
+                return False
+            if dep_dt < datetime.now().date():
+                st.error("❌ Departure date cannot be in the past")
+                return False
+        except ValueError:
+            st.error("❌ Invalid date format (use YYYY-MM-DD)")
+            return False
+
+        if not isinstance(adults, int) or adults < 1 or adults > 9:
+            st.error("❌ Adults must be 1-9")
+            return False
+
+        # ===== 2. AIRPORT LOOKUP AND FLIGHT SEARCH =====
+        # Primary + 3 nearest alternative destination airports, searched concurrently (origin fixed)
+        with st.spinner("📍 Finding nearest airports and flights..."):
+            found = find_flights(origin_city, destination_city, departure_date, return_date, adults)
+        origin_code, dest_code = found['origin_code'], found['dest_code']
+        all_offers, airports_tried = found['offers'], found['airports_tried']
+
+        for warning in found['warnings']:
+            st.warning(warning)
+        if not origin_code:
+            st.error(f"❌ No airport found near: {origin_city}")
+            return False
+        if not dest_code:
+            st.error(f"❌ No airport found near: {destination_city}")
+            return False
+
+        st.info(f"Departure from: {origin_code} (Nearest to {origin_city})")
+        st.info(f"Arrival at: {dest_code} (Nearest to {destination_city})")
+        for (orig, dest), error in found['errors']:
+            st.warning(f"Search failed for {orig}→{dest}: {error}")
+
+        # ===== 3. DISPLAY RESULTS =====
+        if not all_offers:
+            st.warning(f"""
+            🛫 No flights found for:
+            • {origin_city} → {destination_city}
+            • {dep_dt.strftime('%b %d')} - {ret_dt.strftime('%b %d %Y')}
+            """)
+
+            # Show alternative airports we tried
+            if len(airports_tried) > 1:
+                st.info("ℹ️ Also tried these alternative destination airports:")
+                cols = st.columns(4)
+                for i, (orig, dest) in enumerate(airports_tried):
+                    if dest != dest_code:
+                        cols[i%4].write(f"{dest}")
+            return True
+
+        # Offers come back sorted - primary airport results first, then by price
+        primary_count = int(all_offers.is_primary.sum())
+        alternate_count = len(all_offers) - primary_count
+
+        if primary_count:
+            st.success(f"✨ Found {primary_count} flight options to {dest_code}")
+        if alternate_count:
+            st.info(f"💡 Also found {alternate_count} options to alternative airports")
+
+        cache_age = all_offers.cache_age.max()
+        if cache_age >= 60:
+            st.caption(f"🕒 Prices cached {int(cache_age // 60)} min ago")
+
+        # Narrow down the options
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            max_stops = st.selectbox("Stops", ["Any", "Non-stop", "Up to 1 stop"], key="flight_filter_stops")
+        with col2:
+            departure_hours = st.slider("Departure time", 0, 24, (0, 24), key="flight_filter_departure")
+        with col3:
+            max_price = st.number_input(
+                "Max price (₹)", min_value=0, value=int(all_offers.price.max()), step=1000, key="flight_filter_price"
+            )
+        shown_offers = all_offers.filter(
+            max_price=max_price,
+            max_stops={"Any": None, "Non-stop": 0, "Up to 1 stop": 1}[max_stops],
+            departure_window=(departure_hours[0] * 60, departure_hours[1] * 60)
+        )
+        if not len(shown_offers):
+            st.info("No flights match these filters.")
+
+        # Initialize selection state
+        if 'selected_flight' not in st.session_state:
+            st.session_state.selected_flight = None
+        st.session_state.travel_data = st.session_state.get('travel_data', {})
+        st.session_state.travel_data['flight_cost'] = None
+
+        # Display all flight options
+        for i, (offer, is_primary, _) in enumerate(shown_offers, 1):
+            outbound = offer.outbound
+            return_trip = offer.return_leg
+            origin_airport = offer.origin_airport
+            dest_airport = offer.dest_airport
+
+            with st.container():
+                # Show airport indicator if using alternatives
+                if not is_primary:
+                    st.caption(f"🚩 Alternative destination airport: {dest_airport}")
+
+                st.markdown(f"### {outbound.airline} • {outbound.flight_number}")
+
+                # Outbound flight
+                st.markdown(f"#### 🛫 Outbound: {outbound.departure_time.strftime('%a, %b %d')}")
+                col1, col2, col3 = st.columns([3, 2, 3])
+                with col1:
+                    st.caption("FROM")
+                    st.markdown(f"**{origin_airport}**")
+                    st.write(outbound.departure_time.strftime('%H:%M'))
+                with col2:
+                    st.caption("DURATION")
+                    st.write(outbound.duration)
+                    st.write("→")
+                    st.caption(f"{outbound.stops} STOP{'S' if outbound.stops != 1 else ''}")
+                with col3:
+                    st.caption("TO")
+                    st.markdown(f"**{dest_airport}**")
+                    st.write(outbound.arrival_time.strftime('%H:%M'))
+
+                # Return flight if available
+                if return_trip:
+                    st.markdown(f"#### 🛬 Return: {return_trip.departure_time.strftime('%a, %b %d')}")
+                    col1, col2, col3 = st.columns([3, 2, 3])
+                    with col1:
+                        st.caption("FROM")
+                        st.markdown(f"**{dest_airport}**")
+                        st.write(return_trip.departure_time.strftime('%H:%M'))
+                    with col2:
+                        st.caption("DURATION")
+                        st.write(return_trip.duration)
+                        st.write("→")
+                        st.caption(f"{return_trip.stops} STOP{'S' if return_trip.stops != 1 else ''}")
+                    with col3:
+                        st.caption("TO")
+                        st.markdown(f"**{origin_airport}**")
+                        st.write(return_trip.arrival_time.strftime('%H:%M'))
+
+                st.markdown(f"### Total Price: ₹{offer.price:,}")
+
+                if st.button(f"Select This Flight", key=f"select_{i}_{origin_airport}_{dest_airport}_{outbound.flight_number}"):
+                    st.session_state.selected_flight = offer.to_selection(i, origin_city, destination_city)
+                    st.session_state.travel_data['flight_cost'] = offer.price
+                    st.rerun()
+
+        if st.session_state.selected_flight:
+            return st.session_state.selected_flight
+
+        return None
+
+    except Exception as e:
+        st.error(f"Unexpected error: {str(e)}")
+        return False
+
 # Step 1: Trip Preferences
 if st.session_state.current_step == 1:
     st.header("📍 Step 1: Tell Us About Your Trip")
@@ -269,54 +501,65 @@ if st.session_state.current_step == 1:
 # Step 2: Destination Selection
 elif st.session_state.current_step == 2:
     st.header("🌍 Step 2: Choose Your Destination")
-    
-    
-    # Clear previous destinations if preferences changed
-    if 'last_preferences' not in st.session_state or st.session_state.last_preferences != st.session_state.travel_data['preferences']:
-        st.session_state.destinations = []
-    
-    if not st.session_state.destinations:
+    # Agents are imported in the step that uses them to keep cold start fast
+    from agents.destination_agent import destination, parse_destinations
+    from agents.budget_model import quote_budgets, quote_table
+    graph = st.session_state.step_graph
+    trip = st.session_state.travel_data
+
+    def find_destinations():
+        # Get dynamic destinations from agent
+        destination_response = destination(
+            preferences=trip['preferences'],
+            budget=50000,  # Default budget for initial selection
+            interests=trip['interests']
+        )
+        # Parse the bullet point response
+        return parse_destinations(destination_response)
+
+    # Only asks the agent again if preferences or interests changed
+    if not graph.is_current("destinations", trip):
         with st.spinner("✈️ Finding perfect destinations for you..."):
             try:
-                # Get dynamic destinations from agent
-                destination_response = destination(
-                    preferences=st.session_state.travel_data['preferences'],
-                    budget=50000,  # Default budget for initial selection
-                    interests=st.session_state.travel_data['interests']
-                )
-                
-                # Parse the bullet point response
-                if isinstance(destination_response, str):
-                    destinations_list = [line.strip('- *•').strip() for line in destination_response.split('\n') if line.strip()]
-                    st.session_state.destinations = destinations_list
-                    st.session_state.last_preferences = st.session_state.travel_data['preferences']
-                
-                if not st.session_state.destinations:
+                if not graph.compute("destinations", trip, find_destinations):
                     st.error("No destinations found matching your criteria. Please adjust your preferences.")
                     st.session_state.current_step = 1
                     st.rerun()
-                    
             except Exception as e:
                 st.error(f"Error fetching destinations: {str(e)}")
-                st.session_state.destinations = []
+    destinations = graph.get("destinations", trip) or []
     
-    if st.session_state.destinations:
+    if destinations:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown(f"""
         <div style='font-weight:600; margin-bottom:1rem;'>We found these destinations matching your preferences:</div>
-        <div style='margin-bottom: 1.5rem; color: {TEXT_COLOR};'>Based on your interests in <span style='color: {PRIMARY_COLOR}; font-weight: 600;'>{st.session_state.travel_data['interests']}</span> and preference for <span style='color: {PRIMARY_COLOR}; font-weight: 600;'>{st.session_state.travel_data['preferences']}</span> regions</div>
+        <div style='margin-bottom: 1.5rem; color: {TEXT_COLOR};'>Based on your interests in <span style='color: {PRIMARY_COLOR}; font-weight: 600;'>{trip['interests']}</span> and preference for <span style='color: {PRIMARY_COLOR}; font-weight: 600;'>{trip['preferences']}</span> regions</div>
         """, unsafe_allow_html=True)
         
+        destination_index = trip.get('destination_index', 0)
         selected = st.radio(
             "Select your preferred destination:",
-            st.session_state.destinations,
-            index=st.session_state.travel_data.get('destination_index', 0),
+            destinations,
+            index=destination_index if destination_index < len(destinations) else 0,
             key="destination_radio"
         )
         
-        st.session_state.travel_data['destination'] = selected
-        st.session_state.travel_data['destination_index'] = st.session_state.destinations.index(selected)
+        trip['destination'] = selected
+        trip['destination_index'] = destinations.index(selected)
         st.markdown("</div>", unsafe_allow_html=True)
+
+        # Side-by-side cost estimates for every destination and accommodation tier
+        with st.expander("💰 Compare estimated costs"):
+            quote = quote_budgets(
+                destinations,
+                date_ranges=[format_date_range(
+                    datetime.strptime(st.session_state.travel_data['start_date'], '%Y-%m-%d').date(),
+                    datetime.strptime(st.session_state.travel_data['end_date'], '%Y-%m-%d').date()
+                )],
+                interests=st.session_state.travel_data['interests']
+            )
+            st.dataframe(quote_table(quote), hide_index=True, use_container_width=True)
+            st.caption("Estimates exclude flights.")
         
         col1, col2 = st.columns(2)
         with col1:
@@ -328,9 +571,14 @@ elif st.session_state.current_step == 2:
                 st.session_state.current_step = 3
                 st.rerun()
 
+        # While the user compares candidates, search flights and weather for them in the background
+        from agents.prefetch import prefetch_candidates
+        prefetch_candidates(st.session_state.prefetcher, destinations, trip, selected=selected)
+
 # Step 3: Flight Options
 elif st.session_state.current_step == 3:
     st.header("✈️ Step 3: Flight Options")
+    from agents.prefetch import PREFETCH_WAIT_SECONDS, flight_key
     
     # Validation checks
     required_fields = ['departure_city', 'destination', 'start_date', 'end_date']
@@ -353,51 +601,58 @@ elif st.session_state.current_step == 3:
     </div>
     """, unsafe_allow_html=True)
     
-    # Initialize flight results
-    if 'flight_result' not in st.session_state:
-        st.session_state.flight_result = None
-    
-    # Flight search - only if we have valid dates
-    if st.session_state.flight_result is None:
+    graph = st.session_state.step_graph
+    trip = st.session_state.travel_data
+
+    # A different route or dates makes the chosen flight stale
+    if graph.is_stale("flights", trip):
+        graph.invalidate("flights")
+        st.session_state.selected_flight = None
+
+    # Flight search - only until a flight is chosen for these inputs
+    selected_flight = graph.get("flights", trip)
+    if selected_flight is None:
         with st.spinner("🛫 Searching for flight options..."):
             try:
+                # Drop queued prefetches for other destinations and let a running search for this one
+                # finish, so its offers come from the cache instead of a second Amadeus call
+                st.session_state.prefetcher.cancel(keep=[trip['destination']])
+                st.session_state.prefetcher.result(flight_key(trip, trip['destination']), timeout=PREFETCH_WAIT_SECONDS)
+
                 # Ensure we're passing the correct dates in YYYY-MM-DD format
                 departure_date = start_date.strftime('%Y-%m-%d')
                 return_date = end_date.strftime('%Y-%m-%d')
                 
-                st.write(f"Searching flights from {st.session_state.travel_data['departure_city']} to "
-                        f"{st.session_state.travel_data['destination']} on {departure_date} to {return_date}")
+                st.write(f"Searching flights from {trip['departure_city']} to "
+                        f"{trip['destination']} on {departure_date} to {return_date}")
                 
-                flight_result = flight_planner_agent(
-                    origin_city=st.session_state.travel_data['departure_city'],
-                    destination_city=st.session_state.travel_data['destination'],
+                flight_result = render_flight_options(
+                    origin_city=trip['departure_city'],
+                    destination_city=trip['destination'],
                     departure_date=departure_date,
                     return_date=return_date
                 )
-                st.session_state.flight_result = flight_result
+                if isinstance(flight_result, dict):
+                    selected_flight = graph.set("flights", trip, flight_result)
+                elif flight_result is False:
+                    st.warning("Could not find flight options for the selected dates.")
             except Exception as e:
                 st.error(f"Flight search failed: {str(e)}")
-                st.session_state.flight_result = False
     
     # Display results
-    if st.session_state.flight_result and isinstance(st.session_state.flight_result, dict):
+    if selected_flight:
         # Process flight data into consistent format
         flight_data = {
-            'airline': st.session_state.flight_result.get('airline'),
-            'flight_number': st.session_state.flight_result.get('flight_number'),
-            'departure_airport': st.session_state.flight_result.get('departure', {}).get('airport'),
-            'arrival_airport': st.session_state.flight_result.get('arrival', {}).get('airport'),
-            'departure_city': st.session_state.flight_result.get('departure', {}).get('city') or st.session_state.travel_data['departure_city'],
-            'arrival_city': st.session_state.flight_result.get('arrival', {}).get('city') or st.session_state.travel_data['destination'],
-            'departure_time': st.session_state.flight_result.get('departure', {}).get('time'),
-            'arrival_time': st.session_state.flight_result.get('arrival', {}).get('time'),
-            'price': st.session_state.flight_result.get('price'),
-            'duration': st.session_state.flight_result.get('duration')
+            'airline': selected_flight.get('airline'),
+            'flight_number': selected_flight.get('flight_number'),
+            'departure_airport': selected_flight.get('departure', {}).get('airport'),
+            'arrival_airport': selected_flight.get('arrival', {}).get('airport'),
+            'departure_time': selected_flight.get('departure', {}).get('time'),
+            'arrival_time': selected_flight.get('arrival', {}).get('time'),
+            'price': selected_flight.get('price'),
+            'duration': selected_flight.get('duration')
         }
         
-        # Store in session state
-        st.session_state.selected_flight = flight_data
-        
         # Display flight info
         st.success("🎉 Flight found! Here are your details:")
         st.markdown(f"""
@@ -408,8 +663,10 @@ elif st.session_state.current_step == 3:
         - **Duration:** {flight_data['duration']}
         - **Price:** ₹{flight_data['price']:,}
         """)
-    elif st.session_state.flight_result is False:
-        st.warning("Could not find flight options for the selected dates.")
+        if st.button("🔄 Choose a different flight", type="secondary"):
+            graph.invalidate("flights")
+            st.session_state.selected_flight = None
+            st.rerun()
     
     # Navigation
     col1, col2 = st.columns(2)
@@ -418,66 +675,67 @@ elif st.session_state.current_step == 3:
             st.session_state.current_step -= 1
             st.rerun()
     with col2:
-        if st.button("Continue to Budget →", disabled=not st.session_state.get('selected_flight')):
+        if st.button("Continue to Budget →", disabled=not selected_flight):
             st.session_state.current_step += 1
             st.rerun()
 # Step 4: Budget Calculation
 elif st.session_state.current_step == 4:
     st.header("💰 Step 4: Plan Your Budget")
+    from agents.budget_model import ACCOMMODATION_TYPES, quote_budgets, quote_table
+    graph = st.session_state.step_graph
+    trip = st.session_state.travel_data
+    selected_flight = graph.get("flights", trip)
     
     with st.form("budget_form"):
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.selectbox(
             "Accommodation type:",
-            ["Budget hostel", "Budget hotel", "3-star hotel", "4-star hotel", "5-star hotel", "Luxury resort"],
+            ACCOMMODATION_TYPES,
             key='accommodation_type',
-            index=1
+            index=ACCOMMODATION_TYPES.index(trip.get('accommodation_type', ACCOMMODATION_TYPES[1]))
         )
         st.markdown("</div>", unsafe_allow_html=True)
         
         if st.form_submit_button("Calculate Budget", type="primary"):
+            # Kept in travel_data since the widget's state is dropped on other steps
+            trip['accommodation_type'] = st.session_state.accommodation_type
             with st.spinner("Calculating..."):
                 try:
-                    # Convert string dates back to date objects
-                    start_date = datetime.strptime(st.session_state.travel_data['start_date'], '%Y-%m-%d').date()
-                    end_date = datetime.strptime(st.session_state.travel_data['end_date'], '%Y-%m-%d').date()
-                    
-                    flight_cost = st.session_state.get('selected_flight', {}).get('price', 0)
-                    
-                    # Format dates for the budget agent
-                    date_range = f"{start_date.strftime('%B %d')} to {end_date.strftime('%B %d')}"
-                    
-                    # Call budget calculation with only the expected parameters
-                    calculated_budget = calculate_budget(
-                        destination=st.session_state.travel_data['destination'],
-                        dates=date_range,
-                        accommodation_type=st.session_state.accommodation_type,
-                        flight_location=st.session_state.travel_data['departure_city'],
-                        interests=st.session_state.travel_data['interests'],
-                        flight_cost=flight_cost
-                    )
-                    
-                    # Calculate trip duration for display purposes only
-                    trip_duration = (end_date - start_date).days + 1
-                    
-                    # Store results
-                    st.session_state.travel_data['calculated_budget'] = calculated_budget
-                    st.session_state.budget_result = f"""
-                    ### 💵 Your Budget
-                    - Total Budget: ₹{calculated_budget:,}
-                    - Accommodation: {st.session_state.accommodation_type}
-                    - Trip Duration: {trip_duration} days
-                    - Includes flights: {'Yes' if flight_cost else 'No'}
-                    """
-                    
+                    graph.compute("budget", trip, lambda: trip_budget(trip, selected_flight))
                 except Exception as e:
                     st.error(f"Budget calculation failed: {str(e)}")
 
-    if 'budget_result' in st.session_state:
+    calculated_budget = graph.get("budget", trip)
+    if calculated_budget is not None:
+        # Calculate trip duration for display purposes only
+        start_date = datetime.strptime(trip['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(trip['end_date'], '%Y-%m-%d').date()
+        trip_duration = (end_date - start_date).days + 1
+        flight_cost = (selected_flight or {}).get('price', 0)
+
         st.markdown("<div class='card success-card'>", unsafe_allow_html=True)
-        st.markdown(st.session_state.budget_result, unsafe_allow_html=True)
+        st.markdown(f"""
+        ### 💵 Your Budget
+        - Total Budget: ₹{calculated_budget:,}
+        - Accommodation: {trip.get('accommodation_type', ACCOMMODATION_TYPES[1])}
+        - Trip Duration: {trip_duration} days
+        - Includes flights: {'Yes' if flight_cost else 'No'}
+        """, unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
+    # Compare every accommodation tier for the chosen destination and flight
+    with st.expander("🏨 Compare accommodation options"):
+        quote = quote_budgets(
+            [trip['destination']],
+            date_ranges=[format_date_range(
+                datetime.strptime(trip['start_date'], '%Y-%m-%d').date(),
+                datetime.strptime(trip['end_date'], '%Y-%m-%d').date()
+            )],
+            interests=trip['interests'],
+            flight_costs=[(selected_flight or {}).get('price', 0)]
+        )
+        st.dataframe(quote_table(quote), hide_index=True, use_container_width=True)
+
     # Navigation buttons
     col1, col2 = st.columns(2)
     with col1:
@@ -491,10 +749,20 @@ elif st.session_state.current_step == 4:
 
 elif st.session_state.current_step == 5:
     st.header("📅 Your Travel Itinerary")
+    from agents.itenary_agent import (
+        new_itinerary_plan, stream_plan, regenerate_day, update_flight_details, render_itinerary,
+        trip_dates, flight_details_from_selection
+    )
+    from agents.itinerary_model import ItineraryPlan
+    from agents.token_budget import token_budget
+    from agents.llm_scheduler import INTERACTIVE, llm_priority
     
     # Get trip data
-    budget = st.session_state.travel_data.get('calculated_budget', 50000)
-    selected_flight = st.session_state.get('selected_flight', {})
+    graph = st.session_state.step_graph
+    trip = st.session_state.travel_data
+    selected_flight = graph.get("flights", trip) or {}
+    # Recomputed here only if something it depends on changed since step 4
+    budget = graph.compute("budget", trip, lambda: trip_budget(trip, selected_flight))
     destination = st.session_state.travel_data['destination']
     interests = st.session_state.travel_data['interests']
     
@@ -526,49 +794,74 @@ elif st.session_state.current_step == 5:
         **Duration:** {selected_flight.get('duration', '')}
         """)
 
-    # Generate itinerary
-    if 'itinerary_result' not in st.session_state:
-        with st.spinner("Creating your personalized itinerary..."):
-            # Prepare flight details structure
-            flight_data = None
-            if selected_flight:
-                flight_data = {
-                    "airline": selected_flight.get("airline", ""),
-                    "flight_number": selected_flight.get("flight_number", ""),
-                    "arrival": {
-                        "airport": selected_flight.get("arrival", {}).get("airport", ""),
-                        "city": selected_flight.get("arrival", {}).get("city", destination),
-                        "time": selected_flight.get("arrival", {}).get("time", "")
-                    },
-                    "departure": {
-                        "airport": selected_flight.get("departure", {}).get("airport", ""),
-                        "time": selected_flight.get("departure", {}).get("time", "")
-                    },
-                    "return_flight": selected_flight.get("return_flight")
-                }
-
-            # Generate itinerary
-            st.session_state.itinerary_result = generate_itinerary(
-                destination=destination,
-                dates={
-                    'start_date': start_date.strftime('%Y-%m-%d'),
-                    'end_date': end_date.strftime('%Y-%m-%d'),
-                    'duration': duration,
-                    'date_range': f"{start_date.strftime('%b %d')} - {end_date.strftime('%b %d')}"
-                },
-                budget=budget,
-                interests=interests,
-                flight_details=flight_data
+    # Generate itinerary (stored as a structured ItineraryPlan so single days can be regenerated)
+    flight_data = flight_details_from_selection(selected_flight, destination)
+    dates = trip_dates(trip['start_date'], trip['end_date'])
+    stored = graph.get("itinerary", trip)
+    plan = ItineraryPlan.model_validate(stored) if stored else None
+    previous = (graph.results.get("itinerary") or {}).get("value")
+    previous = ItineraryPlan.model_validate(previous) if previous else None
+
+    if plan is None and previous and (previous.destination, previous.dates, previous.interests) == (destination, dates, interests):
+        # Only the flights or budget changed: regenerate just the days they affect
+        started = time.perf_counter()
+        with st.spinner("Updating your itinerary for the new flights..."), llm_priority(INTERACTIVE), \
+                token_budget("itinerary update") as tokens:
+            try:
+                plan = update_flight_details(previous, flight_data, budget)
+                graph.set("itinerary", trip, plan.model_dump(), time.perf_counter() - started)
+            except Exception:
+                # Recorded on the update's span; generate from scratch instead
+                plan = None
+        st.session_state.itinerary_tokens = tokens.report()
+        if plan:
+            st.markdown(render_itinerary(plan), unsafe_allow_html=True)
+    elif plan:
+        st.markdown(render_itinerary(plan), unsafe_allow_html=True)
+
+    if plan is None:
+        try:
+            plan = new_itinerary_plan(destination, dates, budget, interests, flight_data)
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        # Stream the days onto the page as they are generated, ahead of queued background LLM work
+        started = time.perf_counter()
+        with llm_priority(INTERACTIVE), token_budget("itinerary") as tokens:
+            st.write_stream(stream_plan(plan))
+        st.session_state.itinerary_tokens = tokens.report()
+        if len(plan.days) == plan.duration:
+            graph.set("itinerary", trip, plan.model_dump(), time.perf_counter() - started)
+
+    # Regenerate a single day, optionally with the traveler's changes
+    if plan.days:
+        with st.expander("🔄 Change a day"):
+            day_number = st.selectbox(
+                "Day", [d.day for d in plan.days],
+                format_func=lambda n: f"Day {n}: {plan.day(n).title}", key="regenerate_day"
             )
+            feedback = st.text_input("What should change? (optional)", key="regenerate_feedback",
+                                     placeholder="e.g. more street food, less walking")
+            if st.button("Regenerate this day", key="regenerate_button"):
+                started = time.perf_counter()
+                with st.spinner(f"Replanning day {day_number}..."), llm_priority(INTERACTIVE), \
+                        token_budget(f"day {day_number}") as tokens:
+                    try:
+                        updated = regenerate_day(plan, day_number, feedback.strip() or None)
+                    except Exception as e:
+                        updated = None
+                        st.error(f"❌ Couldn't regenerate day {day_number}: {str(e)}")
+                st.session_state.itinerary_tokens = tokens.report()
+                if updated:
+                    graph.set("itinerary", trip, updated.model_dump(), time.perf_counter() - started)
+                    st.rerun()
 
-    # Display itinerary
-    if st.session_state.itinerary_result:
-        st.markdown(st.session_state.itinerary_result, unsafe_allow_html=True)
-        
-        # Download button
+    # Download button
+    if plan.days:
         st.download_button(
             "📥 Download Itinerary",
-            st.session_state.itinerary_result,
+            render_itinerary(plan),
             file_name=f"{destination}_itinerary.md",
             mime="text/markdown"
         )
@@ -587,6 +880,8 @@ elif st.session_state.current_step == 5:
 # Step 6: Weather Forecast
 elif st.session_state.current_step == 6:
     st.header("☀️ Step 6: Weather Forecast")
+    from agents.weather_agent import weather_forecast, weather_forecast_many, weather_table
+    from agents.prefetch import PREFETCH_WAIT_SECONDS, weather_key
     
     # Convert string dates back to date objects first
     try:
@@ -596,39 +891,62 @@ elif st.session_state.current_step == 6:
         st.error(f"Invalid date format in session data: {str(e)}")
         st.stop()
 
-    if 'weather_result' not in st.session_state:
+    graph = st.session_state.step_graph
+    trip = st.session_state.travel_data
+
+    def fetch_weather():
+        # Use the forecast prefetched in step 2 if there is one
+        weather_result = st.session_state.prefetcher.result(
+            weather_key(trip, trip['destination']), timeout=PREFETCH_WAIT_SECONDS
+        )
+        if weather_result is None:
+            weather_result = weather_forecast(
+                city=trip['destination'],
+                start_date=trip['start_date'],
+                end_date=trip['end_date']
+            )
+        
+        # Process the weather result
+        if isinstance(weather_result, dict):
+            weather_text = f"### Weather Forecast for {trip['destination']}\n\n"
+            for date, forecast in weather_result.items():
+                weather_text += f"**{date}**: {forecast}\n\n"
+            return weather_text
+        return str(weather_result)
+
+    weather_text = graph.get("weather", trip)
+    if weather_text is None:
         with st.spinner("🌤️ Checking weather for your destination..."):
             try:
-                # Get the weather forecast using date objects
-                weather_result = weather_forecast(
-                    city=st.session_state.travel_data['destination'],
-                )
-                
-                # Process the weather result
-                if isinstance(weather_result, dict):
-                    weather_text = f"### Weather Forecast for {st.session_state.travel_data['destination']}\n\n"
-                    for date, forecast in weather_result.items():
-                        weather_text += f"**{date}**: {forecast}\n\n"
-                    st.session_state.weather_result = weather_text
-                else:
-                    st.session_state.weather_result = str(weather_result)
-                    
+                weather_text = graph.compute("weather", trip, fetch_weather)
             except Exception as e:
                 st.error(f"Weather forecast failed: {str(e)}")
-                st.session_state.weather_result = "Weather information is currently unavailable."
+                weather_text = "Weather information is currently unavailable."
     
     st.markdown("<div class='card info-card'>", unsafe_allow_html=True)
     st.markdown(f"### {st.session_state.travel_data['destination']} Weather Forecast")
     st.markdown(f"**Travel Dates:** {start_date.strftime('%B %d')} to {end_date.strftime('%B %d')}")
     
     # Display the weather information
-    if st.session_state.weather_result:
-        st.markdown(st.session_state.weather_result, unsafe_allow_html=True)
+    if weather_text:
+        st.markdown(weather_text, unsafe_allow_html=True)
     else:
         st.warning("Could not retrieve weather information for this destination.")
     
     st.markdown("</div>", unsafe_allow_html=True)
     
+    # Side-by-side weather for the other destinations suggested in step 2
+    candidates = graph.get("destinations", trip) or []
+    if len(candidates) > 1:
+        with st.expander("🌦️ Compare weather across destinations"):
+            try:
+                comparison = graph.compute("weather_comparison", trip, lambda: weather_forecast_many(
+                    candidates, start_date=trip['start_date'], end_date=trip['end_date']
+                ))
+                st.dataframe(weather_table(comparison), hide_index=True, use_container_width=True)
+            except Exception as e:
+                st.error(f"Weather comparison failed: {str(e)}")
+
     # Completion card
     st.markdown("<div class='card success-card'>", unsafe_allow_html=True)
     st.markdown("### 🎉 Your Travel Plan is Complete!")
@@ -655,8 +973,8 @@ elif st.session_state.current_step == 6:
         if st.button("✨ Start New Trip", type="primary"):
             st.session_state.current_step = 1
             st.session_state.travel_data = {}
-            st.session_state.destinations = []
             st.session_state.destination_details = {}
+            st.session_state.prefetcher.shutdown()
             st.session_state.clear()
             st.rerun()
 
@@ -667,4 +985,10 @@ st.markdown(f"""
     <p style="font-weight: 600; color: {PRIMARY_COLOR};">Travel Buddy - Your Smart Travel Assistant</p>
     <p style="color: {TEXT_COLOR};">Note: All prices and availability are estimates. Please verify with service providers.</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+st.session_state.render_span.__exit__(None, None, None)
+st.session_state.render_span = None
+if ADMIN_PANEL:
+    with st.sidebar:
+        render_admin_panel()
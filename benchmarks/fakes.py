@@ -0,0 +1,347 @@
+"""
+Local stand-ins for Groq, Amadeus, OpenWeather and Nominatim
+
+One threaded HTTP server answers for all four upstreams with canned payloads
+shaped like the real APIs. Every response waits for a latency drawn from a
+per-upstream lognormal distribution and fails at a configurable rate, and
+every call is counted.
+
+Point the agents at it with the environment from FakeUpstreams.environment().
+"""
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+UPSTREAMS = ["groq", "amadeus", "openweather", "nominatim"]
+
+# Median latency (ms) of each upstream, roughly what the real APIs take from India
+DEFAULT_LATENCY_MS = {"groq": 600, "amadeus": 900, "openweather": 150, "nominatim": 250}
+
+# Spread of the lognormal latency; 0.5 puts p95 at about 2.3x the median
+DEFAULT_SIGMA = 0.5
+
+# Groq output speed once the first token is out
+TOKENS_PER_SECOND = 500
+
+# Bounding box the fake geocoder places unknown names in (India)
+LAT_RANGE = (8.0, 32.0)
+LON_RANGE = (70.0, 92.0)
+
+DESTINATIONS_REPLY = "- Goa\n- Gokarna\n- Pondicherry\n- Munnar\n- Hampi"
+DAY_REPLY = """### 🌟 **Day {day}: Exploring**
+**🌅 Morning**
+☕ 8:00 AM - Breakfast at a local café (₹300)
+🏛️ 9:30 AM - Heritage walk (₹500)
+
+**🌞 Afternoon**
+🍛 1:00 PM - Lunch at a thali place (₹400)
+🏞️ 3:00 PM - Viewpoint and market visit (₹200)
+
+**🌃 Evening**
+🌇 6:00 PM - Sunset by the water
+🍽️ 8:00 PM - Dinner (₹800)
+
+**💰 Budget:** ₹5,000
+"""
+
+# Arguments of the tool call answering a structured-output (function calling) request
+DAY_PLAN_ARGUMENTS = {
+    "title": "🌟 Exploring",
+    "activities": [
+        {"time": "8:00 AM", "period": "Morning", "title": "☕ Breakfast", "venue": "a local café", "cost": 300},
+        {"time": "9:30 AM", "period": "Morning", "title": "🏛️ Heritage walk", "venue": "the old quarter", "cost": 500},
+        {"time": "1:00 PM", "period": "Afternoon", "title": "🍛 Lunch", "venue": "a thali place", "cost": 400},
+        {"time": "6:00 PM", "period": "Evening", "title": "🌇 Sunset", "venue": "the waterfront", "cost": 0},
+        {"time": "8:00 PM", "period": "Evening", "title": "🍽️ Dinner", "venue": "a seafood shack", "cost": 800},
+    ],
+    "transport": "Auto-rickshaws between stops",
+    "tip": "Carry cash for small vendors",
+}
+
+
+class Upstream:
+    """Latency distribution, error rate and call counter for one fake upstream"""
+
+    def __init__(self, name, median_ms, sigma=DEFAULT_SIGMA, error_rate=0.0, seed=None):
+        self.name = name
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """(latency in seconds, whether this call fails)"""
+        with self._lock:
+            self.calls += 1
+            latency = self.median_ms * math.exp(self.sigma * self._random.gauss(0, 1)) / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return latency, failed
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+def _place_coordinates(name):
+    """Deterministic coordinates for any place name"""
+    digest = hashlib.sha256(name.lower().encode("utf-8")).digest()
+    lat = LAT_RANGE[0] + (LAT_RANGE[1] - LAT_RANGE[0]) * int.from_bytes(digest[:4], "big") / 2 ** 32
+    lon = LON_RANGE[0] + (LON_RANGE[1] - LON_RANGE[0]) * int.from_bytes(digest[4:8], "big") / 2 ** 32
+    return round(lat, 4), round(lon, 4)
+
+
+def _conditions(seed):
+    rng = random.Random(seed)
+    condition = rng.choice([(800, "clear sky"), (802, "scattered clouds"), (500, "light rain"), (721, "haze")])
+    temp = round(rng.uniform(14, 36), 1)
+    return {
+        "main": {"temp": temp, "feels_like": round(temp + rng.uniform(-2, 4), 1), "humidity": rng.randint(30, 90)},
+        "wind": {"speed": round(rng.uniform(0.5, 9), 1)},
+        "weather": [{"id": condition[0], "description": condition[1]}],
+    }
+
+
+def weather_payload(query):
+    return _conditions(f"{query.get('lat')},{query.get('lon')}")
+
+
+def forecast_payload(query):
+    start = int(time.time()) // 10800 * 10800
+    entries = [dict(_conditions(f"{query.get('lat')},{query.get('lon')},{i}"), dt=start + i * 10800) for i in range(40)]
+    return {"city": {"timezone": 19800}, "list": entries}
+
+
+def nominatim_payload(query):
+    lat, lon = _place_coordinates(query.get("q", ""))
+    return [{"lat": str(lat), "lon": str(lon), "display_name": query.get("q", "")}]
+
+
+def _segment(carrier, number, origin, destination, departs, hours):
+    return {
+        "carrierCode": carrier,
+        "number": str(number),
+        "departure": {"iataCode": origin, "at": departs.strftime("%Y-%m-%dT%H:%M:%S")},
+        "arrival": {"iataCode": destination, "at": (departs + timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%S")},
+    }
+
+
+def flight_offers_payload(query):
+    origin = query.get("originLocationCode", "DEL")
+    destination = query.get("destinationLocationCode", "GOI")
+    departure = datetime.strptime(query.get("departureDate", "2030-01-01"), "%Y-%m-%d")
+    return_date = datetime.strptime(query.get("returnDate", "2030-01-05"), "%Y-%m-%d")
+    rng = random.Random(f"{origin}{destination}{departure}")
+    offers = []
+    for i in range(int(query.get("max", 5))):
+        carrier = rng.choice(["6E", "AI", "UK", "SG"])
+        hours = rng.choice([2, 2.5, 3])
+        out = departure + timedelta(hours=rng.randint(5, 21))
+        back = return_date + timedelta(hours=rng.randint(5, 21))
+        offers.append({
+            "price": {"total": f"{rng.randint(3500, 14000)}.00"},
+            "itineraries": [
+                {"duration": f"PT{int(hours)}H{int(hours % 1 * 60)}M",
+                 "segments": [_segment(carrier, 100 + i, origin, destination, out, hours)]},
+                {"duration": f"PT{int(hours)}H{int(hours % 1 * 60)}M",
+                 "segments": [_segment(carrier, 200 + i, destination, origin, back, hours)]},
+            ],
+        })
+    return {"data": offers}
+
+
+def llm_reply(messages):
+    """Canned completion for the agent whose prompt this is"""
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    if "tourist destinations" in prompt:
+        return DESTINATIONS_REPLY
+    if "budget calculator" in prompt:
+        return "48000"
+    if "Rewrite this weather summary" in prompt:
+        return prompt.split("\n\n", 1)[-1]
+    days = prompt.count("**Day ") or 1
+    return "\n".join(DAY_REPLY.format(day=day) for day in range(1, days + 1))
+
+
+class FakeUpstreams:
+    """
+    The fake server plus its upstream profiles
+
+    Args:
+        latency_ms (dict): Median latency per upstream (defaults to DEFAULT_LATENCY_MS)
+        error_rate (dict): Fraction of failing calls per upstream
+        sigma (float): Lognormal spread of every upstream's latency
+        tokens_per_second (int): Groq generation speed after the first token
+        seed (int): Seed for reproducible latency and error draws
+    """
+
+    def __init__(self, latency_ms=None, error_rate=None, sigma=DEFAULT_SIGMA,
+                 tokens_per_second=TOKENS_PER_SECOND, seed=0):
+        latency_ms = dict(DEFAULT_LATENCY_MS, **(latency_ms or {}))
+        error_rate = error_rate or {}
+        self.upstreams = {
+            name: Upstream(name, latency_ms[name], sigma, error_rate.get(name, 0.0), seed=f"{seed}:{name}")
+            for name in UPSTREAMS
+        }
+        self.tokens_per_second = tokens_per_second
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def environment(self):
+        """Environment variables that point every agent at this server"""
+        return {
+            "GROQ_API_BASE": self.url,
+            "GROQ_API_KEY": "fake-groq-key",
+            "AMADEUS_HOST": "127.0.0.1",
+            "AMADEUS_PORT": str(self.port),
+            "AMADEUS_SSL": "0",
+            "AMADEUS_API_KEY": "fake-amadeus-key",
+            "AMADEUS_SECRET_KEY": "fake-amadeus-secret",
+            "OPENWEATHER_URL": f"{self.url}/data/2.5",
+            "OPENWEATHER_API_KEY": "fake-openweather-key",
+            "NOMINATIM_URL": f"{self.url}/search",
+            "NOMINATIM_MIN_INTERVAL": "0",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
+
+    def _handler(self):
+        fakes = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._route()
+
+            def do_POST(self):
+                self._route()
+
+            def _route(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+
+                if parts.path == "/openai/v1/chat/completions":
+                    return self._groq(json.loads(body or b"{}"))
+                if parts.path == "/v1/security/oauth2/token":
+                    return self._reply("amadeus", {"type": "amadeusOAuth2Token", "access_token": "fake-token",
+                                                   "expires_in": 1799, "state": "approved"})
+                if parts.path == "/v2/shopping/flight-offers":
+                    return self._reply("amadeus", flight_offers_payload(query))
+                if parts.path == "/data/2.5/weather":
+                    return self._reply("openweather", weather_payload(query))
+                if parts.path == "/data/2.5/forecast":
+                    return self._reply("openweather", forecast_payload(query))
+                if parts.path == "/search":
+                    return self._reply("nominatim", nominatim_payload(query))
+                self._send(404, {"error": f"No fake for {parts.path}"})
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _reply(self, upstream, payload):
+                latency, failed = fakes.upstreams[upstream].sample()
+                time.sleep(latency)
+                if failed:
+                    return self._send(503, {"error": f"Fake {upstream} outage"})
+                self._send(200, payload)
+
+            def _groq(self, request):
+                latency, failed = fakes.upstreams["groq"].sample()
+                time.sleep(latency)
+                if failed:
+                    return self._send(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                                      {"retry-after": "1"})
+
+                content = llm_reply(request.get("messages", []))
+                tool_calls = None
+                if request.get("tools"):
+                    name = request["tools"][0]["function"]["name"]
+                    tool_calls = [{"id": "call_fake", "type": "function",
+                                   "function": {"name": name, "arguments": json.dumps(DAY_PLAN_ARGUMENTS)}}]
+                    content = ""
+                prompt_tokens = len(json.dumps(request.get("messages", []))) // 4
+                completion_tokens = max(len(content or json.dumps(DAY_PLAN_ARGUMENTS)) // 4, 1)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens}
+                base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model", "fake")}
+
+                if not request.get("stream"):
+                    time.sleep(completion_tokens / fakes.tokens_per_second)
+                    return self._send(200, dict(base, object="chat.completion", usage=usage, choices=[
+                        {"index": 0, "message": {"role": "assistant", "content": content, "tool_calls": tool_calls},
+                         "finish_reason": "tool_calls" if tool_calls else "stop"}
+                    ]))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                # Tool call arguments stream in pieces like text does, after a first delta naming the tool
+                text = tool_calls[0]["function"]["arguments"] if tool_calls else content
+                pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+                if tool_calls:
+                    pieces.insert(0, "")
+                for index, piece in enumerate(pieces):
+                    time.sleep(16 / fakes.tokens_per_second)  # ~16 tokens per 64 characters
+                    if not tool_calls:
+                        delta = {"role": "assistant", "content": piece}
+                    elif index == 0:
+                        delta = {"role": "assistant", "tool_calls": [dict(tool_calls[0], index=0, function={
+                            "name": tool_calls[0]["function"]["name"], "arguments": ""})]}
+                    else:
+                        delta = {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+                    chunk = dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "delta": delta, "finish_reason": None}
+                    ])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                final = dict(base, object="chat.completion.chunk", x_groq={"usage": usage}, choices=[
+                    {"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool_calls else "stop"}
+                ])
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
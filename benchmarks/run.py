@@ -0,0 +1,258 @@
+"""
+Benchmark the agents against local stand-ins for every upstream
+
+Starts the fake Groq, Amadeus, OpenWeather and Nominatim server from
+benchmarks/fakes.py, points the agents at it, and runs each scenario with
+fresh inputs (so the caches miss) on a thread pool. Reports p50/p95/p99
+latency, errors, throughput, LLM tokens and upstream calls per operation, and appends one
+JSON record per run to metrics/benchmarks.jsonl.
+
+Usage:
+    python benchmarks/run.py [--iterations 20] [--concurrency 4]
+        [--scenarios destination flights ...] [--latency groq=800 ...] [--error-rate amadeus=0.05 ...]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import DEFAULT_LATENCY_MS, DEFAULT_SIGMA, TOKENS_PER_SECOND, UPSTREAMS, FakeUpstreams  # noqa: E402
+
+METRICS_PATH = os.path.join(ROOT, "metrics", "benchmarks.jsonl")
+
+# Quota given to the LLM scheduler so it doesn't throttle the benchmark (use --groq-quota for the real one)
+UNTHROTTLED_RPM = 100000
+UNTHROTTLED_TPM = 100000000
+
+
+def _failed(result):
+    """Agents report most failures as "❌ ..." strings or False rather than raising"""
+    if result is False:
+        return True
+    if isinstance(result, str):
+        return result.startswith(("❌", "⚠️"))
+    if isinstance(result, dict) and "status" in result:
+        return result["status"] != "ok"
+    return False
+
+
+def scenario_destination(i):
+    from agents.destination_agent import destination
+    return destination(f"South India coast {i}", 40000, "beaches, food")
+
+
+# The same two requests, worded the way different travelers type them
+DESTINATION_WORDINGS = ["beaches, food", "food and beaches", "Beaches & Food", "beach, food", "I love food and beaches"]
+
+
+def scenario_destination_reworded(i):
+    # Hits the semantic cache after the first wording of each request
+    from agents.destination_agent import destination
+    return destination(f"Western Ghats {i // len(DESTINATION_WORDINGS)}", 40000,
+                       DESTINATION_WORDINGS[i % len(DESTINATION_WORDINGS)])
+
+
+def scenario_budget(i):
+    # A destination outside the cost tables, so the LLM is asked
+    from agents.budget_agent import calculate_budget
+    return calculate_budget(f"Benchtown {i}", "December 01 to December 04", "Budget hotel", "Delhi", "food")
+
+
+def scenario_flights(i):
+    from agents.flight_planner import find_flights
+    departure = date.today() + timedelta(days=7 + i)
+    return find_flights("Delhi", f"Benchtown {i}", departure.isoformat(), (departure + timedelta(days=3)).isoformat())
+
+
+def _itinerary(i, days, parallel):
+    from agents.itenary_agent import generate_itinerary, trip_dates
+    start = date.today() + timedelta(days=7)
+    dates = trip_dates(start.isoformat(), (start + timedelta(days=days - 1)).isoformat())
+    return generate_itinerary("Goa", dates, 45000, f"food, beaches {i}", parallel=parallel)
+
+
+def scenario_itinerary(i):
+    return _itinerary(i, 3, parallel=False)
+
+
+def scenario_itinerary_parallel(i):
+    return _itinerary(i, 5, parallel=True)
+
+
+def scenario_weather(i):
+    from agents.weather_agent import weather_forecast
+    start = date.today() + timedelta(days=1)
+    return weather_forecast(f"Benchtown {i}", start, start + timedelta(days=2))
+
+
+def scenario_end_to_end(i):
+    from agents.pipeline import plan_trip
+    start = date.today() + timedelta(days=2 + i)
+    return plan_trip({
+        "id": i,
+        "departure_city": "Delhi",
+        "preferences": f"South India coast {i}",
+        "interests": f"food, beaches {i}",
+        "budget": 40000,
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=3)).isoformat(),
+    })
+
+
+SCENARIOS = {
+    "destination": scenario_destination,
+    "destination_reworded": scenario_destination_reworded,
+    "budget": scenario_budget,
+    "flights": scenario_flights,
+    "itinerary": scenario_itinerary,
+    "itinerary_parallel": scenario_itinerary_parallel,
+    "weather": scenario_weather,
+    "end_to_end": scenario_end_to_end,
+}
+
+
+def total_tokens():
+    from agents.telemetry import token_counts
+    return sum(t["prompt"] + t["completion"] for t in token_counts().values())
+
+
+def run_scenario(fn, fakes, iterations, concurrency, offset):
+    """Run fn for `iterations` fresh inputs and summarize latency, errors and upstream calls"""
+    # One untimed run first so imports and client setup don't land in the percentiles
+    try:
+        fn(offset + iterations)
+    except Exception:
+        pass
+    before = fakes.stats()
+    tokens_before = total_tokens()
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            failed = _failed(fn(offset + i))
+        except Exception as e:
+            print(f"  iteration {i}: {type(e).__name__}: {e}", file=sys.stderr)
+            failed = True
+        return time.perf_counter() - started, failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - started
+
+    after = fakes.stats()
+    tokens = total_tokens() - tokens_before
+    latencies = np.array([seconds for seconds, _ in results]) * 1000
+    errors = sum(1 for _, failed in results if failed)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "mean_ms": round(float(latencies.mean()), 1),
+        "throughput_per_s": round((iterations - errors) / wall, 2),
+        "llm_tokens_per_op": round(tokens / iterations),
+        "upstream_calls_per_op": {
+            name: round((after[name]["calls"] - before[name]["calls"]) / iterations, 2) for name in UPSTREAMS
+        },
+        "upstream_errors": {name: after[name]["errors"] - before[name]["errors"] for name in UPSTREAMS},
+    }
+
+
+def parse_upstream_values(pairs, option):
+    values = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if name not in UPSTREAMS or not value:
+            raise SystemExit(f"{option} expects upstream=value with upstream one of {', '.join(UPSTREAMS)}")
+        values[name] = float(value)
+    return values
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20, help="Operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Operations running at once")
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--latency", nargs="*", metavar="UPSTREAM=MS",
+                        help=f"Median upstream latency (defaults: {DEFAULT_LATENCY_MS})")
+    parser.add_argument("--sigma", type=float, default=DEFAULT_SIGMA, help="Lognormal spread of upstream latency")
+    parser.add_argument("--error-rate", nargs="*", metavar="UPSTREAM=RATE", help="Fraction of failing upstream calls")
+    parser.add_argument("--tokens-per-second", type=int, default=TOKENS_PER_SECOND, help="Fake Groq output speed")
+    parser.add_argument("--groq-quota", action="store_true", help="Keep the real Groq rate limits in the scheduler")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-save", action="store_true", help="Print the report without appending to the metrics file")
+    args = parser.parse_args()
+
+    latency = parse_upstream_values(args.latency, "--latency")
+    error_rate = parse_upstream_values(args.error_rate, "--error-rate")
+    fakes = FakeUpstreams(latency, error_rate, args.sigma, args.tokens_per_second, args.seed).start()
+
+    # Must be set before the agents are imported: they read their endpoints at import time
+    cache_dir = tempfile.mkdtemp(prefix="travel-buddy-bench-")
+    os.environ.update(fakes.environment())
+    os.environ["TRAVEL_BUDDY_CACHE"] = os.path.join(cache_dir, "cache.sqlite3")
+    if not args.groq_quota:
+        os.environ["GROQ_REQUESTS_PER_MINUTE"] = str(UNTHROTTLED_RPM)
+        os.environ["GROQ_TOKENS_PER_MINUTE"] = str(UNTHROTTLED_TPM)
+
+    report = {}
+    try:
+        for offset, name in enumerate(args.scenarios):
+            # Each scenario gets its own input range so no two share cache entries
+            report[name] = run_scenario(SCENARIOS[name], fakes, args.iterations, args.concurrency,
+                                        offset * (args.iterations + 1))
+            r = report[name]
+            print(f"{name:20s} p50 {r['p50_ms']:8.1f}  p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  "
+                  f"{r['throughput_per_s']:6.2f}/s  errors {r['errors']}  tokens {r['llm_tokens_per_op']}  "
+                  + " ".join(f"{u} {c}" for u, c in r["upstream_calls_per_op"].items() if c))
+    finally:
+        fakes.stop()
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "latency_ms": dict(DEFAULT_LATENCY_MS, **latency),
+            "sigma": args.sigma,
+            "error_rate": error_rate,
+            "tokens_per_second": args.tokens_per_second,
+            "groq_quota": args.groq_quota,
+            "seed": args.seed,
+        },
+        "scenarios": report,
+    }
+    if not args.no_save:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended to {os.path.relpath(METRICS_PATH, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure cold import time of the app's agent modules
+
+Runs each module import in a fresh interpreter with `python -X importtime`
+and appends one JSON record per run to metrics/import_time.jsonl so changes in
+cold-start cost show up in the git history.
+
+Usage:
+    python scripts/import_time.py [--runs 3]
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_PATH = os.path.join(ROOT, "metrics", "import_time.jsonl")
+
+MODULES = [
+    "streamlit",
+    "agents.destination_agent",
+    "agents.flight_planner",
+    "agents.budget_agent",
+    "agents.itenary_agent",
+    "agents.weather_agent",
+]
+
+
+def measure(module):
+    """Cumulative import time of a module in microseconds, from -X importtime output"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like: "import time:       self [us] |  cumulative | imported package"
+    for line in reversed(result.stderr.splitlines()):
+        if not line.startswith("import time:"):
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1])
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh-interpreter runs per module (best is kept)")
+    parser.add_argument("--no-save", action="store_true", help="Print the report without appending to the metrics file")
+    args = parser.parse_args()
+
+    report = {}
+    for module in MODULES:
+        best = min(measure(module) for _ in range(args.runs))
+        report[module] = round(best / 1000, 1)
+        print(f"{module:32s} {report[module]:8.1f} ms")
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "import_ms": report,
+    }
+    if not args.no_save:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended to {os.path.relpath(METRICS_PATH, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
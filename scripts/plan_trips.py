@@ -0,0 +1,107 @@
+"""
+Plan trips in bulk without the Streamlit app
+
+Reads one trip request per line from a JSONL file, runs destination → flights
+→ budget → itinerary → weather for each on a thread pool, and writes one JSON
+result per line (in completion order) with per-stage timings and the LLM
+tokens each trip used, call by call.
+
+Each request needs departure_city, start_date, end_date (YYYY-MM-DD),
+interests and either destination or preferences. Optional: id,
+accommodation_type, adults, budget.
+
+Usage:
+    python scripts/plan_trips.py trips.jsonl -o results.jsonl [--workers 4] [--max-tokens 20000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.pipeline import DEFAULT_WORKERS, STAGES, plan_trips  # noqa: E402
+from agents.token_budget import MAX_TOKENS_PER_REQUEST  # noqa: E402
+from agents.llm_scheduler import BACKGROUND, NORMAL  # noqa: E402
+
+
+def read_requests(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{line_number}: invalid JSON ({e})")
+            request.setdefault('id', line_number)
+            yield request
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file of trip requests")
+    parser.add_argument("-o", "--output", help="JSONL file for results (default: stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Trips planned at once")
+    parser.add_argument("--skip", nargs="*", default=[], choices=[s for s in STAGES if s != "destination"],
+                        help="Stages to leave out")
+    parser.add_argument("--foreground", action="store_true",
+                        help="Run LLM calls at normal priority instead of behind interactive users")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS_PER_REQUEST,
+                        help="LLM token budget per trip; 0 for no limit")
+    args = parser.parse_args()
+
+    requests = list(read_requests(args.input))
+    stages = [s for s in STAGES if s not in args.skip]
+    priority = NORMAL if args.foreground else BACKGROUND
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    statuses = {}
+    timings = {}
+    plan_tokens = []
+    agent_tokens = {}
+    try:
+        for index, result in plan_trips(requests, workers=args.workers, stages=stages, priority=priority,
+                                            max_tokens=args.max_tokens):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+            for stage, seconds in result.get('timings', {}).items():
+                timings.setdefault(stage, []).append(seconds)
+            if result.get('tokens'):
+                plan_tokens.append(result['tokens']['total'])
+                for agent, totals in result['tokens']['agents'].items():
+                    summed = agent_tokens.setdefault(agent, {"calls": 0, "prompt": 0, "completion": 0})
+                    for field in summed:
+                        summed[field] += totals[field]
+            print(f"[{sum(statuses.values())}/{len(requests)}] {result.get('id')}: {result['status']}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Planned {len(requests)} trips in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())), file=sys.stderr)
+    for stage, values in timings.items():
+        print(f"  {stage:12s} p50 {percentile(values, 50):7.2f}s  p95 {percentile(values, 95):7.2f}s", file=sys.stderr)
+    if plan_tokens:
+        print(f"Tokens per trip: p50 {percentile(plan_tokens, 50):,}  p95 {percentile(plan_tokens, 95):,}  "
+              f"total {sum(plan_tokens):,}", file=sys.stderr)
+    for agent, totals in sorted(agent_tokens.items()):
+        per_call = (totals['prompt'] + totals['completion']) // max(totals['calls'], 1)
+        print(f"  {agent:14s} {totals['calls']:5d} calls  {totals['prompt']:9,} prompt  "
+              f"{totals['completion']:9,} completion  {per_call:7,} per call", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()